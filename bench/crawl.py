@@ -0,0 +1,267 @@
+#!/usr/bin/python
+"""
+Crawl a synthetic web served locally with a real manager and a number of workers, and report the throughput,
+the CPU time per page, the memory and the frontier latencies as a json object. Run from the top directory:
+
+	python -m bench.crawl [-w WORKERS] [-d DOWNLOADERS] [-a] [-t SECONDS] [--hosts HOSTS] ... [-o OUTPUT]
+
+The web has a given number of hosts, each of a given number of pages, every page linking to a given number of others,
+some of them on other hosts. Each host gets its own loopback address (127.1.x.y), so the crawler sees as many sites,
+which takes Linux. Pages are served after a log-normally distributed delay, and a share of them fail with a 500.
+
+The manager runs in this process, each worker and the web server in a process of their own. The manager keeps its
+unvisited urls and the workers their pages in files under a temporary directory, so no database is needed.
+"""
+
+import BaseHTTPServer
+import SocketServer
+import json
+import math
+import multiprocessing
+import os
+import random
+import resource
+import shutil
+import socket
+import sys
+import tempfile
+import time
+from optparse import OptionParser
+
+from crawlerManager import CrawlerManager
+from core.engine import Engine, THREADED_DOWNLOAD, ASYNC_DOWNLOAD
+from lib import metrics
+
+QUANTILES = (0.5, 0.9, 0.99)
+FILLER = "<p>Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod tempor incididunt ut labore et dolore.</p>\n"
+ROBOTS = "User-agent: *\nDisallow: /private/\n"
+WORKER_STOP_TIMEOUT = 60
+
+def hostAddress(i):
+	"""
+	Return the loopback address of the i-th host.
+	"""
+	return "127.1.%d.%d" % (i // 250, i % 250 + 1)
+
+class SyntheticWeb(object):
+	"""
+	A SyntheticWeb generates the pages of the web graph on demand, the links of a page depending only on its host and number.
+	"""
+	def __init__(self, port, hosts, pages, degree, crossHost, pageSize):
+		self.port = port
+		self.hosts = hosts
+		self.pages = pages
+		self.degree = degree
+		self.crossHost = crossHost
+		self.pageSize = pageSize
+
+	def url(self, host, page):
+		return "http://%s:%d/p/%d.html" % (hostAddress(host), self.port, page)
+
+	def seeds(self):
+		return set(self.url(host, 0) for host in range(self.hosts))
+
+	def page(self, host, page):
+		rand = random.Random(host * 1000003 + page)
+		parts = ["<!DOCTYPE html><html><head><title>page %d of host %d</title></head><body>" % (page, host)]
+		for i in range(self.degree):
+			target = rand.randrange(self.hosts) if rand.random() < self.crossHost else host
+			parts.append('<div><a href="%s">link %d</a></div>' % (self.url(target, rand.randrange(self.pages)), i))
+		size = sum(len(part) for part in parts)
+		parts.append(FILLER * max((self.pageSize - size) // len(FILLER), 0))
+		parts.append("</body></html>")
+		return "\n".join(parts)
+
+class _SyntheticHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+	protocol_version = "HTTP/1.1"
+
+	def do_GET(self):
+		server = self.server
+		if(server.latency > 0):
+			time.sleep(random.lognormvariate(math.log(server.latency), server.sigma))
+		host = self.headers.get("host", "").split(":")[0]
+		parts = host.split(".")
+		if(self.path == "/robots.txt"):
+			self._reply(200, "text/plain", ROBOTS)
+		elif(random.random() < server.errorRate):
+			self._reply(500, "text/html", "")
+		elif(len(parts) == 4 and self.path.startswith("/p/") and self.path.endswith(".html")):
+			try:
+				hostNum = int(parts[2]) * 250 + int(parts[3]) - 1
+				pageNum = int(self.path[3:-5])
+			except ValueError:
+				self._reply(404, "text/html", "")
+				return
+			if(0 <= hostNum < server.web.hosts and 0 <= pageNum < server.web.pages):
+				self._reply(200, "text/html; charset=utf-8", server.web.page(hostNum, pageNum))
+			else:
+				self._reply(404, "text/html", "")
+		else:
+			self._reply(404, "text/html", "")
+
+	def _reply(self, status, contentType, body):
+		self.send_response(status)
+		self.send_header("Content-Type", contentType)
+		self.send_header("Content-Length", str(len(body)))
+		self.end_headers()
+		self.wfile.write(body)
+
+	def log_message(self, format, *args):
+		pass
+
+class _SyntheticServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+	daemon_threads = True
+	allow_reuse_address = True
+	request_queue_size = 1024
+
+	def handle_error(self, request, client_address):
+		## the crawler hanging up on a response is none of the benchmark's business.
+		pass
+
+def serveWeb(sock, web, latency, sigma, errorRate):
+	"""
+	Serve web on the listening socket sock until killed. The body of the web server process.
+	"""
+	server = _SyntheticServer(sock.getsockname(), _SyntheticHandler, bind_and_activate = False)
+	server.socket.close()
+	server.socket = sock
+	server.web = web
+	server.latency = latency
+	server.sigma = sigma
+	server.errorRate = errorRate
+	server.serve_forever()
+
+def freePort():
+	sock = socket.socket()
+	sock.bind(("127.0.0.1", 0))
+	port = sock.getsockname()[1]
+	sock.close()
+	return port
+
+def cpuTime():
+	usage = resource.getrusage(resource.RUSAGE_SELF)
+	return usage.ru_utime + usage.ru_stime
+
+def maxRSS():
+	"""
+	Return the peak resident memory of this process in MB (ru_maxrss is in KB on Linux).
+	"""
+	return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+def runWorker(n, regPort, workDir, options, stopEvent, results):
+	"""
+	Crawl with an Engine until stopEvent is set, then put its figures into results. The body of a worker process.
+	"""
+	sys.stdout = open(os.devnull, "w")
+	engine = Engine(options.downloaders, "127.0.0.1", regPort, spillDir = os.path.join(workDir, "spill%d" % n), \
+		downloadEngine = ASYNC_DOWNLOAD if options.async else THREADED_DOWNLOAD, nParser = options.parsers, \
+		storePath = os.path.join(workDir, "pages%d.json" % n))
+	startCPU = cpuTime()
+	engine.start()
+	stopEvent.wait()
+	fetches = metrics.REGISTRY.get("downloader_fetch_seconds")
+	statuses = dict((status[0], child.count()) for status, child in fetches.children())
+	histograms = dict((name, metrics.REGISTRY.get(name).cumulative()) for name in ("frontier_get_seconds", "frontier_put_seconds"))
+	histograms["downloader_fetch_seconds"] = fetches.labels(200).cumulative()
+	cpu = cpuTime() - startCPU
+	results.put({"worker": n, "statuses": statuses, "cpu": cpu, "rss": maxRSS(), "histograms": histograms})
+	engine.stop()
+
+def merge(cumulatives):
+	"""
+	Return the sum of the cumulative bucket counts of the same histogram taken in several processes.
+	"""
+	return [(bound, sum(c[i][1] for c in cumulatives)) for i, (bound, count) in enumerate(cumulatives[0])]
+
+def main():
+	parser = OptionParser()
+	parser.add_option("-w", "--workers", dest="workers", type="int", default=2, help="number of worker processes.")
+	parser.add_option("-d", "--download", dest="downloaders", type="int", default=10, help="number of downloaders per worker.")
+	parser.add_option("-a", "--async", dest="async", action="store_true", default=False, help="download on an event loop.")
+	parser.add_option("-r", "--parsers", dest="parsers", type="int", default=0, help="number of parser processes per worker.")
+	parser.add_option("-t", "--time", dest="duration", type="float", default=30, help="number of seconds to crawl.")
+	parser.add_option("--hosts", dest="hosts", type="int", default=100, help="number of hosts of the synthetic web.")
+	parser.add_option("--pages", dest="pages", type="int", default=1000, help="number of pages per host.")
+	parser.add_option("--degree", dest="degree", type="int", default=10, help="number of links per page.")
+	parser.add_option("--cross", dest="crossHost", type="float", default=0.2, help="share of the links to another host.")
+	parser.add_option("--size", dest="pageSize", type="int", default=10000, help="size of a page in bytes.")
+	parser.add_option("--latency", dest="latency", type="float", default=50.0, help="median response time in milliseconds.")
+	parser.add_option("--sigma", dest="sigma", type="float", default=0.5, help="sigma of the log-normal response time.")
+	parser.add_option("--errors", dest="errorRate", type="float", default=0.01, help="share of the responses which are 500 errors.")
+	parser.add_option("-o", "--output", dest="output", default=None, help="file the json report is written to, stdout by default.")
+	(options, args) = parser.parse_args()
+
+	nWorkers, duration = options.workers, options.duration
+	sock = socket.socket()
+	sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+	sock.bind(("", 0))
+	sock.listen(1024)
+	web = SyntheticWeb(sock.getsockname()[1], options.hosts, options.pages, options.degree, \
+		options.crossHost, options.pageSize)
+	server = multiprocessing.Process(target = serveWeb, \
+		args = (sock, web, options.latency / 1000, options.sigma, options.errorRate))
+	server.daemon = True
+	server.start()
+	sock.close()
+
+	workDir = tempfile.mkdtemp(prefix = "crawlbench")
+	cwd = os.getcwd()
+	os.chdir(workDir)
+	try:
+		regPort, urlPort = freePort(), freePort()
+		stopEvent, results = multiprocessing.Event(), multiprocessing.Queue()
+		workers = [multiprocessing.Process(target = runWorker, args = (n, regPort, workDir, options, stopEvent, results)) \
+			for n in range(nWorkers)]
+		for worker in workers:
+			worker.daemon = True
+			worker.start()
+
+		startCPU = cpuTime()
+		manager = CrawlerManager(web.seeds(), regPort, urlPort, os.path.join(workDir, "wal"), metricsPort = None)
+		start = time.time()
+		manager.start()
+		time.sleep(duration)
+		stopEvent.set()
+		elapsed = time.time() - start
+		reports = [results.get(timeout = WORKER_STOP_TIMEOUT) for worker in workers]
+		for worker in workers:
+			worker.join(WORKER_STOP_TIMEOUT)
+		manager.stop()
+		managerCPU = cpuTime() - startCPU
+	finally:
+		os.chdir(cwd)
+		server.terminate()
+		shutil.rmtree(workDir, True)
+
+	statuses = {}
+	for report in reports:
+		for status, count in report["statuses"].iteritems():
+			statuses[status] = statuses.get(status, 0) + count
+	pages = statuses.get("200", 0)
+	workerCPU = sum(report["cpu"] for report in reports)
+	latencies = {}
+	for name in reports[0]["histograms"]:
+		cumulative = merge([report["histograms"][name] for report in reports])
+		latencies[name] = dict(("p%d" % (q * 100), metrics.quantile(q, cumulative)) for q in QUANTILES)
+
+	report = {
+		"config": dict((key, value) for key, value in vars(options).iteritems() if key != "output"),
+		"seconds": elapsed,
+		"pages": pages,
+		"fetches_by_status": statuses,
+		"pages_per_second": pages / elapsed,
+		"cpu_ms_per_page": (workerCPU + managerCPU) * 1000 / max(pages, 1),
+		"worker_cpu_seconds": workerCPU,
+		"manager_cpu_seconds": managerCPU,
+		"worker_max_rss_mb": [report["rss"] for report in sorted(reports, key = lambda report: report["worker"])],
+		"manager_max_rss_mb": maxRSS(),
+		"latency_seconds": latencies,
+	}
+	output = open(options.output, "w") if options.output is not None else sys.stdout
+	json.dump(report, output, indent = 2, sort_keys = True)
+	output.write("\n")
+	if(output is not sys.stdout):
+		output.close()
+
+if __name__ == "__main__":
+	main()
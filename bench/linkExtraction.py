@@ -0,0 +1,71 @@
+#!/usr/bin/python
+"""
+Compare the CPU time per page of the BeautifulSoup link extractor and the streaming one.
+The pages are synthesized from the urls in test/sample_input, run from the top directory: 
+
+	python -m bench.linkExtraction [-r ROUNDS]
+"""
+
+import os
+import time
+from optparse import OptionParser
+from core.parser import extractLinks
+from core.linkExtractor import streamLinks
+
+SAMPLE_INPUT = "test/sample_input"
+LINKS_PER_PAGE = 40
+PARAGRAPH = "<p>Lorem ipsum dolor sit amet, <b>consectetur</b> adipiscing elit, sed do <i>eiusmod</i> tempor incididunt ut " \
+		"labore et dolore magna aliqua. Ut enim ad minim veniam, quis nostrud exercitation ullamco laboris.</p>\n"
+
+def makePages(urls):
+	"""
+	Return a list of (html, url) pairs, each page linking to LINKS_PER_PAGE of the given urls amid some typical boilerplate.
+	"""
+	pages = []
+	for i in range(0, len(urls), LINKS_PER_PAGE):
+		chunk = urls[i:i+LINKS_PER_PAGE]
+		parts = ['<!DOCTYPE html><html><head><title>page %d</title>' % i,
+			'<meta charset="utf-8"><link rel="stylesheet" href="/static/site.css">',
+			'<script type="text/javascript">var nav = "<a href=\'/never\'>"; function f(a, b) { return a < b; }</script>',
+			'<style>a > span { color: red; }</style></head><body>',
+			'<!-- header navigation <a href="/commented-out">old</a> -->', '<ul class="nav">']
+		for j in range(10):
+			parts.append('<li><a class="nav-item" href="/section/%d/index.html"><span>Section %d</span></a></li>' % (j, j))
+		parts.append('</ul><div id="content">')
+		for j, url in enumerate(chunk):
+			parts.append(PARAGRAPH * 3)
+			parts.append('<div class="story"><a href="%s" title="story %d">Story &amp; more %d</a></div>' % (url, j, j))
+		parts.append('</div><div id="footer"><a href="/about?lang=en&amp;ref=footer">About</a></div></body></html>')
+		pages.append(("\n".join(parts), chunk[0]))
+	return pages
+
+def measure(extractFunc, pages, rounds):
+	"""
+	Return the CPU seconds spent per page by extractFunc and the links it extracted in the last round.
+	"""
+	start = time.clock()
+	for r in range(rounds):
+		links = [extractFunc(html, url) for html, url in pages]
+	return (time.clock() - start) / (rounds * len(pages)), links
+
+def main():
+	parser = OptionParser()
+	parser.add_option("-r", "--rounds", dest="rounds", default=20, help="number of times each page is parsed.")
+	(options, args) = parser.parse_args()
+
+	f = open(os.path.realpath(SAMPLE_INPUT), "r")
+	urls = [line.strip() for line in f.readlines() if line.strip()]
+	f.close()
+	pages = makePages(urls)
+	size = sum(len(html) for html, url in pages) / len(pages)
+
+	treeTime, treeLinks = measure(extractLinks, pages, int(options.rounds))
+	streamTime, streamLinks_ = measure(streamLinks, pages, int(options.rounds))
+	same = all(set(a) == set(b) for a, b in zip(treeLinks, streamLinks_))
+	print "%d pages of %d bytes on average, %d links per page" % (len(pages), size, len(treeLinks[0]))
+	print "tree:   %8.3f ms/page" % (treeTime * 1000)
+	print "stream: %8.3f ms/page" % (streamTime * 1000)
+	print "speedup: %.1fx, same links: %s" % (treeTime / streamTime, same)
+
+if __name__ == "__main__":
+	main()
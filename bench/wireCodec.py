@@ -0,0 +1,60 @@
+#!/usr/bin/python
+"""
+Compare the size and the CPU time per url of the wire format and of the pickles sent by send_pyobj, 
+on batches of the urls in test/sample_input. Run from the top directory:
+
+	python -m bench.wireCodec [-b BATCH_SIZE] [-r ROUNDS]
+"""
+
+import os
+import time
+import cPickle
+from optparse import OptionParser
+from lib import wire
+
+SAMPLE_INPUT = "test/sample_input"
+
+def measure(encodeFunc, decodeFunc, batches, rounds):
+	"""
+	Return the bytes, the CPU seconds to encode and the CPU seconds to decode per url, 
+	and whether every batch came back unchanged.
+	"""
+	nUrls = sum(len(batch) for batch in batches)
+	start = time.clock()
+	for r in range(rounds):
+		frames = [encodeFunc(batch) for batch in batches]
+	encodeTime = time.clock() - start
+	start = time.clock()
+	for r in range(rounds):
+		decoded = [decodeFunc(frame) for frame in frames]
+	decodeTime = time.clock() - start
+	same = all(set(a) == set(b) for a, b in zip(batches, decoded))
+	return float(sum(len(frame) for frame in frames)) / nUrls, encodeTime / (rounds * nUrls), decodeTime / (rounds * nUrls), same
+
+def main():
+	parser = OptionParser()
+	parser.add_option("-b", "--batch", dest="batch", default=100, help="number of urls per message.")
+	parser.add_option("-r", "--rounds", dest="rounds", default=20, help="number of times each batch is encoded and decoded.")
+	(options, args) = parser.parse_args()
+
+	f = open(os.path.realpath(SAMPLE_INPUT), "r")
+	urls = [line.strip() for line in f.readlines() if line.strip()]
+	f.close()
+	size = int(options.batch)
+	batches = [set(urls[i:i+size]) for i in range(0, len(urls), size)]
+	rounds = int(options.rounds)
+
+	codecs = [("pickle", lambda batch: cPickle.dumps(batch, cPickle.HIGHEST_PROTOCOL), cPickle.loads),
+		("wire", lambda batch: wire.encodeURLs(batch, wire.NONE), wire.decodeURLs),
+		("wire+zlib", lambda batch: wire.encodeURLs(batch, wire.ZLIB), wire.decodeURLs)]
+	if(wire.zstandard is not None):
+		codecs.append(("wire+zstd", lambda batch: wire.encodeURLs(batch, wire.ZSTD), wire.decodeURLs))
+
+	print "%d urls in batches of %d, %d bytes per url on average" % (len(urls), size, sum(len(url) for url in urls) / len(urls))
+	print "%-10s %10s %14s %14s %6s" % ("codec", "bytes/url", "encode us/url", "decode us/url", "same")
+	for name, encodeFunc, decodeFunc in codecs:
+		perUrl, encodeTime, decodeTime, same = measure(encodeFunc, decodeFunc, batches, rounds)
+		print "%-10s %10.1f %14.2f %14.2f %6s" % (name, perUrl, encodeTime * 1e6, decodeTime * 1e6, same)
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,508 @@
+import asyncore
+import socket
+import ssl
+import time
+import logging
+import sys
+from collections import deque
+from urlparse import urlsplit, urljoin
+from Queue import Empty, Full
+
+from downloader import Downloader, URL_WAIT_TIME, FETCH_LATENCY, FETCHED_BYTES, NOT_MODIFIED
+
+DEFAULT_MAX_CONNECTIONS = 1000
+DEFAULT_MAX_PER_HOST = 2
+DEFAULT_CONNECT_TIMEOUT = 10
+DEFAULT_READ_TIMEOUT = 30
+DEFAULT_KEEP_ALIVE = 15
+MAX_REDIRECTS = 5
+MAX_PAGE_SIZE = 10 * 1024 * 1024
+LOOP_INTERVAL = 0.05
+TIMEOUT_CHECK_INTERVAL = 0.5
+RECV_SIZE = 65536
+DEFAULT_PORTS = {"http": 80, "https": 443}
+REDIRECT_CODES = (301, 302, 303, 307, 308)
+EMPTY_BODY_CODES = (204, 304)
+
+class AsyncDownloader(Downloader):
+	"""
+	An AsyncDownloader is a single thread which keeps up to maxConnections downloads in flight on one asyncore event loop.
+	It takes urls from the same frontier and puts the same page dicts into the same page queue as a Downloader does.
+
+	Connections are pooled per origin (scheme, host, port) and kept alive between requests.
+	At most maxPerHost connections are opened to an origin, the urls exceeding this limit wait for a connection to be released.
+
+	Data members:
+	_map: dict{ fileno: HTTPConnection }
+		the sockets watched by the event loop.
+
+	_idle: dict{ origin: list[ HTTPConnection ] }
+		the kept-alive connections which are not serving any request.
+
+	_busy: dict{ origin: int }
+		the number of connections serving a request, per origin.
+
+	_waiting: dict{ origin: deque[ (url, redirects) ] }
+		the urls waiting for a connection to their origin.
+
+	_resolving: set[ origin ]
+		the origins waiting for their host to be resolved by the DNS cache before a connection can be opened.
+
+	_pages: deque
+		the downloaded pages which did not fit in the page queue yet. No new url is taken from the frontier until it's flushed.
+
+	_fetches: dict{ url: (url taken from the frontier, start time) }
+		the downloads in flight, by the url currently requested, which differs from the one taken from the frontier
+		after a redirect. callbackFun is called with the latter when the download finishes.
+	"""
+
+	def __init__(self, urlIn, pageQ, logger = None, userAgent = Downloader.DEFAULT_USER_AGENT, callbackFun = None, \
+		maxConnections = DEFAULT_MAX_CONNECTIONS, maxPerHost = DEFAULT_MAX_PER_HOST, \
+		connectTimeout = DEFAULT_CONNECT_TIMEOUT, readTimeout = DEFAULT_READ_TIMEOUT, keepAlive = DEFAULT_KEEP_ALIVE, dnsCache = None, \
+		revisitPolicy = None):
+		"""
+		Initialize an AsyncDownloader.
+		---------  Param --------
+		urlIn, pageQ, logger, userAgent, callbackFun, dnsCache, revisitPolicy:
+			the same as Downloader. A page is recorded with the revisit policy under the url it was downloaded from, after the
+			redirects, so it's revisited there directly. Without a dnsCache, opening a connection blocks the event loop on the system resolver.
+		maxConnections: (int)
+			the maximum number of urls being downloaded at the same time.
+		maxPerHost: (int)
+			the maximum number of connections opened to a single origin.
+		connectTimeout: (float)
+			the number of seconds to wait for a connection (and TLS handshake) to complete.
+		readTimeout: (float)
+			the number of seconds to wait for the next bytes of a response.
+		keepAlive: (float)
+			the number of seconds an idle connection is kept open.
+
+		---------  Return --------
+		None
+		"""
+		super(AsyncDownloader, self).__init__(urlIn, pageQ, logger, userAgent, callbackFun, dnsCache, revisitPolicy)
+		self.daemon = True
+		self._maxConnections = maxConnections
+		self._maxPerHost = maxPerHost
+		self.connectTimeout = connectTimeout
+		self.readTimeout = readTimeout
+		self.keepAlive = keepAlive
+		self.sslContext = ssl.create_default_context()
+		self._map = {}
+		self._idle = {}
+		self._busy = {}
+		self._waiting = {}
+		self._resolving = set()
+		self._inFlight = 0
+		self._pages = deque()
+		self._fetches = {}
+		self._lastTimeoutCheck = time.time()
+
+	def download(self, url, redirects = 0):
+		"""
+		Start downloading a web page from url. The page is put into the page queue when the download completes.
+		"""
+		if(url not in self._fetches):
+			self._fetches[url] = (url, time.time())
+		try:
+			parts = urlsplit(url)
+			scheme = parts.scheme.lower()
+			origin = (scheme, parts.hostname, parts.port or DEFAULT_PORTS[scheme])
+		except:
+			self.log(logging.WARNING, str(sys.exc_info()[0]) + "Unable to open " + url)
+			self._finish(url, None, None)
+			return
+		self.log(logging.INFO, "downloading file: "+url)
+		self._inFlight += 1
+		self._waiting.setdefault(origin, deque()).append((url, redirects))
+		self._dispatch(origin)
+
+	def _dispatch(self, origin):
+		"""
+		Hand the urls waiting for origin to idle or new connections, as long as the origin's connection limit allows.
+		New connections wait for the host of origin to be resolved.
+		"""
+		self._resolving.discard(origin)
+		waiting = self._waiting.get(origin)
+		while(waiting and self._busy.get(origin, 0) < self._maxPerHost):
+			url, redirects = waiting[0]
+			idle = self._idle.get(origin)
+			try:
+				if(idle):
+					conn = idle.pop()
+				else:
+					address = self._address(origin)
+					if(address is None):
+						self._resolving.add(origin)
+						break
+					conn = HTTPConnection(self, origin, address)
+			except:
+				waiting.popleft()
+				self._inFlight -= 1
+				self.log(logging.WARNING, str(sys.exc_info()[0]) + "Unable to open " + url)
+				self._finish(url, None, None)
+				continue
+			waiting.popleft()
+			self._busy[origin] = self._busy.get(origin, 0) + 1
+			conn.request(url, redirects)
+		if(not waiting):
+			self._waiting.pop(origin, None)
+		if(origin in self._idle and not self._idle[origin]):
+			self._idle.pop(origin)
+
+	def _address(self, origin):
+		"""
+		Return the (family, address) to connect to for origin, or None if its host is not resolved yet.
+		"""
+		if(self._dnsCache is None):
+			family, socktype, proto, canonname, address = socket.getaddrinfo(origin[1], origin[2], 0, socket.SOCK_STREAM)[0]
+			return family, address
+		addresses = self._dnsCache.lookup(origin[1])
+		if(addresses is None):
+			return None
+		family, socktype, proto, canonname, address = addresses[0]
+		return family, address[:1] + (origin[2],) + address[2:]
+
+	def requestDone(self, conn, url, redirects, status, headers, body, keepAlive):
+		"""
+		Called by a connection when the response to url is complete.
+		"""
+		self._release(conn, keepAlive)
+		if(status in REDIRECT_CODES and headers.has_key("location") and redirects < MAX_REDIRECTS):
+			self._inFlight -= 1
+			location = urljoin(url, headers["location"])
+			if(location in self._fetches):
+				self._finish(url, status, headers)
+				return
+			self._fetches[location] = self._fetches.pop(url, (url, time.time()))
+			self.download(location, redirects + 1)
+			return
+		self._inFlight -= 1
+		self._finish(url, status, headers)
+		if(status == NOT_MODIFIED):
+			self._changed(url, status, headers)
+			return
+		if(status != 200):
+			self.log(logging.WARNING, "HTTP Error %d: Unable to open %s" % (status, url))
+			return
+		FETCHED_BYTES.inc(len(body))
+		revisit = self._isRevisit(url)
+		if(not self._changed(url, status, headers, body)):
+			return
+		try:
+			self._pages.append(self._makePage(url, body, headers.get("content-type"), revisit))
+		except:
+			self.log(logging.WARNING, str(sys.exc_info()[0]) + "Unable to open " + url)
+
+	def requestFailed(self, conn, url, redirects, reason):
+		"""
+		Called by a connection when url can not be downloaded on it. The connection is closed already.
+		"""
+		self._release(conn, False)
+		self._inFlight -= 1
+		self.log(logging.WARNING, "%s Unable to open %s" % (reason, url))
+		self._finish(url, None, None)
+
+	def _finish(self, url, status, headers):
+		"""
+		Report the end of the download which is requesting url to callbackFun.
+		"""
+		fetch = self._fetches.pop(url, None)
+		if(fetch is None):
+			return
+		elapsed = time.time() - fetch[1]
+		FETCH_LATENCY.labels(status or "error").observe(elapsed)
+		if(self._callbackFun is not None):
+			self._callbackFun(fetch[0], status, elapsed, headers)
+
+	def retry(self, conn, url, redirects):
+		"""
+		Called by a kept-alive connection which was closed by the server before the request was served.
+		"""
+		self._release(conn, False)
+		self._inFlight -= 1
+		self.download(url, redirects)
+
+	def idleClosed(self, conn):
+		"""
+		Called by an idle connection which is closed.
+		"""
+		idle = self._idle.get(conn.origin)
+		if(idle and conn in idle):
+			idle.remove(conn)
+			if(not idle):
+				self._idle.pop(conn.origin)
+
+	def _release(self, conn, keepAlive):
+		"""
+		Release a connection after its request is done, reusing it for the next url waiting for its origin if possible.
+		"""
+		origin = conn.origin
+		self._busy[origin] -= 1
+		if(self._busy[origin] == 0):
+			self._busy.pop(origin)
+		if(keepAlive):
+			conn.deadline = time.time() + self.keepAlive
+			self._idle.setdefault(origin, []).append(conn)
+		else:
+			conn.close()
+		self._dispatch(origin)
+
+	def _flushPages(self):
+		"""
+		Move the downloaded pages into the page queue until it is full.
+		"""
+		try:
+			while(self._pages):
+				self._pageQ.put_nowait(self._pages[0])
+				self._pages.popleft()
+		except Full:
+			self.log(logging.INFO, "pageQ is full")
+
+	def _pull(self):
+		"""
+		Take urls from the frontier until maxConnections downloads are in flight.
+		Block for a while if there is nothing else to do.
+		"""
+		block = not self._map and not self._resolving
+		while(self._inFlight < self._maxConnections):
+			try:
+				url = self._urlIn.get(block, URL_WAIT_TIME)
+			except Empty:
+				if(block):
+					self.log(logging.INFO, "urlIn is empty")
+				return
+			except (IOError, OSError) as e:
+				## the frontier failed to read or write its spill files, e.g. out of file descriptors.
+				self.log(logging.ERROR, "unable to get an url: %s" % e)
+				return
+			block = False
+			if url is not None:
+				self.download(url)
+
+	def _checkTimeouts(self):
+		"""
+		Abort the connections whose deadline has passed.
+		"""
+		now = time.time()
+		if(now - self._lastTimeoutCheck < TIMEOUT_CHECK_INTERVAL):
+			return
+		self._lastTimeoutCheck = now
+		for conn in self._map.values():
+			if(now > conn.deadline):
+				conn.timeout()
+
+	def run(self):
+		"""
+		Start downloading.
+		"""
+		while(True):
+			self._flushPages()
+			if(not self._pages):
+				self._pull()
+			for origin in list(self._resolving):
+				self._dispatch(origin)
+			if(self._map):
+				asyncore.loop(LOOP_INTERVAL, True, self._map, 1)
+				self._checkTimeouts()
+			elif(self._pages or self._resolving):
+				time.sleep(LOOP_INTERVAL)
+
+class HTTPConnection(asyncore.dispatcher):
+	"""
+	An HTTPConnection is a non-blocking HTTP/1.1 client connection to a single origin, serving one request at a time.
+	It speaks TLS for https origins and reports the outcome of every request back to its AsyncDownloader.
+	"""
+
+	def __init__(self, owner, origin, address):
+		"""
+		Start connecting to origin, a tuple (scheme, host, port), at address, a tuple (family, socket address).
+		"""
+		asyncore.dispatcher.__init__(self, map = owner._map)
+		self._owner = owner
+		self.origin = origin
+		self.deadline = time.time() + owner.connectTimeout
+		self._url = None
+		self._redirects = 0
+		self._served = 0
+		self._handshaking = False
+		self._outBuf = ""
+		self.create_socket(address[0], socket.SOCK_STREAM)
+		self.connect(address[1])
+
+	def request(self, url, redirects):
+		"""
+		Send a GET request for url.
+		"""
+		parts = urlsplit(url)
+		path = parts.path or "/"
+		if(parts.query):
+			path += "?" + parts.query
+		host = self.origin[1] if self.origin[2] == DEFAULT_PORTS[self.origin[0]] else "%s:%d" % self.origin[1:]
+		self._url = url
+		self._redirects = redirects
+		conditions = "".join("%s: %s\r\n" % header for header in self._owner._conditionalHeaders(url))
+		self._outBuf = "GET %s HTTP/1.1\r\nHost: %s\r\nUser-Agent: %s\r\nAccept-Encoding: identity\r\nConnection: keep-alive\r\n%s\r\n" \
+				% (path.encode("utf-8") if isinstance(path, unicode) else path, host, self._owner._userAgent, conditions)
+		self._inBuf = ""
+		self._received = 0
+		self._status = None
+		self._headers = None
+		self._version = None
+		self._bodyLength = None
+		self._chunked = False
+		self._body = []
+		self.deadline = time.time() + (self._owner.readTimeout if self.connected else self._owner.connectTimeout)
+
+	def writable(self):
+		return not self.connected or self._handshaking or bool(self._outBuf)
+
+	def handle_connect(self):
+		if(self.origin[0] == "https"):
+			self.socket = self._owner.sslContext.wrap_socket(self.socket, server_hostname = self.origin[1], do_handshake_on_connect = False)
+			self._handshaking = True
+			self._handshake()
+
+	def _handshake(self):
+		try:
+			self.socket.do_handshake()
+			self._handshaking = False
+			self.deadline = time.time() + self._owner.readTimeout
+		except ssl.SSLError as e:
+			if(e.args[0] not in (ssl.SSL_ERROR_WANT_READ, ssl.SSL_ERROR_WANT_WRITE)):
+				raise
+
+	def handle_write(self):
+		if(self._handshaking):
+			self._handshake()
+			return
+		try:
+			sent = self.send(self._outBuf)
+		except ssl.SSLError as e:
+			if(e.args[0] not in (ssl.SSL_ERROR_WANT_READ, ssl.SSL_ERROR_WANT_WRITE)):
+				raise
+			return
+		self._outBuf = self._outBuf[sent:]
+
+	def handle_read(self):
+		if(self._handshaking):
+			self._handshake()
+			return
+		try:
+			data = self.recv(RECV_SIZE)
+			while(data and isinstance(self.socket, ssl.SSLSocket) and self.socket.pending()):
+				data += self.recv(RECV_SIZE)
+		except ssl.SSLError as e:
+			if(e.args[0] not in (ssl.SSL_ERROR_WANT_READ, ssl.SSL_ERROR_WANT_WRITE)):
+				raise
+			return
+		if(not data or self._url is None):
+			return
+		self._received += len(data)
+		if(self._received > MAX_PAGE_SIZE):
+			self._fail("page too large")
+			return
+		self.deadline = time.time() + self._owner.readTimeout
+		self._inBuf += data
+		self._parse()
+
+	def _parse(self):
+		"""
+		Consume as much of the received bytes as possible, and complete the request if the response is entire.
+		"""
+		while(self._headers is None):
+			end = self._inBuf.find("\r\n\r\n")
+			if(end == -1):
+				return
+			lines = self._inBuf[:end].split("\r\n")
+			self._inBuf = self._inBuf[end+4:]
+			self._version, status = lines[0].split(None, 2)[:2]
+			self._status = int(status)
+			if(100 <= self._status < 200):
+				continue
+			self._headers = {}
+			for line in lines[1:]:
+				name, sep, value = line.partition(":")
+				self._headers[name.strip().lower()] = value.strip()
+			self._chunked = self._headers.get("transfer-encoding", "").lower() == "chunked"
+			if(self._status in EMPTY_BODY_CODES):
+				self._chunked = False
+				self._bodyLength = 0
+			elif(not self._chunked and self._headers.has_key("content-length")):
+				self._bodyLength = int(self._headers["content-length"])
+
+		if(self._chunked):
+			while(True):
+				end = self._inBuf.find("\r\n")
+				if(end == -1):
+					return
+				size = int(self._inBuf[:end].split(";")[0], 16)
+				if(size == 0):
+					if(self._inBuf.find("\r\n\r\n", end) == -1):
+						return
+					self._inBuf = ""
+					break
+				if(len(self._inBuf) < end + 2 + size + 2):
+					return
+				self._body.append(self._inBuf[end+2:end+2+size])
+				self._inBuf = self._inBuf[end+2+size+2:]
+		elif(self._bodyLength is not None):
+			if(len(self._inBuf) < self._bodyLength):
+				return
+			self._body.append(self._inBuf[:self._bodyLength])
+			self._inBuf = ""
+		else:
+			## the body is delimited by the end of the connection.
+			return
+		self._complete(True)
+
+	def _complete(self, reusable):
+		connHeader = self._headers.get("connection", "").lower()
+		if(self._version == "HTTP/1.1"):
+			keepAlive = reusable and connHeader != "close"
+		else:
+			keepAlive = reusable and connHeader == "keep-alive"
+		url, redirects = self._url, self._redirects
+		self._url = None
+		self._served += 1
+		self._owner.requestDone(self, url, redirects, self._status, self._headers, "".join(self._body), keepAlive)
+
+	def _fail(self, reason):
+		url, redirects = self._url, self._redirects
+		self._url = None
+		self.close()
+		self._owner.requestFailed(self, url, redirects, reason)
+
+	def timeout(self):
+		"""
+		Abort the connection whose deadline has passed.
+		"""
+		if(self._url is None):
+			self.close()
+			self._owner.idleClosed(self)
+		else:
+			self._fail("timed out:")
+
+	def handle_close(self):
+		if(self._url is None):
+			self.close()
+			self._owner.idleClosed(self)
+		elif(self._headers is not None and self._bodyLength is None and not self._chunked):
+			self._body.append(self._inBuf)
+			self.close()
+			self._complete(False)
+		elif(self._served > 0 and self._received == 0):
+			url, redirects = self._url, self._redirects
+			self._url = None
+			self.close()
+			self._owner.retry(self, url, redirects)
+		else:
+			self._fail("connection closed:")
+
+	def handle_error(self):
+		reason = str(sys.exc_info()[0])
+		if(self._url is None):
+			self.close()
+			self._owner.idleClosed(self)
+		else:
+			self._fail(reason)
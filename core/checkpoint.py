@@ -0,0 +1,224 @@
+"""
+The crawl state of a worker saved to local disk, so a restarted worker picks up where it left off.
+"""
+
+import struct
+import json
+import mmap
+import time
+import os
+
+from urlFilter import EXACT_DEDUP
+
+MANIFEST = "MANIFEST"
+FRONTIER = "frontier"
+HOSTS = "hosts"
+REVISITS = "revisits"
+SEEN = "seen."
+
+_COUNT = struct.Struct(">I")
+_LENGTH = struct.Struct(">H")
+_HOST = struct.Struct(">dIdd")
+_REVISIT = struct.Struct(">IIdddd")
+
+def _mapped(path):
+	"""
+	Return the content of the file at path as a read-only mmap, or an empty string if the file is missing or empty.
+	"""
+	if(not os.path.exists(path) or os.path.getsize(path) == 0):
+		return ""
+	f = open(path, "rb")
+	try:
+		return mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+	finally:
+		f.close()
+
+def _lines(data):
+	"""
+	Yield the newline terminated lines of data, without their newline. A last line cut short by a crash is left out.
+	"""
+	start = 0
+	while(True):
+		end = data.find("\n", start)
+		if(end == -1):
+			return
+		yield data[start:end]
+		start = end + 1
+
+class Checkpoint(object):
+	"""
+	A Checkpoint keeps the state of a worker in a directory: the urls of its frontier, the urls it has seen,
+	the politeness state of the hosts it crawls and the validators and change rates of the pages it revisits.
+	It's saved periodically and loaded when the worker starts again.
+
+	Files:
+		frontier: the urls of the frontier, one per line, rewritten by each save.
+		hosts: the politeness state of the hosts, rewritten by each save:
+			records: uint32 | { host length: uint16 | host | response time: float64 | backoff: uint32 | crawl delay: float64 |
+			next time: float64 }
+		revisits: the state of the RevisitPolicy, if any, rewritten by each save:
+			records: uint32 | { url, etag, last modified, content hash, each as length: uint16 | bytes (empty if None) | 
+			visits: uint32 | changes: uint32 | first visit: float64 | last visit: float64 | interval: float64 | next visit: float64 }
+		seen.<backend>: the state of the DupEliminator. The exact backend only appends the urls seen since the last save,
+			one per line; the Bloom backends rewrite their dumped filter.
+		MANIFEST: a json object telling when the checkpoint was saved, written last. A directory without one holds no checkpoint.
+
+	Files are rewritten by renaming a complete new version over the old one, and read through mmap.
+	The seen urls are snapshot before the frontier and written after it, so a crash in between can make a restarted worker
+	download a page twice, but never lose a url: a url is seen only once it's put into the frontier.
+	"""
+	def __init__(self, directory):
+		"""
+		Initialize a Checkpoint kept in directory, which is created if needed.
+		"""
+		if(not os.path.exists(directory)):
+			os.makedirs(directory)
+		self._dir = directory
+
+	def _path(self, name):
+		return os.path.join(self._dir, name)
+
+	def _replace(self, name, data):
+		"""
+		Write data to the file name through a temporary file, so the file is either the old or the new version after a crash.
+		"""
+		path = self._path(name)
+		f = open(path + ".tmp", "wb")
+		try:
+			f.write(data)
+			f.flush()
+			os.fsync(f.fileno())
+		finally:
+			f.close()
+		os.rename(path + ".tmp", path)
+
+	def exists(self):
+		"""
+		Return True if a checkpoint was saved in the directory.
+		"""
+		return os.path.exists(self._path(MANIFEST))
+
+	def save(self, seen, urls, hosts, dupBackend, revisits = None):
+		"""
+		Save a checkpoint.
+		---------  Param --------
+		seen:
+			the snapshot of the DupEliminator, taken before urls.
+		urls: list[ url ]
+			the urls of the frontier, and those handed out but not crawled yet.
+		hosts: list[ (host, response time, backoff, crawl delay, next time) ]
+			the snapshot of the PolitenessPolicy.
+		dupBackend: (str)
+			the backend of the DupEliminator.
+		revisits: list[ (url, etag, last modified, content hash, visits, changes, first visit, last visit, interval, next visit) ]
+			the snapshot of the RevisitPolicy, None if pages are not revisited.
+
+		---------  Return --------
+		None.
+		"""
+		self._replace(FRONTIER, "".join((url.encode("utf-8") if isinstance(url, unicode) else url) + "\n" for url in urls))
+
+		parts = [_COUNT.pack(len(hosts))]
+		for host, responseTime, backoff, crawlDelay, nextTime in hosts:
+			parts.append(_LENGTH.pack(len(host)))
+			parts.append(host)
+			parts.append(_HOST.pack(responseTime, backoff, crawlDelay, nextTime))
+		self._replace(HOSTS, "".join(parts))
+
+		if(revisits is not None):
+			parts = [_COUNT.pack(len(revisits))]
+			for record in revisits:
+				for field in record[:4]:
+					field = (field.encode("utf-8") if isinstance(field, unicode) else field) or ""
+					parts.append(_LENGTH.pack(len(field)))
+					parts.append(field)
+				parts.append(_REVISIT.pack(*record[4:]))
+			self._replace(REVISITS, "".join(parts))
+
+		if(dupBackend == EXACT_DEDUP):
+			f = open(self._path(SEEN + dupBackend), "ab")
+			try:
+				f.write("".join((url.encode("utf-8") if isinstance(url, unicode) else url) + "\n" for url in seen))
+				f.flush()
+				os.fsync(f.fileno())
+			finally:
+				f.close()
+		else:
+			self._replace(SEEN + dupBackend, seen)
+
+		self._replace(MANIFEST, json.dumps({"time": time.time(), "urls": len(urls), "hosts": len(hosts), "dedup": dupBackend, \
+			"revisits": len(revisits) if revisits is not None else 0}))
+
+	def loadSeen(self, dupEliminator):
+		"""
+		Restore the urls seen by dupEliminator, if they were saved with its backend.
+		"""
+		data = _mapped(self._path(SEEN + dupEliminator.backend))
+		if(not data):
+			return
+		try:
+			if(dupEliminator.backend == EXACT_DEDUP):
+				dupEliminator.restore(_lines(data))
+			else:
+				dupEliminator.restore(data)
+		finally:
+			if(isinstance(data, mmap.mmap)):
+				data.close()
+
+	def loadURLs(self):
+		"""
+		Return the list of the saved urls.
+		"""
+		data = _mapped(self._path(FRONTIER))
+		try:
+			return list(_lines(data))
+		finally:
+			if(isinstance(data, mmap.mmap)):
+				data.close()
+
+	def loadHosts(self):
+		"""
+		Return the saved politeness state, a list of (host, response time, backoff, crawl delay, next time).
+		"""
+		data = _mapped(self._path(HOSTS))
+		if(not data):
+			return []
+		try:
+			records = []
+			(count,) = _COUNT.unpack_from(data)
+			offset = _COUNT.size
+			for i in xrange(count):
+				(length,) = _LENGTH.unpack_from(data, offset)
+				offset += _LENGTH.size
+				host = data[offset:offset + length]
+				offset += length
+				records.append((host, ) + _HOST.unpack_from(data, offset))
+				offset += _HOST.size
+			return records
+		finally:
+			data.close()
+
+	def loadRevisits(self):
+		"""
+		Return the saved state of the RevisitPolicy, a list of (url, etag, last modified, content hash, visits, changes,
+		first visit, last visit, interval, next visit).
+		"""
+		data = _mapped(self._path(REVISITS))
+		if(not data):
+			return []
+		try:
+			records = []
+			(count,) = _COUNT.unpack_from(data)
+			offset = _COUNT.size
+			for i in xrange(count):
+				fields = []
+				for j in range(4):
+					(length,) = _LENGTH.unpack_from(data, offset)
+					offset += _LENGTH.size
+					fields.append(data[offset:offset + length] or None)
+					offset += length
+				records.append(tuple(fields) + _REVISIT.unpack_from(data, offset))
+				offset += _REVISIT.size
+			return records
+		finally:
+			data.close()
@@ -0,0 +1,275 @@
+"""
+A cache of the addresses of the hosts being crawled, resolved ahead of time by a pool of resolver threads.
+"""
+
+from threading import Thread, Lock, Event
+from Queue import Queue, Empty
+from datetime import datetime
+import urllib2
+import httplib
+import logging
+import socket
+import time
+
+from lib.lrucache import LRUCache
+
+DEFAULT_TTL = 300
+NEGATIVE_TTL = 60
+DEFAULT_CAPACITY = 100000
+DEFAULT_RESOLVERS = 8
+RESOLVE_TIMEOUT = 10
+REQUEST_WAIT_TIME = 1
+
+class DNSCache(object):
+	"""
+	A DNSCache keeps the addresses of the most recently used hosts for ttl seconds, and the failure to resolve a host
+	for negativeTTL seconds, so a host is looked up once in a while rather than once per download.
+	The system resolver does not tell the TTL of the records, every address is kept for the same time.
+
+	Hosts are resolved by a pool of resolver threads. prefetch() queues a host without waiting, e.g. when its urls enter
+	the frontier, so its address is known by the time it's served; getaddrinfo() waits for the address if it's not known yet,
+	lookup() never waits. Until the resolvers are started, hosts are resolved in the calling thread.
+
+	Data members:
+	_entries: LRUCache{ host: (expiry time, list[ (family, socktype, proto, canonname, sockaddr) ] | socket.gaierror) }
+		the addresses of the most recently used hosts, with port 0, or the error resolving them gave.
+
+	_pending: dict{ host: threading.Event }
+		the hosts queued for the resolvers, with the event set once they are resolved.
+	"""
+	def __init__(self, ttl = DEFAULT_TTL, negativeTTL = NEGATIVE_TTL, capacity = DEFAULT_CAPACITY, nResolvers = DEFAULT_RESOLVERS, \
+		logger = None):
+		"""
+		Initialize a DNSCache.
+		---------  Param --------
+		ttl: (float)
+			the number of seconds the addresses of a host are kept.
+		negativeTTL: (float)
+			the number of seconds a host which can't be resolved is remembered as such.
+		capacity: (int)
+			the number of hosts kept.
+		nResolvers: (int)
+			the number of resolver threads.
+		logger: (logging.Logger)
+			A logger used to log info/warning/error about resolving.
+
+		---------  Return --------
+		None.
+		"""
+		self._ttl = ttl
+		self._negativeTTL = negativeTTL
+		self._entries = LRUCache(capacity)
+		self._pending = {}
+		self._requests = Queue()
+		self._lock = Lock()
+		self._logger = logger
+		self._running = False
+		self._resolvers = [Thread(target = self._resolveLoop) for i in range(max(nResolvers, 1))]
+		for resolver in self._resolvers:
+			resolver.daemon = True
+
+	def log(self, level, msg):
+		"""
+		Log info/warning/error message in log file.
+		"""
+		if(self._logger is not None):
+			if level == logging.INFO:
+				self._logger.info("[%s] INFO: %s" % (datetime.now(), msg))
+			elif level == logging.WARNING:
+				self._logger.warn("[%s] WARNING: %s" % (datetime.now(), msg))
+			else:
+				self._logger.error("[%s] ERROR: %s" % (datetime.now(), msg))
+
+	def start(self):
+		"""
+		Start the resolver threads.
+		"""
+		self._running = True
+		for resolver in self._resolvers:
+			resolver.start()
+
+	def stop(self):
+		"""
+		Stop the resolver threads once they are done with the hosts being resolved.
+		"""
+		self._running = False
+		for resolver in self._resolvers:
+			resolver.join()
+
+	def prefetch(self, host):
+		"""
+		Have host resolved in the background if its addresses are not known, without waiting.
+		"""
+		if(host and self._running):
+			self._lock.acquire()
+			try:
+				if(self._fresh(host) is None):
+					self._request(host)
+			finally:
+				self._lock.release()
+
+	def lookup(self, host):
+		"""
+		Return the addresses of host, with port 0, if they are known, None otherwise, in which case host is prefetched.
+		Raise socket.gaierror if host is known not to resolve.
+		"""
+		self._lock.acquire()
+		try:
+			entry = self._fresh(host)
+			if(entry is None and self._running):
+				self._request(host)
+				return None
+		finally:
+			self._lock.release()
+		if(entry is None):
+			entry = self._resolve(host)
+		return self._addresses(entry)
+
+	def getaddrinfo(self, host, port, family = 0, socktype = 0, proto = 0, flags = 0):
+		"""
+		A cached socket.getaddrinfo for stream sockets, waiting for host to be resolved if its addresses are not known.
+		"""
+		try:
+			port = int(port or 0)
+		except ValueError:
+			return socket.getaddrinfo(host, port, family, socktype, proto, flags)
+		if(socktype not in (0, socket.SOCK_STREAM) or flags):
+			return socket.getaddrinfo(host, port, family, socktype, proto, flags)
+
+		self._lock.acquire()
+		try:
+			entry = self._fresh(host)
+			event = self._request(host) if entry is None and self._running else None
+		finally:
+			self._lock.release()
+		if(event is not None):
+			event.wait(RESOLVE_TIMEOUT)
+			self._lock.acquire()
+			entry = self._fresh(host)
+			self._lock.release()
+		if(entry is None):
+			entry = self._resolve(host)
+		return [(f, t, p, canonname, sockaddr[:1] + (port,) + sockaddr[2:]) \
+			for f, t, p, canonname, sockaddr in self._addresses(entry) \
+			if (family == 0 or f == family) and (proto == 0 or p == proto)]
+
+	def createConnection(self, address, timeout = socket._GLOBAL_DEFAULT_TIMEOUT, source_address = None):
+		"""
+		socket.create_connection resolving the host through the cache.
+		"""
+		host, port = address
+		err = None
+		for family, socktype, proto, canonname, sockaddr in self.getaddrinfo(host, port, 0, socket.SOCK_STREAM):
+			sock = None
+			try:
+				sock = socket.socket(family, socktype, proto)
+				if(timeout is not socket._GLOBAL_DEFAULT_TIMEOUT):
+					sock.settimeout(timeout)
+				if(source_address):
+					sock.bind(source_address)
+				sock.connect(sockaddr)
+				return sock
+			except socket.error as e:
+				err = e
+				if(sock is not None):
+					sock.close()
+		if(err is not None):
+			raise err
+		raise socket.error("getaddrinfo returns an empty list")
+
+	def handlers(self):
+		"""
+		Return the urllib2 handlers opening http and https connections to the addresses found in the cache,
+		to be given to urllib2.build_opener().
+		"""
+		return [CachedHTTPHandler(self), CachedHTTPSHandler(self)]
+
+	def _fresh(self, host):
+		"""
+		Return the entry of host if it has not expired, None otherwise. Called with the lock held.
+		"""
+		entry = self._entries.get(host)
+		if(entry is None or entry[0] < time.time()):
+			return None
+		return entry
+
+	def _request(self, host):
+		"""
+		Queue host for the resolvers unless it's queued already, and return the event set once it's resolved.
+		Called with the lock held.
+		"""
+		event = self._pending.get(host)
+		if(event is None):
+			event = self._pending[host] = Event()
+			self._requests.put(host)
+		return event
+
+	def _addresses(self, entry):
+		"""
+		Return the addresses of an entry, or raise the error it holds.
+		"""
+		if(isinstance(entry[1], socket.gaierror)):
+			raise socket.gaierror(*entry[1].args)
+		return entry[1]
+
+	def _resolve(self, host):
+		"""
+		Resolve host with the system resolver and cache the outcome, which is returned.
+		"""
+		try:
+			entry = (time.time() + self._ttl, socket.getaddrinfo(host, 0, 0, socket.SOCK_STREAM))
+		except socket.gaierror as e:
+			self.log(logging.WARNING, "Unable to resolve %s: %s" % (host, e))
+			entry = (time.time() + self._negativeTTL, e)
+		self._lock.acquire()
+		try:
+			self._entries.put(host, entry)
+			event = self._pending.pop(host, None)
+		finally:
+			self._lock.release()
+		if(event is not None):
+			event.set()
+		return entry
+
+	def _resolveLoop(self):
+		"""
+		The main loop of a resolver thread.
+		"""
+		while(self._running):
+			try:
+				host = self._requests.get(timeout = REQUEST_WAIT_TIME)
+			except Empty:
+				continue
+			self._resolve(host)
+
+class CachedHTTPHandler(urllib2.HTTPHandler):
+	"""
+	An HTTPHandler whose connections resolve hosts through a DNSCache.
+	"""
+	def __init__(self, dnsCache, debuglevel = 0):
+		urllib2.HTTPHandler.__init__(self, debuglevel)
+		self._dnsCache = dnsCache
+
+	def _connection(self, host, **kwargs):
+		conn = httplib.HTTPConnection(host, **kwargs)
+		conn._create_connection = self._dnsCache.createConnection
+		return conn
+
+	def http_open(self, req):
+		return self.do_open(self._connection, req)
+
+class CachedHTTPSHandler(urllib2.HTTPSHandler):
+	"""
+	An HTTPSHandler whose connections resolve hosts through a DNSCache. Certificates are still checked against the host name.
+	"""
+	def __init__(self, dnsCache, debuglevel = 0, context = None):
+		urllib2.HTTPSHandler.__init__(self, debuglevel, context)
+		self._dnsCache = dnsCache
+
+	def _connection(self, host, **kwargs):
+		conn = httplib.HTTPSConnection(host, **kwargs)
+		conn._create_connection = self._dnsCache.createConnection
+		return conn
+
+	def https_open(self, req):
+		return self.do_open(self._connection, req, context = self._context)
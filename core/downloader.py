@@ -11,8 +11,17 @@ import logging
 import time
 import sys
 
+from lib import metrics
 # from page import Page
 
+URL_WAIT_TIME = 5
+FETCH_TIMEOUT = 30
+NOT_MODIFIED = 304
+
+FETCH_LATENCY = metrics.histogram("downloader_fetch_seconds", "Time taken by a download, by HTTP status (error if none came back).", \
+	["status"])
+FETCHED_BYTES = metrics.counter("downloader_bytes_total", "Bytes of web pages downloaded.")
+
 class Downloader(Thread):
 	DEFAULT_USER_AGENT = "User-Agent: Mozilla/5.0"
 
@@ -20,7 +29,8 @@ class Downloader(Thread):
 	A Downloader is a thread that keeps downloading web pages until it's stopped.
 	"""
 
-	def __init__(self, urlIn, pageQ, logger = None, userAgent = DEFAULT_USER_AGENT, callbackFun = None):
+	def __init__(self, urlIn, pageQ, logger = None, userAgent = DEFAULT_USER_AGENT, callbackFun = None, dnsCache = None, \
+		revisitPolicy = None):
 		"""
 		Initialize a Downloader.
 		---------  Param --------
@@ -32,6 +42,15 @@ class Downloader(Thread):
 			A logger used to log info/warning/error about downloading.
 		userAgent: (str) 
 			A string to set the user agent field in a HTTP request header.
+		callbackFun: func(url, status, elapsed, headers)
+			A function called whenever the download of a url taken from urlIn finishes, successfully or not, with the HTTP status 
+			(None if no response came back), the number of seconds the download took and the response headers (or None).
+		dnsCache: (DNSCache)
+			A cache the hosts are resolved through. If None, every download resolves its host with the system resolver.
+		revisitPolicy: (RevisitPolicy)
+			A policy keeping the validators of the pages downloaded, which are sent along with the requests to make them 
+			conditional, and scheduling their revisits. Pages which haven't changed are not put into pageQ, those which have
+			are flagged with "revisit".
 
 		---------  Return --------
 		None
@@ -42,6 +61,9 @@ class Downloader(Thread):
 		self._userAgent = userAgent
 		self._logger = logger
 		self._callbackFun = callbackFun
+		self._dnsCache = dnsCache
+		self._revisit = revisitPolicy
+		self._opener = urllib2.build_opener(*dnsCache.handlers()) if dnsCache is not None else urllib2.build_opener()
 
 	def log(self, level, msg):
 		"""
@@ -65,23 +87,71 @@ class Downloader(Thread):
 		---------  Return --------
 		(str) The html contents of the web page.
 		"""
+		status, headers = None, None
+		start = time.time()
 		try:
 			self.log(logging.INFO, "downloading file: "+url)
 			request = urllib2.Request(url)
 			request.add_header('User-Agent', self._userAgent)
-			page = urllib2.urlopen(request)
-			if(self._callbackFun is not None):
-				self._callbackFun(request.get_host())
+			for name, value in self._conditionalHeaders(url):
+				request.add_header(name, value)
+			page = self._opener.open(request, timeout = FETCH_TIMEOUT)
+			status, headers = page.getcode(), page.info()
 			html = page.read()
 			if(html is not None):
-				contentType = page.info().get("content-type")
-				charset =  contentType.split("charset=")[-1]
-				if contentType.find("charset") == -1:
-					charset = chardet.detect(html)['encoding']
-				return {"url":url, "html":html, "charset":charset}
+				FETCHED_BYTES.inc(len(html))
+				revisit = self._isRevisit(url)
+				if(not self._changed(url, status, headers, html)):
+					return None
+				return self._makePage(url, html, page.info().get("content-type"), revisit)
+		except urllib2.HTTPError as e:
+			status, headers = e.code, e.info()
+			if(e.code == NOT_MODIFIED):
+				self._changed(url, status, headers)
+			else:
+				self.log(logging.WARNING, "HTTP Error %d: Unable to open %s" % (e.code, url))
 		except:
 			self.log(logging.WARNING, str(sys.exc_info()[0]) + "Unable to open " + url)
+		finally:
+			elapsed = time.time() - start
+			FETCH_LATENCY.labels(status or "error").observe(elapsed)
+			if(self._callbackFun is not None):
+				self._callbackFun(url, status, elapsed, headers)
 
+	def _conditionalHeaders(self, url):
+		"""
+		Return the headers making the request for url conditional, as a list of (name, value), empty without a revisit policy.
+		"""
+		return self._revisit.conditionalHeaders(url) if self._revisit is not None else []
+
+	def _isRevisit(self, url):
+		"""
+		Return True if the page at url was downloaded before, and is to be recorded as a revisit.
+		"""
+		return self._revisit is not None and url in self._revisit
+
+	def _changed(self, url, status, headers, html = None):
+		"""
+		Record a 200 or 304 response to the request for url with the revisit policy, if any.
+		Return False if the page hasn't changed since it was last downloaded.
+		"""
+		if(self._revisit is None):
+			return True
+		changed = self._revisit.record(url, status, headers, html)
+		if(not changed):
+			self.log(logging.INFO, "%s has not changed" % url)
+		return changed
+
+	def _makePage(self, url, html, contentType, revisit = False):
+		"""
+		Wrap the html downloaded from url into a page dict, the charset is taken from contentType or detected from html.
+		revisit tells whether the page was downloaded before, and has changed since.
+		"""
+		if(contentType is not None and contentType.find("charset") != -1):
+			charset = contentType.split("charset=")[-1]
+		else:
+			charset = chardet.detect(html)['encoding']
+		return {"url":url, "html":html, "charset":charset, "revisit":revisit}
 
 	def run(self):
 		"""
@@ -89,14 +159,17 @@ class Downloader(Thread):
 		"""
 		while(True):
 			try:
-				url = self._urlIn.get(timeout = 2)
+				url = self._urlIn.get(timeout = URL_WAIT_TIME)
 				if url is not None:
 					page = self.download(url)
 					if page and (not self._pageQ.full()):
 						self._pageQ.put(page, timeout = 2)
 			except Empty:
 				self.log(logging.INFO, "urlIn is empty") 
-				time.sleep(5)
 			except Full:
 				self.log(logging.INFO, "pageQ is full") 
 				time.sleep(5)
+			except (IOError, OSError) as e:
+				## the frontier failed to read or write its spill files, e.g. out of file descriptors.
+				self.log(logging.ERROR, "unable to get an url: %s" % e)
+				time.sleep(URL_WAIT_TIME)
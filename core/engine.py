@@ -1,26 +1,50 @@
 import os
 import logging
 import urllib2
-import hashlib
 import time
 import zmq
 import socket
-from Queue import Queue
+from Queue import Queue, Full
+from urlparse import urlsplit
 from threading import Thread, RLock, Timer, Event
 from pymongo import MongoClient
 
 from downloader import Downloader
-from parser import Parser
+from asyncDownloader import AsyncDownloader
+from parser import Parser, EXTRACTORS, TREE_PARSE
+from parserPool import ParserPool
+from nearDup import NearDupDetector
+from politeness import PolitenessPolicy
+from robots import RobotsCache
+from dnsCache import DNSCache
+from checkpoint import Checkpoint
+from revisit import RevisitPolicy
+from storage import PageStore, MongoBackend, FileBackend, MongoContentBackend, FileContentBackend
 from lib.frontier import Frontier
+from lib.opic import OPIC, DEFAULT_SLOTS as DEFAULT_OPIC_SLOTS
+from lib import wire
+from lib import metrics
 import urlFilter 
+from urlCanonicalizer import URLCanonicalizer
 
 DEFAULT_MANAGER = "127.0.0.1"
 DEFAULT_REG_PORT = 13000
 DEFAULT_DB_PORT = 27017
 
 DEFAULT_DOWNLOADERS = 4
+DEFAULT_PARSERS = 0
 MAX_URL_QSIZE = 10000
+HEARTBEAT_INTERVAL = 1
 MAX_PAGE_QSIZE = 100
+DEFAULT_DUP_CAPACITY = 10000000
+DEFAULT_DUP_ERROR_RATE = 0.001
+DEFAULT_SPILL_DIR = "spill"
+DEFAULT_NEAR_DUP_DISTANCE = 3
+DEFAULT_CHECKPOINT_INTERVAL = 60
+REVISIT_CHECK_INTERVAL = 5
+
+THREADED_DOWNLOAD = "thread"
+ASYNC_DOWNLOAD = "async"
 
 class Engine(object):
 	"""
@@ -28,12 +52,17 @@ class Engine(object):
 	It keeps crawling internet from a given set of seeds until being stopped.
 	"""
 	def __init__(self, nDownloader = DEFAULT_DOWNLOADERS, manager = DEFAULT_MANAGER, \
-		regPort = DEFAULT_REG_PORT, dbPort = DEFAULT_DB_PORT, urlPort = None, pagePort = None):
+		regPort = DEFAULT_REG_PORT, dbPort = DEFAULT_DB_PORT, urlPort = None, pagePort = None, \
+		dupBackend = urlFilter.EXACT_DEDUP, dupCapacity = DEFAULT_DUP_CAPACITY, dupErrorRate = DEFAULT_DUP_ERROR_RATE, \
+		spillDir = DEFAULT_SPILL_DIR, downloadEngine = THREADED_DOWNLOAD, nParser = DEFAULT_PARSERS, \
+		parseMode = TREE_PARSE, storePath = None, pageCodec = None, nearDupDistance = DEFAULT_NEAR_DUP_DISTANCE, metricsPort = None, \
+		checkpointDir = None, checkpointInterval = DEFAULT_CHECKPOINT_INTERVAL, opicSlots = DEFAULT_OPIC_SLOTS, \
+		revisitInterval = None):
 		"""
 		Initialize a crawler object.
 		---------  Param --------
 		nDownloader (int):
-			the nubmer of downloader threads.
+			the nubmer of downloader threads, or the number of concurrent downloads if downloadEngine is ASYNC_DOWNLOAD.
 		manager:
 			the host on which manager is started.
 		regPort:
@@ -42,37 +71,116 @@ class Engine(object):
 			the port on which this worker sends url to manager.
 		pagePort:
 			the port on which this worker sends page to manager.
+		dupBackend:
+			how seen urls are remembered, one of urlFilter.EXACT_DEDUP, urlFilter.BLOOM_DEDUP and urlFilter.SCALABLE_BLOOM_DEDUP.
+		dupCapacity:
+			the number of urls the Bloom filter is sized for.
+		dupErrorRate:
+			the tolerated false positive rate of the Bloom filter.
+		spillDir:
+			the directory in which the url frontier spills the urls exceeding MAX_URL_QSIZE. 
+			If None, the frontier is bounded and urls received when it is full are dropped.
+		downloadEngine:
+			THREADED_DOWNLOAD to download with nDownloader Downloader threads, 
+			ASYNC_DOWNLOAD to download with a single AsyncDownloader keeping nDownloader downloads in flight.
+		nParser:
+			the number of processes extracting links from the downloaded pages. If 0, pages are parsed by the parser thread itself.
+		parseMode:
+			TREE_PARSE to extract links from a BeautifulSoup tree, STREAM_PARSE to extract them with a streaming tokenizer.
+		storePath:
+			the file in which the downloaded pages are stored, one json object per line, or the directory in which they are 
+			stored if pageCodec is given. If None, they are stored in the database on the manager host.
+		pageCodec:
+			storage.ZLIB or storage.ZSTD to store each distinct page content once, compressed with the given codec.
+			If None, every page is stored as it is.
+		nearDupDistance:
+			the largest number of differing SimHash bits between two pages considered near duplicates. 
+			Near duplicates are neither parsed nor stored, and hosts serving many of them are visited less often. 
+			If None, near duplicates are not detected.
+		metricsPort:
+			the port on which the metrics of this worker are served over HTTP, in the Prometheus text format.
+			If None, they are not served.
+		checkpointDir:
+			the directory in which the frontier, the seen urls and the politeness state are saved every checkpointInterval 
+			seconds and when stopping, and from which they are loaded when starting, so a restarted worker resumes its crawl.
+			The urls left in the frontier are then kept for the next run rather than handed back to the manager.
+			If None, nothing is saved.
+		checkpointInterval:
+			the number of seconds between two checkpoints.
+		opicSlots:
+			the number of slots of the table in which the importance of urls is estimated online (OPIC) from the links parsed,
+			8 bytes each. The frontier hands out the most important url of a site first, and serves first the site whose next url
+			is the most important among those it may visit. If None, the urls of a site are crawled in the order they come in.
+		revisitInterval:
+			the number of seconds after which a downloaded page is first revisited, with a conditional request.
+			It's then revisited as often as it's found changed, see RevisitPolicy. Pages which haven't changed are neither 
+			parsed nor stored again, those which have are not checked for near duplicates. If None, a page is downloaded once.
 
 		---------  Return --------
 		None.
 		"""
-		## prepare the url frontier and page queue
+		## prepare the url frontier and page queue, the links are ranked under their canonical form, as they are put.
+		canonicalizer = URLCanonicalizer()
+		self._opic = OPIC(opicSlots, canonicalizer.canonicalize) if opicSlots is not None else None
 		self._pageQ = Queue(MAX_PAGE_QSIZE)
 		self._urlFrontier = Frontier(3*nDownloader, MAX_URL_QSIZE, \
 					keyFunc=lambda url: urllib2.Request(url).get_host(), \
-					priorityFunc=self.getLastVisitTime)
-		self._visitSite = {}
+					priorityFunc=self.getReadyTime, spillDir=spillDir, exclusive=True, \
+					itemPriorityFunc=self._opic.cash if self._opic is not None else None)
+		self._politeness = PolitenessPolicy()
+		## a site is resolved as soon as it enters the back queue selector, so its address is ready by the time it's served.
+		self._dns = DNSCache(logger = logging.getLogger("engine"))
+		self._urlFrontier.setPrefetcher(lambda site: self._dns.prefetch(urlsplit("//" + site).hostname))
+		self._nearDup = NearDupDetector(nearDupDistance) if nearDupDistance is not None else None
+		self._revisit = RevisitPolicy(revisitInterval) if revisitInterval is not None else None
 		self._lock = RLock()
 		self._stopEvent = Event()
 
-		## prepare filters
+		## prepare filters, every url is canonicalized before being filtered.
+		self._urlFrontier.setNormalizer(canonicalizer.canonicalize)
+		## the urls of a site whose robots.txt is being fetched are parked by the robots filter, and put again once it's there,
+		## so the robots filter must come before the dup eliminator.
 		filetypeFilter = urlFilter.FileTypeFilter(True, ['text/html'])
-		robotFilter = urlFilter.RobotFilter(Downloader.DEFAULT_USER_AGENT)
-		self._urlDupEliminator = urlFilter.DupEliminator()
-		self._urlFrontier.addFilter(filetypeFilter.disallow)
-		self._urlFrontier.addFilter(self._urlDupEliminator.seenBefore)
-		# self._urlFrontier.addFilter(robotFilter.disallow)
+		self._robots = RobotsCache(Downloader.DEFAULT_USER_AGENT, releaseFunc = self._putURLs, \
+					crawlDelayFunc = self._politeness.setCrawlDelay, logger = logging.getLogger("engine"), dnsCache = self._dns, \
+					spillDir = spillDir)
+		self._urlDupEliminator = urlFilter.DupEliminator(dupBackend, dupCapacity, dupErrorRate)
+		self._urlFrontier.addFilter(filetypeFilter.disallow, "filetype")
+		self._urlFrontier.addFilter(self._robots.disallow, "robots")
+		self._urlFrontier.addFilter(self._urlDupEliminator.seenBefore, "dup")
+
+		## the depths of the queues are only read when the metrics are scraped.
+		metrics.gauge("frontier_urls", "Urls in the frontier.").setFunction(self._urlFrontier.size)
+		metrics.gauge("frontier_back_queues", "Back queues of the frontier in use, i.e. sites being crawled.") \
+			.setFunction(self._urlFrontier.backQueues)
+		metrics.gauge("page_queue_pages", "Downloaded pages waiting to be parsed.").setFunction(self._pageQ.qsize)
+		if(self._revisit is not None):
+			metrics.gauge("revisit_pages", "Pages scheduled for revisits.").setFunction(lambda: len(self._revisit))
+		self._metricsServer = metrics.MetricsServer(metricsPort) if metricsPort is not None else None
 		
 		## initialize sockets.
 		self._manager = manager
 		self._regPort = regPort
 		self._urlPort = urlPort
-		self._thisHost =  socket.gethostbyname(socket.gethostname())
-		self._dbclient = MongoClient(manager, dbPort)
+		## the share of the sites the manager hands over to this worker grows with the number of downloaders.
+		self._weight = nDownloader / float(DEFAULT_DOWNLOADERS)
+		self._thisHost = self._localAddress()
+		if(pageCodec is not None):
+			if(storePath is None):
+				storeBackend = MongoContentBackend(MongoClient(manager, dbPort), codec = pageCodec)
+			else:
+				storeBackend = FileContentBackend(storePath, codec = pageCodec)
+		elif(storePath is None):
+			storeBackend = MongoBackend(MongoClient(manager, dbPort))
+		else:
+			storeBackend = FileBackend(storePath)
 		context = zmq.Context()
 		self._regSocket = context.socket(zmq.REQ)
 		self._regSocket.connect("tcp://%s:%d" % (manager, self._regPort))
 		self._urlPushSocket = context.socket(zmq.PUSH)
+		self._heartbeatSocket = context.socket(zmq.PUSH)
+		self._received = 0
+		self._fetched = 0
 
 		self._urlPullSocket = context.socket(zmq.PULL)
 		if(self._urlPort is None):
@@ -92,11 +200,26 @@ class Engine(object):
 
 		## create threads for downloading and parsing tasks
 		self._downloaders = []
-		for i in range(nDownloader):
-			downloader = Downloader(self._urlFrontier, self._pageQ, self._logger, self.updateLastVisitTime)
-			downloader.daemon = True
-			self._downloaders.append(downloader)
-		self._parser = Parser(self._pageQ, self._urlPushSocket, self._dbclient, parseLogger)
+		if(downloadEngine == ASYNC_DOWNLOAD):
+			self._downloaders.append(AsyncDownloader(self._urlFrontier, self._pageQ, self._logger, \
+					callbackFun = self.fetchDone, maxConnections = nDownloader, dnsCache = self._dns, revisitPolicy = self._revisit))
+		else:
+			for i in range(nDownloader):
+				downloader = Downloader(self._urlFrontier, self._pageQ, self._logger, callbackFun = self.fetchDone, dnsCache = self._dns, \
+					revisitPolicy = self._revisit)
+				downloader.daemon = True
+				self._downloaders.append(downloader)
+		extractFunc = EXTRACTORS[parseMode]
+		pool = ParserPool(nParser, extractFunc = extractFunc) if nParser > 0 else None
+		self._pageStore = PageStore(storeBackend, parseLogger)
+		self._parser = Parser(self._pageQ, self._urlPushSocket, self._pageStore, parseLogger, pool, extractFunc, self._nearDup, \
+			self._opic, self._revisit)
+
+		## resume from the last checkpoint, if any.
+		self._checkpoint = Checkpoint(checkpointDir) if checkpointDir is not None else None
+		self._checkpointInterval = checkpointInterval
+		if(self._checkpoint is not None and self._checkpoint.exists()):
+			self._resume()
 
 	def log(self, level, msg):
 		"""
@@ -108,17 +231,32 @@ class Engine(object):
 			elif level == logging.WARNING:
 				self._logger.warn("[%s] WARNING: %s" % (time.ctime(), msg))
 			else:
-				self._logger.error("[%s] ERROR: %s" % (tme.ctime(), msg))
+				self._logger.error("[%s] ERROR: %s" % (time.ctime(), msg))
+
+	def _localAddress(self):
+		"""
+		Return the address of the interface through which the manager is reached, which is the one the manager can send urls to.
+		Unlike resolving the name of this host, it takes no DNS lookup besides the manager's, which goes through the cache.
+		"""
+		family, socktype, proto, canonname, address = self._dns.getaddrinfo(self._manager, self._regPort, socket.AF_INET)[0]
+		probe = socket.socket(family, socket.SOCK_DGRAM)
+		try:
+			## connecting a datagram socket sends nothing, it only picks the route.
+			probe.connect(address)
+			return probe.getsockname()[0]
+		finally:
+			probe.close()
 
 	def _register(self):
 		"""
 		Request connection to master. 
 		"""
-		self._regSocket.send("REG %s %d" % (self._thisHost, self._urlPort))
+		self._regSocket.send("REG %s %d %s" % (self._thisHost, self._urlPort, self._weight))
 		response = self._regSocket.recv()
 		managerurlPort = response.split()[1]
 		self.log(logging.INFO, "success to connect to manager:%s" % managerurlPort)
 		self._urlPushSocket.connect("tcp://%s:%s" % (self._manager, managerurlPort))
+		self._heartbeatSocket.connect("tcp://%s:%s" % (self._manager, managerurlPort))
 
 	def start(self):
 		"""
@@ -129,24 +267,143 @@ class Engine(object):
 		self._dataAcceptor = Thread(target = self._recvData)
 		self._dataAcceptor.daemon = True
 		self._dataAcceptor.start()
+		self._heartbeatSender = Thread(target = self._sendHeartbeats)
+		self._heartbeatSender.daemon = True
+		self._heartbeatSender.start()
+		if(self._checkpoint is not None):
+			self._checkpointer = Thread(target = self._saveCheckpoints)
+			self._checkpointer.daemon = True
+			self._checkpointer.start()
+		if(self._revisit is not None):
+			self._revisitScheduler = Thread(target = self._scheduleRevisits)
+			self._revisitScheduler.daemon = True
+			self._revisitScheduler.start()
+		self._dns.start()
+		self._robots.start()
+		if(self._metricsServer is not None):
+			self._metricsServer.start()
 
 		for downloader in self._downloaders:
 			downloader.start()
+		self._pageStore.start()
 		self._parser.start()
 
 	def _recvData(self):
 		"""
 		Keeps listening to urlPort.
-		Process each arrival data.
+		Process each arrival data: urls to crawl, or robots.txt fetched by other workers.
 		"""
 		while(not self._stopEvent.isSet()):
-			urlSet = self._urlPullSocket.recv_pyobj()
+			try:
+				msgType, payload = wire.decode(self._urlPullSocket.recv())
+				if(msgType == wire.URLS):
+					urlSet = list(wire.iterURLs(payload))
+				elif(msgType == wire.ROBOTS):
+					records = wire.decodeRobots(payload)
+				else:
+					raise wire.WireError("unexpected message type %d" % msgType)
+			except wire.WireError as e:
+				self.log(logging.ERROR, "dropping an undecodable message: %s" % e)
+				continue
+			if(msgType == wire.ROBOTS):
+				for host, expires, body in records:
+					self._robots.load(host, expires, body)
+				continue
 			self.log(logging.INFO, "received %s" % urlSet)
-			for url in urlSet:
-				try:
-					self._urlFrontier.put(url)
-				except Full:
-					time.sleep(5)
+			self._lock.acquire()
+			self._received += len(urlSet)
+			self._lock.release()
+			self._putURLs(urlSet)
+
+	def _putURLs(self, urls):
+		"""
+		Put urls into the frontier.
+		"""
+		for url in urls:
+			try:
+				self._urlFrontier.put(url)
+			except Full:
+				self.log(logging.WARNING, "frontier is full, dropping %s" % url)
+			except (IOError, OSError) as e:
+				self.log(logging.ERROR, "unable to spill %s to disk: %s" % (url, e))
+
+	def _sendHeartbeats(self):
+		"""
+		Keep telling the manager, every HEARTBEAT_INTERVAL seconds, that this worker is alive, how many urls it received 
+		and may still be sent, how deep its queues are and how fast pages are downloaded. 
+		Urls are thus held by the manager rather than queued up in front of a full frontier.
+		The robots.txt fetched here are shared with the other workers through the manager along the way.
+		"""
+		workerID = "%s:%d" % (self._thisHost, self._urlPort)
+		lastFetched, lastTime = 0, time.time()
+		while(not self._stopEvent.isSet()):
+			self._lock.acquire()
+			received, fetched = self._received, self._fetched
+			self._lock.release()
+			now = time.time()
+			fetchRate = (fetched - lastFetched) / max(now - lastTime, 1e-3)
+			lastFetched, lastTime = fetched, now
+			frontierSize = self._urlFrontier.size()
+			credit = received + max(MAX_URL_QSIZE - frontierSize, 0)
+			self._heartbeatSocket.send(wire.encodeHeartbeat(workerID, credit, received, frontierSize, self._pageQ.qsize(), fetchRate))
+			robots = self._robots.takeFetched()
+			if(robots):
+				self._heartbeatSocket.send(wire.encodeRobots(robots))
+			self._stopEvent.wait(HEARTBEAT_INTERVAL)
+
+	def _resume(self):
+		"""
+		Load the seen urls, the politeness state, the state of the pages revisited and the frontier saved by the last checkpoint.
+		The saved urls have been filtered already, they go straight into the frontier.
+		"""
+		self._checkpoint.loadSeen(self._urlDupEliminator)
+		self._politeness.restore(self._checkpoint.loadHosts())
+		if(self._revisit is not None):
+			self._revisit.restore(self._checkpoint.loadRevisits())
+		urls = self._checkpoint.loadURLs()
+		restored = self._urlFrontier.restore(urls)
+		if(restored < len(urls)):
+			self.log(logging.WARNING, "frontier is full, dropping %d saved urls" % (len(urls) - restored))
+		print "[%s] : Resumed with %d urls to crawl and %d urls seen." % (time.ctime(), restored, self._urlDupEliminator.size())
+
+	def _saveCheckpoint(self):
+		"""
+		Save the seen urls, the urls to crawl, the politeness state and the state of the pages revisited, if any.
+		The urls to crawl include those handed out to the downloaders and those of the pages not parsed yet,
+		whose links would be lost otherwise.
+		"""
+		seen = self._urlDupEliminator.snapshot()
+		urls = self._urlFrontier.items()
+		self._pageQ.mutex.acquire()
+		urls.extend(page["url"] for page in self._pageQ.queue)
+		self._pageQ.mutex.release()
+		try:
+			self._checkpoint.save(seen, urls, self._politeness.snapshot(), self._urlDupEliminator.backend, \
+				self._revisit.snapshot() if self._revisit is not None else None)
+		except (IOError, OSError) as e:
+			self.log(logging.ERROR, "unable to save a checkpoint: %s" % e)
+
+	def _saveCheckpoints(self):
+		"""
+		Save a checkpoint every checkpointInterval seconds.
+		"""
+		while(not self._stopEvent.wait(self._checkpointInterval)):
+			self._saveCheckpoint()
+
+	def _scheduleRevisits(self):
+		"""
+		Every REVISIT_CHECK_INTERVAL seconds, put the urls whose revisit is due back into the frontier.
+		They were seen already, so they are put as they are, past the filters, and wait for their site's turn like any url.
+		"""
+		while(not self._stopEvent.wait(REVISIT_CHECK_INTERVAL)):
+			urls = self._revisit.due()
+			try:
+				restored = self._urlFrontier.restore(urls)
+			except (IOError, OSError) as e:
+				self.log(logging.ERROR, "unable to spill revisits to disk, postponing them: %s" % e)
+				continue
+			if(restored < len(urls)):
+				self.log(logging.WARNING, "frontier is full, postponing %d revisits" % (len(urls) - restored))
 
 	def stop(self):
 		"""
@@ -154,8 +411,17 @@ class Engine(object):
 		"""
 		print "[%s] : Crawler is stopped!" %time.ctime()
 		self._stopEvent.set()
+		if(self._checkpoint is not None):
+			self._checkpointer.join()
+		if(self._revisit is not None):
+			self._revisitScheduler.join()
 		self._parser.stop()
 		self._parser.join()
+		self._pageStore.stop()
+		self._robots.stop()
+		self._dns.stop()
+		if(self._metricsServer is not None):
+			self._metricsServer.stop()
 		self._dump()
 		self._regSocket.send("UNREG %s %d" % (self._thisHost, self._urlPort))
 		response = self._regSocket.recv()
@@ -163,36 +429,40 @@ class Engine(object):
 		
 	def _dump(self):
 		"""
-		Dump the ready_to_be_crawled urls to log file.
+		Save the ready_to_be_crawled urls for the next run if checkpoints are saved, hand them back to the manager otherwise,
+		as a RETURN message so the manager dispatches them again although it has seen them.
 		"""
-		total = self._urlDupEliminator.size()
+		total, errorRate = self._urlDupEliminator.size(True)
 		left = self._urlFrontier.size()
 		print "%d url discovered, but only %d downloaded and %d ready for downloading." %(total, total-left, left)
+		print "estimated false positive rate of url dedup: %f" % errorRate
 
-		unvisited = set()
-		while(self._urlFrontier.size() > 0):
-			unvisited.add(self._urlFrontier.get())
-
-		self._urlPushSocket.send_pyobj(unvisited)
-		unvisited.clear()
+		if(self._checkpoint is not None):
+			self._saveCheckpoint()
+		else:
+			self._urlPushSocket.send(wire.encodeURLs(self._urlFrontier.drain(), msgType = wire.RETURN))
+		self._urlFrontier.close()
 		
-	def getLastVisitTime(self, site):
+	def getReadyTime(self, site):
 		"""
-		Return the last time a site was visited. 
+		Return the earliest time a site should be visited again: the time the politeness policy allows, 
+		delayed in proportion to the share of its pages which are near duplicates.
 		"""
-		self._lock.acquire()
-		lastVT = 0 
-		site = hashlib.sha1(site).hexdigest()
-		if(self._visitSite.has_key(site)):
-			lastVT = self._visitSite[site]
-		self._lock.release()
-		return lastVT
+		if(self._nearDup is None):
+			return self._politeness.readyTime(site)
+		return self._politeness.readyTime(site) + self._nearDup.hostPenalty(site)
 
-	def updateLastVisitTime(self, site):
+	def fetchDone(self, url, status, elapsed, headers):
 		"""
-		Return the last time a site was visited. 
+		Called by the downloaders when the download of a url taken from the frontier finishes.
+		The politeness policy schedules the next visit of the site, and the frontier may then hand out its next url.
 		"""
+		self._politeness.record(urllib2.Request(url).get_host(), status, elapsed, headers)
+		try:
+			self._urlFrontier.done(url)
+		except (IOError, OSError) as e:
+			## the site is done, only moving the next urls to the back queues failed, get() tries again.
+			self.log(logging.ERROR, "unable to read spilled urls: %s" % e)
 		self._lock.acquire()
-		site = hashlib.sha1(site).hexdigest()
-		self._visitSite[site] = time.time()
+		self._fetched += 1
 		self._lock.release()
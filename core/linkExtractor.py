@@ -0,0 +1,73 @@
+"""
+A streaming link extractor which scans the raw bytes of a page for the few tags carrying links, without building any tree.
+"""
+
+from urlparse import urljoin, urlparse
+from HTMLParser import HTMLParser
+import re
+
+## comments and the contents of script/style elements are skipped as a whole,
+## the other matches are the start tags of interest with their raw attribute text.
+_MARKUP = re.compile(r"""<!--.*?-->|<(script|style)\b[^>]*>.*?</\1\s*>|<(a|area|base|meta)\b((?:"[^"]*"|'[^']*'|[^'">])*)>""", re.I | re.S)
+_ATTR = re.compile(r"""([^\s"'>/=]+)(?:\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s"'>]+)))?""")
+_unescape = HTMLParser().unescape
+
+def _attributes(text):
+	"""
+	Return the attributes of a start tag as a dict, names lowercased.
+	"""
+	attrs = {}
+	for name, dquoted, squoted, bare in _ATTR.findall(text):
+		name = name.lower()
+		if(name not in attrs):
+			attrs[name] = dquoted or squoted or bare
+	return attrs
+
+def _clean(value):
+	"""
+	Unescape an attribute value and strip the whitespace around it. 
+	Values which are not plain ascii are decoded as utf-8, so they can be joined with any base url.
+	"""
+	value = value.strip()
+	try:
+		value.decode("ascii")
+	except UnicodeDecodeError:
+		value = value.decode("utf-8", "ignore")
+	if("&" in value):
+		value = _unescape(value)
+	return value
+
+def streamLinks(html, baseUrl):
+	"""
+	Return the absolute urls of the links found in html, a web page downloaded from baseUrl.
+
+	Links are taken from <a href> and <area href>. They are resolved against the first <base href> of the page if any,
+	links marked rel="nofollow" are left out, and so are all the links of a page whose robots meta tag says nofollow.
+	"""
+	if(isinstance(html, unicode)):
+		html = html.encode("utf-8")
+	hrefs = []
+	base = None
+	for match in _MARKUP.finditer(html):
+		tag = match.group(2)
+		if(tag is None):
+			continue
+		tag = tag.lower()
+		attrs = _attributes(match.group(3))
+		if(tag == "meta"):
+			if(attrs.get("name", "").lower() == "robots" and "nofollow" in attrs.get("content", "").lower()):
+				return []
+		elif(tag == "base"):
+			if(base is None and attrs.get("href")):
+				base = _clean(attrs["href"])
+		elif(attrs.has_key("href") and "nofollow" not in attrs.get("rel", "").lower()):
+			hrefs.append(_clean(attrs["href"]))
+
+	if(base is not None):
+		baseUrl = urljoin(baseUrl, base)
+	links = []
+	for href in hrefs:
+		url = urljoin(baseUrl, href)
+		if(urlparse(url).hostname is not None):
+			links.append(url)
+	return links
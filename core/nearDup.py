@@ -0,0 +1,100 @@
+from threading import Lock
+import urllib2
+import re
+
+from lib.simhash import simhash, SimHashIndex, DEFAULT_MAX_DISTANCE, DEFAULT_CAPACITY
+from lib.lrucache import LRUCache
+
+SHINGLE_SIZE = 3
+MIN_SHINGLES = 5
+MIN_HOST_PAGES = 10
+MAX_HOST_PENALTY = 60
+HOST_CACHE_SIZE = 100000
+
+_INVISIBLE = re.compile(r"<!--.*?-->|<(script|style)\b[^>]*>.*?</\1\s*>", re.I | re.S)
+_TAG = re.compile(r"<[^>]*>")
+_WORD = re.compile(r"\w+", re.U)
+
+def shingles(html):
+	"""
+	Return the SHINGLE_SIZE-word shingles of the visible text of a page.
+	"""
+	if(isinstance(html, str)):
+		html = html.decode("utf-8", "ignore")
+	words = _WORD.findall(_TAG.sub(" ", _INVISIBLE.sub(" ", html)).lower())
+	if(len(words) < SHINGLE_SIZE):
+		return [" ".join(words)] if words else []
+	return [" ".join(words[i:i+SHINGLE_SIZE]) for i in xrange(len(words) - SHINGLE_SIZE + 1)]
+
+class NearDupDetector(object):
+	"""
+	A NearDupDetector tells whether a page is a near duplicate of a page seen before, by the SimHash fingerprint of its text.
+	It also keeps track of how many of each host's pages are near duplicates, so the frontier can delay hosts full of them
+	(mirrors, session-id and query-parameter variants, spider traps).
+
+	Data members:
+	_index: SimHashIndex
+		the fingerprints of the distinct pages seen so far.
+
+	_hosts: LRUCache{ host: [pages, near duplicates] }
+		the number of pages checked and found near duplicate per host.
+	"""
+	def __init__(self, maxDistance = DEFAULT_MAX_DISTANCE, capacity = DEFAULT_CAPACITY, maxPenalty = MAX_HOST_PENALTY):
+		"""
+		Initialize a NearDupDetector.
+		---------  Param --------
+		maxDistance: (int)
+			the largest number of differing fingerprint bits between two pages considered near duplicates.
+		capacity: (int)
+			the number of fingerprints remembered.
+		maxPenalty: (float)
+			the delay, in seconds, added to the ready time of a host whose pages are all near duplicates.
+
+		---------  Return --------
+		None.
+		"""
+		self._index = SimHashIndex(maxDistance, capacity)
+		self._hosts = LRUCache(HOST_CACHE_SIZE)
+		self._maxPenalty = maxPenalty
+		self._lock = Lock()
+
+	def isNearDup(self, page):
+		"""
+		Return True if page is a near duplicate of a page seen before, and remember it otherwise.
+		A page with less than MIN_SHINGLES shingles of text (redirect stubs, frame sets, pages built by scripts or of images only)
+		is never a near duplicate: its fingerprint tells nothing about its content, and it's neither remembered nor counted.
+		"""
+		features = shingles(page["html"])
+		if(len(features) < MIN_SHINGLES):
+			return False
+		fingerprint = simhash(features)
+		host = urllib2.Request(page["url"]).get_host()
+		self._lock.acquire()
+		try:
+			dup = self._index.find(fingerprint) is not None
+			if(not dup):
+				self._index.add(fingerprint)
+			stats = self._hosts.get(host)
+			if(stats is None):
+				stats = [0, 0]
+				self._hosts.put(host, stats)
+			stats[0] += 1
+			if(dup):
+				stats[1] += 1
+			return dup
+		finally:
+			self._lock.release()
+
+	def hostPenalty(self, host):
+		"""
+		Return the number of seconds by which the next visit of host should be delayed,
+		in proportion to the share of its pages which are near duplicates.
+		"""
+		self._lock.acquire()
+		try:
+			stats = self._hosts.get(host)
+			if(stats is None or stats[0] < MIN_HOST_PAGES):
+				return 0
+			return self._maxPenalty * stats[1] / float(stats[0])
+		finally:
+			self._lock.release()
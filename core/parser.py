@@ -5,39 +5,88 @@ from datetime import datetime
 from urlparse import urlparse, urljoin
 import zmq
 import chardet
+from linkExtractor import streamLinks
+from lib import wire
+from lib.batcher import Batcher
+from lib import metrics
 
 import os
 import logging 
 # from page import Page
 import sys
+import time
 
 MIN_PAGE_MSG_SIZE = 5
-MIN_URL_MSG_SIZE = 20
+PAGE_WAIT_TIME = 5
+RESULT_WAIT_TIME = 0.1
+
+PARSE_LATENCY = metrics.histogram("parser_parse_seconds", "Time taken to extract the links of a page, waiting for the parser pool included.")
+LINKS_PER_PAGE = metrics.histogram("parser_links_per_page", "Links extracted from a page.", buckets = metrics.COUNT_BUCKETS)
+STORE_LATENCY = metrics.histogram("parser_store_seconds", "Time taken to hand a page to the page store, waiting while it's full included.")
+NEAR_DUPS = metrics.counter("parser_near_duplicates_total", "Pages skipped as near duplicates of pages seen before.")
+
+TREE_PARSE = "tree"
+STREAM_PARSE = "stream"
+
+def extractLinks(html, baseUrl):
+	"""
+	Return the absolute urls of the links found in html, a web page downloaded from baseUrl.
+	"""
+	links = []
+	parser = BeautifulSoup(html)
+	for link in parser.findAll('a'):
+		if link.has_attr('href'):
+			url = link['href']
+			url = urljoin(baseUrl, url)
+			if(urlparse(url).hostname is not None):
+				links.append(url)
+	return links
+
+EXTRACTORS = {TREE_PARSE: extractLinks, STREAM_PARSE: streamLinks}
 
 class Parser(Thread):
 	"""A Parser is a thread that keep parsing html pages and extracting links to other web pages."""
 	
-	def __init__(self, pageQ, dataSocket, dbConn, logger = None):
+	def __init__(self, pageQ, dataSocket, pageStore, logger = None, pool = None, extractFunc = extractLinks, nearDup = None, \
+		opic = None, revisit = None):
 		"""
 		Initialize a parser object.
 		---------  Param --------
 		pageQ: (Queue)  		
 			A queue storing the pages to be parsed.
-		urlOut: (Queue) 
-			A queue used for the parser to store the urls exatracted from pages.
+		dataSocket: (zmq.Socket) 
+			A socket used for the parser to send the urls exatracted from pages.
+		pageStore: (PageStore)
+			A storage stage to which the parsed pages are handed.
 		logger: (logging.Logger)
 			A logger used to log info/warning/error about parsing.
+		pool: (ParserPool)
+			A pool of processes to which pages are handed for link extraction. If None, pages are parsed in this thread.
+		extractFunc: func(html, url)
+			The function returning the links found in a page when it's parsed in this thread, one of EXTRACTORS.
+		nearDup: (NearDupDetector)
+			A detector of pages which are near duplicates of pages seen before. Such pages are neither parsed nor stored.
+			A page revisited is not checked: it would be found a near duplicate of its own earlier version.
+		opic: (OPIC)
+			An estimator of the importance of urls, which the cash of each parsed page is handed out to its links through.
+		revisit: (RevisitPolicy)
+			The policy scheduling the revisits of the pages downloaded, which stops revisiting near duplicates.
 
 		---------  Return --------
 		None.
 		"""
 		super(Parser, self).__init__()
+		self._pool = pool
+		self._extractFunc = extractFunc
+		self._nearDup = nearDup
+		self._opic = opic
+		self._revisit = revisit
 		self._pageQ = pageQ
-		self._urlOut = set()
+		self._urlBatcher = Batcher(self._sendURLs)
 		self._pageOut = []
 		self._logger = logger
 		self._dataPushSocket =dataSocket
-		self._dbclient = dbConn
+		self._pageStore = pageStore
 		self._stopEvent = Event()
 
 	def log(self, level, msg):
@@ -62,18 +111,32 @@ class Parser(Thread):
 		---------  Return --------
 			(list) The links this page leads to.
 		"""
-		links = []
+		start = time.time()
+		try:
+			return self._extractFunc(page["html"], page["url"])
+		except:
+			self.log(logging.WARNING, "Unable to parse " + page["url"])
+			return []
+		finally:
+			PARSE_LATENCY.observe(time.time() - start)
+
+	def isNearDup(self, page):
+		"""
+		Return True if page is a near duplicate of a page seen before.
+		"""
+		if(self._nearDup is None or page.get("revisit")):
+			return False
 		try:
-			parser = BeautifulSoup(page["html"])
-			for link in parser.findAll('a'):
-				if link.has_attr('href'):
-					url = link['href']
-					url = urljoin(page["url"], url)
-					if(urlparse(url).hostname is not None):
-						links.append(url)
+			dup = self._nearDup.isNearDup(page)
 		except:
-			self.log(logging.WARNING, "Unable to parse " + page)
-		return links
+			self.log(logging.WARNING, "Unable to fingerprint " + page["url"])
+			return False
+		if(dup):
+			NEAR_DUPS.inc()
+			self.log(logging.INFO, "skipping near duplicate " + page["url"])
+			if(self._revisit is not None):
+				self._revisit.forget(page["url"])
+		return dup
 
 	def stop(self):
 		self._stopEvent.set()
@@ -82,33 +145,77 @@ class Parser(Thread):
 		"""
 		Start parsing.
 		"""
+		if(self._pool is None):
+			self._parseInline()
+		else:
+			self._parseInPool()
+
+		while(not self._pageQ.empty()):
+			self._storePage(self._pageQ.get(timeout = 1))
+		self._urlBatcher.flush()
+
+	def _parseInline(self):
+		"""
+		Keep parsing pages in this thread until being stopped.
+		"""
 		while(not self._stopEvent.isSet()):
 			try:
-				page = self._pageQ.get(timeout = 5)
-				for link in self.parse(page):
-					self._urlOut.add(link)
-					if(len(self._urlOut) >= MIN_URL_MSG_SIZE):
-						self._dataPushSocket.send_pyobj(self._urlOut)
-						self.log(logging.INFO, "sending %s" % self._urlOut)
-						self._urlOut.clear()
-
-				self._storePage(page)
+				page = self._pageQ.get(timeout = self._urlBatcher.pollTimeout(PAGE_WAIT_TIME))
+				if(not self.isNearDup(page)):
+					self._forward(page, self.parse(page))
+					self._storePage(page)
 			except Empty:
 				self.log(logging.INFO, "pageQ is empty") 
+			self._urlBatcher.poll()
 
-		while(not self._pageQ.empty()):
-			self._storePage(self._pageQ.get(timeout = 1))
+	def _parseInPool(self):
+		"""
+		Keep handing pages to the parser pool and collecting the links it extracts until being stopped.
+		"""
+		pending = {}
+		self._pool.start()
+		while(not self._stopEvent.isSet() or pending):
+			try:
+				while(not self._stopEvent.isSet() and not self._pool.full()):
+					page = self._pageQ.get(not pending, self._urlBatcher.pollTimeout(PAGE_WAIT_TIME))
+					if(not self.isNearDup(page)):
+						pending[self._pool.submit(page["html"], page["url"])] = (page, time.time())
+			except Empty:
+				if(not pending):
+					self.log(logging.INFO, "pageQ is empty") 
+
+			for ticket, links in self._pool.results(RESULT_WAIT_TIME):
+				page, start = pending.pop(ticket)
+				PARSE_LATENCY.observe(time.time() - start)
+				if(links is None):
+					self.log(logging.WARNING, "Unable to parse " + page["url"])
+				else:
+					self._forward(page, links)
+				self._storePage(page)
+			self._urlBatcher.poll()
+		self._pool.stop()
+
+	def _forward(self, page, links):
+		"""
+		Collect the links extracted from a page, they are sent out in batches.
+		"""
+		LINKS_PER_PAGE.observe(len(links))
+		if(self._opic is not None):
+			self._opic.visit(page["url"], links)
+		for link in links:
+			self._urlBatcher.add(link)
+
+	def _sendURLs(self, urls):
+		"""
+		Send a batch of urls out.
+		"""
+		self._dataPushSocket.send(wire.encodeURLs(urls))
+		self.log(logging.INFO, "sending %s" % urls)
 				
 	def _storePage(self, page):
 		"""
-		Store the url and html in database.
+		Hand the url and html to the page store, waiting while it's full.
 		"""
-		try:
-			charset = page["charset"]
-			if charset is not None and charset.lower() != "utf-8":
-				page["html"] = page["html"].decode(charset, errors='ignore')
-				page["html"] = page["html"].encode("utf-8", errors='ignore')
-			page.pop('charset')
-			self._dbclient.crawler.webpage.insert(page)
-		except :
-			self.log(logging.WARNING, "failed to store webpage %s" % page["url"])
\ No newline at end of file
+		start = time.time()
+		self._pageStore.put(page)
+		STORE_LATENCY.observe(time.time() - start)
\ No newline at end of file
@@ -0,0 +1,185 @@
+from multiprocessing import Process, Queue
+from multiprocessing.sharedctypes import RawArray
+from Queue import Empty
+from collections import deque
+from itertools import count
+import ctypes
+
+from parser import extractLinks
+
+DEFAULT_PROCESSES = 2
+DEFAULT_SLOT_SIZE = 1024 * 1024
+DEFAULT_SLOTS_PER_PROCESS = 4
+RESULT_BATCH_SIZE = 16
+
+def _work(buf, slotSize, tasks, results, extractFunc):
+	"""
+	The main loop of a parser process: read pages from the shared buffer, extract their links and send them back in batches.
+	A batch is sent as soon as no task is waiting, so a lightly loaded pool answers page by page.
+	"""
+	base = ctypes.addressof(buf)
+	done = []
+	while(True):
+		task = tasks.get()
+		if(task is None):
+			break
+		ticket, slot, length, html, url = task
+		if(html is None):
+			html = ctypes.string_at(base + slot * slotSize, length)
+		try:
+			links = extractFunc(html, url)
+		except:
+			links = None
+		done.append((ticket, links))
+		if(len(done) >= RESULT_BATCH_SIZE or tasks.empty()):
+			results.put(done)
+			done = []
+	if(done):
+		results.put(done)
+
+class ParserPool(object):
+	"""
+	A ParserPool extracts links from web pages in a number of processes, so parsing is not serialized by the GIL.
+
+	Pages are not pickled to the processes: each page in flight is copied once into a slot of a buffer shared with
+	all the processes, and only (ticket, slot, length, url) goes through the task queue. Pages larger than a slot are
+	sent through the task queue as they are. The links come back as batches of (ticket, links) pairs.
+
+	Each process has its own task queue, and a page goes to the process with the fewest pages in flight, so the pages
+	a process holds are known: if it dies (a crash in lxml, an OOM kill), they are failed and the process is started again.
+
+	Data members:
+	_buffer: RawArray
+		the shared memory, split into slots of slotSize bytes.
+
+	_freeSlots: deque[ int ]
+		the slots not used by any page in flight. The pool is full when there is none.
+
+	_slots: dict{ ticket: slot }
+		the slot used by each page in flight.
+
+	_assigned: list[ set(ticket) ]
+		the pages in flight in each process.
+
+	_owners: dict{ ticket: process# }
+		the process each page in flight was handed to.
+	"""
+	def __init__(self, nProcesses = DEFAULT_PROCESSES, slotSize = DEFAULT_SLOT_SIZE, slotsPerProcess = DEFAULT_SLOTS_PER_PROCESS, \
+		extractFunc = extractLinks):
+		"""
+		Initialize a pool.
+		---------  Param --------
+		nProcesses: (int)
+			the number of parser processes.
+		slotSize: (int)
+			the largest page, in bytes, handed to a process through shared memory.
+		slotsPerProcess: (int)
+			the number of pages which may be in flight per process.
+		extractFunc: func(html, url)
+			the function returning the links found in a page.
+
+		---------  Return --------
+		None.
+		"""
+		nProcesses = max(nProcesses, 1)
+		nSlots = nProcesses * max(slotsPerProcess, 1)
+		self._slotSize = slotSize
+		self._buffer = RawArray(ctypes.c_char, nSlots * slotSize)
+		self._base = ctypes.addressof(self._buffer)
+		self._freeSlots = deque(range(nSlots))
+		self._slots = {}
+		self._tickets = count()
+		self._extractFunc = extractFunc
+		self._results = Queue()
+		self._tasks = [None] * nProcesses
+		self._processes = [None] * nProcesses
+		self._assigned = [set() for i in range(nProcesses)]
+		self._owners = {}
+		for i in range(nProcesses):
+			self._spawn(i)
+
+	def _spawn(self, i):
+		"""
+		Create process i, with a task queue of its own.
+		"""
+		self._tasks[i] = Queue()
+		process = Process(target = _work, args = (self._buffer, self._slotSize, self._tasks[i], self._results, self._extractFunc))
+		process.daemon = True
+		self._processes[i] = process
+
+	def start(self):
+		"""
+		Start the parser processes.
+		"""
+		for process in self._processes:
+			process.start()
+
+	def stop(self):
+		"""
+		Stop the parser processes once they are done with the pages already submitted.
+		"""
+		for tasks in self._tasks:
+			tasks.put(None)
+		for process in self._processes:
+			process.join()
+
+	def full(self):
+		"""
+		Return True if no more page can be submitted until some results are collected.
+		"""
+		return not self._freeSlots
+
+	def submit(self, html, url):
+		"""
+		Hand a page to the pool, which must not be full.
+		Return the ticket identifying the page in the results.
+		"""
+		if(isinstance(html, unicode)):
+			html = html.encode("utf-8")
+		ticket = next(self._tickets)
+		slot = self._freeSlots.popleft()
+		self._slots[ticket] = slot
+		i = min(range(len(self._processes)), key = lambda i: len(self._assigned[i]))
+		self._assigned[i].add(ticket)
+		self._owners[ticket] = i
+		if(len(html) <= self._slotSize):
+			ctypes.memmove(self._base + slot * self._slotSize, html, len(html))
+			self._tasks[i].put((ticket, slot, len(html), None, url))
+		else:
+			self._tasks[i].put((ticket, slot, len(html), html, url))
+		return ticket
+
+	def results(self, timeout = None):
+		"""
+		Return the next batch of (ticket, links) pairs, or an empty list if none arrives within timeout seconds.
+		links is None for a page which could not be parsed, or whose process died.
+		"""
+		failed = self._reapDead()
+		for ticket, links in failed:
+			self._release(ticket)
+		try:
+			batch = self._results.get(True, timeout) if not failed else self._results.get_nowait()
+		except Empty:
+			batch = []
+		## the results a process sent before it died may come after its pages were failed.
+		batch = [(ticket, links) for ticket, links in batch if ticket in self._slots]
+		for ticket, links in batch:
+			self._release(ticket)
+		return batch + failed
+
+	def _release(self, ticket):
+		self._freeSlots.append(self._slots.pop(ticket))
+		self._assigned[self._owners.pop(ticket)].discard(ticket)
+
+	def _reapDead(self):
+		"""
+		Start again the processes which died, and return their pages in flight as failed, i.e. as (ticket, None) pairs.
+		"""
+		failed = []
+		for i, process in enumerate(self._processes):
+			if(process.is_alive() or process.exitcode is None):
+				continue
+			failed.extend((ticket, None) for ticket in self._assigned[i])
+			self._spawn(i)
+			self._processes[i].start()
+		return failed
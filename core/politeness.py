@@ -0,0 +1,153 @@
+from threading import Lock
+from email.utils import parsedate_tz, mktime_tz
+import time
+
+from lib.lrucache import LRUCache
+
+DEFAULT_MIN_DELAY = 0.5
+MAX_DELAY = 600
+RESPONSE_TIME_FACTOR = 5
+RESPONSE_TIME_SMOOTHING = 0.3
+MAX_BACKOFF = 64
+BACKOFF_CODES = (429, 503)
+HOST_CACHE_SIZE = 100000
+
+def retryAfter(headers):
+	"""
+	Return the number of seconds a Retry-After header asks to wait, or None.
+	"""
+	value = headers.get("retry-after") if headers is not None else None
+	if(not value):
+		return None
+	value = value.strip()
+	if(value.isdigit()):
+		return int(value)
+	date = parsedate_tz(value)
+	if(date is None):
+		return None
+	return max(mktime_tz(date) - time.time(), 0)
+
+class PolitenessPolicy(object):
+	"""
+	A PolitenessPolicy tells the earliest time each host may be fetched again, given how its last fetches went:
+		- a host is given at least minDelay seconds between two fetches, or its robots.txt Crawl-delay if longer,
+		- the delay grows with the host's smoothed response time (RESPONSE_TIME_FACTOR times it),
+		  so slow hosts are spared and fast ones are crawled at minDelay,
+		- 429 and 503 responses and network errors double the delay, up to MAX_BACKOFF times, each other response halves it back,
+		- a Retry-After header is honoured.
+	The delay never exceeds MAX_DELAY. Its readyTime is meant to be the priority function of the frontier.
+
+	Data members:
+	_hosts: LRUCache{ host: [response time, backoff, crawl delay, next time] }
+		the state of the most recently fetched hosts. A host which is not there may be fetched right away.
+	"""
+	def __init__(self, minDelay = DEFAULT_MIN_DELAY, maxDelay = MAX_DELAY):
+		"""
+		Initialize a PolitenessPolicy.
+		---------  Param --------
+		minDelay: (float)
+			the shortest time, in seconds, between two fetches from a host.
+		maxDelay: (float)
+			the longest time, in seconds, between two fetches from a host.
+
+		---------  Return --------
+		None.
+		"""
+		self._minDelay = minDelay
+		self._maxDelay = maxDelay
+		self._hosts = LRUCache(HOST_CACHE_SIZE)
+		self._lock = Lock()
+
+	def _state(self, host):
+		state = self._hosts.get(host)
+		if(state is None):
+			state = [0.0, 1, 0, 0]
+			self._hosts.put(host, state)
+		return state
+
+	def readyTime(self, host):
+		"""
+		Return the earliest time host may be fetched again.
+		"""
+		self._lock.acquire()
+		try:
+			state = self._hosts.get(host)
+			return 0 if state is None else state[3]
+		finally:
+			self._lock.release()
+
+	def setCrawlDelay(self, host, seconds):
+		"""
+		Set the Crawl-delay found in the robots.txt of host.
+		"""
+		self._lock.acquire()
+		try:
+			self._state(host)[2] = min(seconds, self._maxDelay)
+		finally:
+			self._lock.release()
+
+	def delay(self, host):
+		"""
+		Return the current delay between two fetches from host, before any Retry-After.
+		"""
+		self._lock.acquire()
+		try:
+			responseTime, backoff, crawlDelay, nextTime = self._state(host)
+			return min(max(self._minDelay, crawlDelay, RESPONSE_TIME_FACTOR * responseTime) * backoff, self._maxDelay)
+		finally:
+			self._lock.release()
+
+	def record(self, host, status, elapsed, headers = None):
+		"""
+		Record a fetch from host which just finished, and schedule the next one.
+		---------  Param --------
+		host: (str)
+			the host fetched.
+		status: (int)
+			the HTTP status of the response, None if no response came back.
+		elapsed: (float)
+			the number of seconds the fetch took.
+		headers: (dict)
+			the headers of the response, if any.
+
+		---------  Return --------
+		None.
+		"""
+		wait = retryAfter(headers)
+		self._lock.acquire()
+		try:
+			state = self._state(host)
+			if(status is None or status in BACKOFF_CODES):
+				state[1] = min(state[1] * 2, MAX_BACKOFF)
+			else:
+				state[1] = max(state[1] // 2, 1)
+				state[0] = elapsed if state[0] == 0 else \
+					(1 - RESPONSE_TIME_SMOOTHING) * state[0] + RESPONSE_TIME_SMOOTHING * elapsed
+			delay = max(self._minDelay, state[2], RESPONSE_TIME_FACTOR * state[0]) * state[1]
+			if(wait is not None):
+				delay = max(delay, wait)
+			state[3] = time.time() + min(delay, self._maxDelay)
+		finally:
+			self._lock.release()
+
+	def snapshot(self):
+		"""
+		Return the state of the hosts as a list of (host, response time, backoff, crawl delay, next time), 
+		the least recently fetched host first.
+		"""
+		self._lock.acquire()
+		try:
+			return [(host, ) + tuple(state) for host, state in self._hosts.items()]
+		finally:
+			self._lock.release()
+
+	def restore(self, records):
+		"""
+		Set the state of the hosts from records returned by snapshot().
+		"""
+		self._lock.acquire()
+		try:
+			for host, responseTime, backoff, crawlDelay, nextTime in records:
+				self._hosts.put(host, [responseTime, backoff, crawlDelay, nextTime])
+		finally:
+			self._lock.release()
@@ -0,0 +1,189 @@
+from threading import Lock
+from heapq import heappush, heappop, heapify
+import hashlib
+import math
+import time
+
+from lib import metrics
+from lib.lrucache import LRUCache
+
+DEFAULT_REVISIT_INTERVAL = 86400
+MIN_REVISIT_INTERVAL = 600
+MAX_REVISIT_INTERVAL = 30 * 86400
+DEFAULT_CAPACITY = 500000
+NOT_MODIFIED = 304
+
+REVISITS = metrics.counter("revisit_fetches_total", "Pages revisited, by whether they had changed.", ["outcome"])
+
+def changeRate(visits, changes, elapsed):
+	"""
+	Estimate the rate at which a page changes, per second, from visits revisits spanning elapsed seconds,
+	changes of which found the page changed. The page is taken to change as a Poisson process, and since a revisit
+	only tells whether the page changed at least once, the estimator corrects for the changes it misses
+	(Cho and Garcia-Molina, 2003): -log((visits - changes + 0.5) / (visits + 0.5)) per average interval.
+	"""
+	if(visits == 0 or elapsed <= 0):
+		return 0.0
+	return -math.log((visits - changes + 0.5) / (visits + 0.5)) * visits / elapsed
+
+class RevisitPolicy(object):
+	"""
+	A RevisitPolicy keeps the validators of the pages crawled, so they are revisited with conditional requests,
+	and schedules each revisit after an interval inversely proportional to how often the page was found changed:
+		- a page is first revisited after initialInterval seconds,
+		- the interval of a page which never changed doubles at each revisit,
+		- otherwise it's the inverse of its estimated change rate,
+	always between minInterval and maxInterval. A page is found changed when a revisit gets a response other than
+	304 Not Modified whose content hash differs from the last one.
+	At most capacity pages are kept: the one least recently visited, i.e. the one changing the least, is dropped for a new one,
+	and is not revisited anymore.
+
+	Data members:
+	_pages: LRUCache{ url: [etag, last modified, content hash, visits, changes, first visit, last visit, interval, next visit] }
+		the state of the pages crawled. Visits and changes count the revisits only.
+
+	_due: list[ (next visit, url) ]
+		a binary min heap of the scheduled revisits. An entry is stale, and skipped, if the page's next visit has moved since
+		or the page was dropped. The heap is rebuilt from _pages when stale entries make up more than half of it.
+	"""
+	def __init__(self, initialInterval = DEFAULT_REVISIT_INTERVAL, minInterval = MIN_REVISIT_INTERVAL, \
+		maxInterval = MAX_REVISIT_INTERVAL, capacity = DEFAULT_CAPACITY):
+		"""
+		Initialize a RevisitPolicy.
+		---------  Param --------
+		initialInterval: (float)
+			the number of seconds after which a page is revisited the first time.
+		minInterval, maxInterval: (float)
+			the bounds, in seconds, of the interval between two visits of a page.
+		capacity: (int)
+			the number of pages whose revisits are scheduled.
+
+		---------  Return --------
+		None.
+		"""
+		self._initialInterval = initialInterval
+		self._minInterval = min(minInterval, initialInterval)
+		self._maxInterval = max(maxInterval, initialInterval)
+		self._pages = LRUCache(capacity)
+		self._due = []
+		self._lock = Lock()
+
+	def __len__(self):
+		return len(self._pages)
+
+	def __contains__(self, url):
+		self._lock.acquire()
+		try:
+			return url in self._pages
+		finally:
+			self._lock.release()
+
+	def conditionalHeaders(self, url):
+		"""
+		Return the headers making the request for url conditional on the page having changed, as a list of (name, value).
+		"""
+		self._lock.acquire()
+		try:
+			state = self._pages.get(url)
+		finally:
+			self._lock.release()
+		headers = []
+		if(state is not None and state[0] is not None):
+			headers.append(("If-None-Match", state[0]))
+		if(state is not None and state[1] is not None):
+			headers.append(("If-Modified-Since", state[1]))
+		return headers
+
+	def record(self, url, status, headers, body = None):
+		"""
+		Record the response to a request for url, 200 with its body or 304, and schedule the next visit of the page.
+		Return False if the page is known and has not changed since the last visit, True otherwise.
+		"""
+		now = time.time()
+		digest = hashlib.md5(body).digest() if body is not None else None
+		self._lock.acquire()
+		try:
+			state = self._pages.get(url)
+			if(state is None):
+				state = [None, None, digest, 0, 0, now, now, self._initialInterval, 0]
+				self._pages.put(url, state)
+				changed = True
+			else:
+				changed = status != NOT_MODIFIED and digest != state[2]
+				state[3] += 1
+				if(changed):
+					state[4] += 1
+					state[2] = digest
+				rate = changeRate(state[3], state[4], now - state[5])
+				interval = state[7] * 2 if rate == 0 else 1 / rate
+				state[7] = min(max(interval, self._minInterval), self._maxInterval)
+				state[6] = now
+				REVISITS.labels("changed" if changed else ("not_modified" if status == NOT_MODIFIED else "unchanged")).inc()
+			if(headers is not None):
+				state[0] = headers.get("etag") or state[0]
+				state[1] = headers.get("last-modified") or state[1]
+			self._schedule(url, state, now + state[7])
+			return changed
+		finally:
+			self._lock.release()
+
+	def forget(self, url):
+		"""
+		Stop revisiting url, e.g. because its page turned out to be a near duplicate of another one.
+		"""
+		self._lock.acquire()
+		try:
+			self._pages.pop(url)
+		finally:
+			self._lock.release()
+
+	def _schedule(self, url, state, when):
+		state[8] = when
+		heappush(self._due, (when, url))
+		if(len(self._due) > 2 * len(self._pages) + 1):
+			self._due = [(state[8], url) for url, state in self._pages.items()]
+			heapify(self._due)
+
+	def snapshot(self):
+		"""
+		Return the state of the pages as a list of (url, etag, last modified, content hash, visits, changes, first visit,
+		last visit, interval, next visit), the least recently visited page first.
+		"""
+		self._lock.acquire()
+		try:
+			return [(url, ) + tuple(state) for url, state in self._pages.items()]
+		finally:
+			self._lock.release()
+
+	def restore(self, records):
+		"""
+		Set the state of the pages from records returned by snapshot(), and schedule their revisits.
+		"""
+		self._lock.acquire()
+		try:
+			for record in records:
+				state = list(record[1:])
+				self._pages.put(record[0], state)
+				self._schedule(record[0], state, state[8])
+		finally:
+			self._lock.release()
+
+	def due(self):
+		"""
+		Return the urls whose revisit is due. Each is scheduled again after its interval, in case its fetch fails,
+		until its response is recorded.
+		"""
+		now = time.time()
+		urls = []
+		self._lock.acquire()
+		try:
+			while(self._due and self._due[0][0] <= now):
+				when, url = heappop(self._due)
+				state = self._pages.get(url)
+				if(state is None or state[8] != when):
+					continue
+				urls.append(url)
+				self._schedule(url, state, now + state[7])
+			return urls
+		finally:
+			self._lock.release()
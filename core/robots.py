@@ -0,0 +1,313 @@
+"""
+The robots.txt rules of the hosts being crawled, fetched in the background and cached.
+"""
+
+from robotparser import RobotFileParser
+from urlparse import urlsplit
+from threading import Thread, Lock
+from Queue import Queue, Empty
+from heapq import heappush, heappop
+from datetime import datetime
+import urllib2
+import logging
+import time
+import sys
+
+from lib.lrucache import LRUCache
+from lib.spillqueue import SpillQueue
+
+DEFAULT_TTL = 24 * 3600
+FAILURE_TTL = 600
+DEFAULT_CAPACITY = 10000
+DEFAULT_FETCHERS = 4
+FETCH_TIMEOUT = 10
+MAX_ROBOTS_SIZE = 512 * 1024
+MAX_PARKED = 1000
+RELEASE_BATCH_SIZE = 1000
+REQUEST_WAIT_TIME = 1
+
+## the rules used when a host forbids fetching its robots.txt.
+DISALLOW_ALL = "User-agent: *\nDisallow: /\n"
+
+def crawlDelay(body, userAgent):
+	"""
+	Return the Crawl-delay a robots.txt body asks of userAgent, or None.
+	The delay of a group naming the agent wins over the one of the "*" group.
+	"""
+	token = userAgent.split("/")[0].lower()
+	delays = {}
+	agents = []
+	inRules = False
+	for line in body.splitlines():
+		line = line.split("#", 1)[0].strip()
+		name, sep, value = line.partition(":")
+		if(not sep):
+			continue
+		name, value = name.strip().lower(), value.strip()
+		if(name == "user-agent"):
+			if(inRules):
+				agents = []
+				inRules = False
+			agents.append(value.lower())
+			continue
+		inRules = True
+		if(name == "crawl-delay"):
+			try:
+				delay = float(value)
+			except ValueError:
+				continue
+			for agent in agents:
+				if(agent == "*"):
+					delays.setdefault("*", delay)
+				elif(agent in token):
+					delays.setdefault(token, delay)
+	return delays.get(token, delays.get("*"))
+
+class RobotsCache(object):
+	"""
+	A RobotsCache tells whether a url may be crawled according to the robots.txt of its host, without ever blocking on the network.
+
+	The rules of a host are fetched by a pool of fetcher threads the first time one of its urls is checked. Until they arrive,
+	the urls of the host are parked and reported as disallowed; once the rules are known, the parked urls which they allow are
+	handed to releaseFunc, e.g. to be put into the frontier again. A robots.txt which can't be fetched for now (network error,
+	timeout, 5xx) is fetched again after failureTTL seconds, the urls staying parked meanwhile. Rules are kept for ttl seconds,
+	after which they are fetched again in the background while the old ones are still used, also if that fetch fails.
+	Rules can also be loaded from other workers, through the manager, so a robots.txt is fetched once per cluster; the ones fetched here are collected for that by takeFetched().
+
+	Data members:
+	_rules: LRUCache{ host: (expiry time, RobotFileParser) }
+		the rules of the most recently checked hosts.
+
+	_pending: dict{ host: set[ url ] }
+		the hosts whose rules are being fetched, with their parked urls. At most MAX_PARKED urls of a host are kept in memory.
+
+	_overflow: dict{ host: SpillQueue | Queue }
+		the urls parked for a host beyond MAX_PARKED, spilled to disk under spillDir if there is one.
+
+	_retries: list[ (time, host, robots url) ]
+		a binary min heap of the robots.txt to fetch again after a failure.
+
+	_fetched: list[ (host, expiry time, body) ]
+		the robots.txt fetched here since the last call to takeFetched().
+	"""
+	def __init__(self, userAgent, releaseFunc = None, crawlDelayFunc = None, ttl = DEFAULT_TTL, capacity = DEFAULT_CAPACITY, \
+		nFetchers = DEFAULT_FETCHERS, logger = None, dnsCache = None, spillDir = None, failureTTL = FAILURE_TTL):
+		"""
+		Initialize a RobotsCache.
+		---------  Param --------
+		userAgent: (str)
+			the user agent the rules are checked for.
+		releaseFunc: func(list[ url ])
+			the function called with the parked urls of a host which its rules allow.
+		crawlDelayFunc: func(host, seconds)
+			the function called with the Crawl-delay of a host, if its robots.txt has one.
+		ttl: (float)
+			the number of seconds the rules of a host are kept.
+		capacity: (int)
+			the number of hosts whose rules are kept.
+		nFetchers: (int)
+			the number of threads fetching robots.txt.
+		logger: (logging.Logger)
+			A logger used to log info/warning/error about fetching.
+		dnsCache: (DNSCache)
+			A cache the hosts are resolved through, warmed up for the downloaders along the way.
+		spillDir: (str)
+			the directory the urls parked beyond MAX_PARKED per host are spilled to. If None, they are kept in memory.
+		failureTTL: (float)
+			the number of seconds after which a robots.txt which couldn't be fetched is fetched again.
+
+		---------  Return --------
+		None.
+		"""
+		self._userAgent = userAgent
+		self._releaseFunc = releaseFunc
+		self._crawlDelayFunc = crawlDelayFunc
+		self._ttl = ttl
+		self._failureTTL = failureTTL
+		self._spillDir = spillDir
+		self._rules = LRUCache(capacity)
+		self._pending = {}
+		self._overflow = {}
+		self._retries = []
+		self._fetched = []
+		self._requests = Queue()
+		self._lock = Lock()
+		self._logger = logger
+		self._opener = urllib2.build_opener(*dnsCache.handlers()) if dnsCache is not None else urllib2.build_opener()
+		self._running = False
+		self._fetchers = [Thread(target = self._fetch) for i in range(max(nFetchers, 1))]
+		for fetcher in self._fetchers:
+			fetcher.daemon = True
+
+	def log(self, level, msg):
+		"""
+		Log info/warning/error message in log file.
+		"""
+		if(self._logger is not None):
+			if level == logging.INFO:
+				self._logger.info("[%s] INFO: %s" % (datetime.now(), msg))
+			elif level == logging.WARNING:
+				self._logger.warn("[%s] WARNING: %s" % (datetime.now(), msg))
+			else:
+				self._logger.error("[%s] ERROR: %s" % (datetime.now(), msg))
+
+	def start(self):
+		"""
+		Start the fetcher threads.
+		"""
+		self._running = True
+		for fetcher in self._fetchers:
+			fetcher.start()
+
+	def stop(self):
+		"""
+		Stop the fetcher threads once they are done with the robots.txt being fetched.
+		"""
+		self._running = False
+		for fetcher in self._fetchers:
+			fetcher.join()
+		for overflow in self._overflow.itervalues():
+			if(isinstance(overflow, SpillQueue)):
+				overflow.close()
+
+	def disallow(self, url):
+		"""
+		Return True if url must not be crawled now: it's disallowed by the rules of its host, or they are not known yet,
+		in which case url is parked until they are. A filter of the frontier.
+		"""
+		try:
+			parts = urlsplit(url)
+			host, robotsUrl = parts.netloc, "%s://%s/robots.txt" % (parts.scheme, parts.netloc)
+		except ValueError:
+			return True
+		self._lock.acquire()
+		try:
+			entry = self._rules.get(host)
+			if(entry is None or entry[0] < time.time()):
+				if(host not in self._pending):
+					self._pending[host] = set()
+					self._requests.put((host, robotsUrl))
+				if(entry is None):
+					parked = self._pending[host]
+					if(len(parked) < MAX_PARKED):
+						parked.add(url)
+					else:
+						self._park(host, url)
+					return True
+			rules = entry[1]
+		finally:
+			self._lock.release()
+		return not rules.can_fetch(self._userAgent, url)
+
+	def _park(self, host, url):
+		"""
+		Park url beyond the MAX_PARKED urls of host kept in memory.
+		"""
+		overflow = self._overflow.get(host)
+		if(overflow is None):
+			overflow = SpillQueue(self._spillDir, MAX_PARKED) if self._spillDir is not None else Queue()
+			self._overflow[host] = overflow
+		try:
+			overflow.put(url)
+		except (IOError, OSError) as e:
+			self.log(logging.ERROR, "unable to park %s: %s" % (url, e))
+
+	def load(self, host, expires, body):
+		"""
+		Set the rules of host from the body of its robots.txt, valid until expires, and release the urls parked for it.
+		"""
+		rules = RobotFileParser()
+		rules.parse(body.splitlines())
+		self._lock.acquire()
+		try:
+			self._rules.put(host, (expires, rules))
+			parked = self._pending.pop(host, ())
+			overflow = self._overflow.pop(host, None)
+		finally:
+			self._lock.release()
+		if(self._crawlDelayFunc is not None):
+			delay = crawlDelay(body, self._userAgent)
+			if(delay is not None):
+				self._crawlDelayFunc(host, delay)
+		self._release(rules, parked)
+		while(overflow is not None and overflow.qsize() > 0):
+			try:
+				batch = [overflow.get(False) for i in xrange(min(RELEASE_BATCH_SIZE, overflow.qsize()))]
+			except (IOError, OSError) as e:
+				self.log(logging.ERROR, "unable to read the urls parked for %s: %s" % (host, e))
+				break
+			self._release(rules, batch)
+		if(isinstance(overflow, SpillQueue)):
+			overflow.close()
+
+	def _release(self, rules, urls):
+		"""
+		Hand the urls which rules allow to releaseFunc.
+		"""
+		allowed = [url for url in urls if rules.can_fetch(self._userAgent, url)]
+		if(allowed and self._releaseFunc is not None):
+			self._releaseFunc(allowed)
+
+	def takeFetched(self):
+		"""
+		Return the (host, expiry time, body) of the robots.txt fetched since the last call.
+		"""
+		self._lock.acquire()
+		try:
+			fetched, self._fetched = self._fetched, []
+			return fetched
+		finally:
+			self._lock.release()
+
+	def _download(self, robotsUrl):
+		"""
+		Return the body of a robots.txt and the number of seconds it may be cached.
+		A missing robots.txt allows everything, a forbidden one disallows everything.
+		Return None as the body if it can't be fetched for now.
+		"""
+		try:
+			request = urllib2.Request(robotsUrl)
+			request.add_header("User-Agent", self._userAgent)
+			response = self._opener.open(request, timeout = FETCH_TIMEOUT)
+			return response.read(MAX_ROBOTS_SIZE), self._ttl
+		except urllib2.HTTPError as e:
+			if(e.code in (401, 403)):
+				return DISALLOW_ALL, self._ttl
+			if(400 <= e.code < 500):
+				return "", self._ttl
+			self.log(logging.WARNING, "HTTP Error %d: Unable to open %s" % (e.code, robotsUrl))
+		except:
+			self.log(logging.WARNING, str(sys.exc_info()[0]) + "Unable to open " + robotsUrl)
+		return None, self._failureTTL
+
+	def _fetch(self):
+		"""
+		The main loop of a fetcher thread.
+		"""
+		while(self._running):
+			self._lock.acquire()
+			now = time.time()
+			while(self._retries and self._retries[0][0] <= now):
+				self._requests.put(heappop(self._retries)[1:])
+			self._lock.release()
+			try:
+				host, robotsUrl = self._requests.get(timeout = REQUEST_WAIT_TIME)
+			except Empty:
+				continue
+			self._lock.acquire()
+			entry = self._rules.get(host)
+			self._lock.release()
+			if(entry is not None and entry[0] >= time.time() and host not in self._pending):
+				continue
+			body, ttl = self._download(robotsUrl)
+			if(body is None):
+				## the urls stay parked, or checked against the stale rules, until the retry.
+				self._lock.acquire()
+				heappush(self._retries, (time.time() + ttl, host, robotsUrl))
+				self._lock.release()
+				continue
+			expires = time.time() + ttl
+			self.load(host, expires, body)
+			self._lock.acquire()
+			self._fetched.append((host, expires, body))
+			self._lock.release()
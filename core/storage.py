@@ -0,0 +1,446 @@
+from Queue import Queue, Empty
+from threading import Thread, Event, Lock
+from datetime import datetime
+from pymongo.errors import DuplicateKeyError
+from bson.binary import Binary
+from lib.lrucache import LRUCache
+import logging
+import hashlib
+import json
+import zlib
+import time
+import sys
+import os
+
+try:
+	import zstandard
+except ImportError:
+	zstandard = None
+
+DEFAULT_QSIZE = 200
+DEFAULT_BATCH_SIZE = 50
+DEFAULT_FLUSH_INTERVAL = 2
+DEFAULT_MAX_RETRIES = 3
+RETRY_DELAY = 1
+
+ZLIB = "zlib"
+ZSTD = "zstd"
+DEFAULT_COMPRESS_LEVEL = 6
+DEFAULT_KNOWN_CACHE_SIZE = 1000000
+DEFAULT_DICT_SIZE = 112640
+
+def contentDigest(html):
+	"""
+	Return the hex digest identifying the content of a page.
+	"""
+	if(isinstance(html, unicode)):
+		html = html.encode("utf-8")
+	return hashlib.sha1(html).hexdigest()
+
+class MongoBackend(object):
+	"""
+	A MongoBackend stores pages in the crawler.webpage collection.
+	"""
+	def __init__(self, dbclient):
+		self._dbclient = dbclient
+
+	def insert(self, pages):
+		"""
+		Insert a batch of pages with a single bulk insert.
+		"""
+		try:
+			self._dbclient.crawler.webpage.insert(pages, continue_on_error = True)
+		except DuplicateKeyError:
+			## the pages were stored by a previous attempt which failed half way.
+			pass
+
+class FileBackend(object):
+	"""
+	A FileBackend is a stand-in for the database which appends pages to a local file, one json object per line.
+	"""
+	def __init__(self, path):
+		self._path = path
+		self._lock = Lock()
+
+	def insert(self, pages):
+		"""
+		Append a batch of pages to the file with a single write.
+		"""
+		lines = []
+		for page in pages:
+			record = dict(page)
+			if(isinstance(record.get("html"), str)):
+				record["html"] = record["html"].decode("utf-8", "replace")
+			lines.append(json.dumps(record) + "\n")
+		self._lock.acquire()
+		try:
+			f = open(self._path, "a")
+			f.write("".join(lines))
+			f.close()
+		finally:
+			self._lock.release()
+
+	def find(self):
+		"""
+		Return an iterator over the pages stored so far.
+		"""
+		f = open(self._path, "r")
+		try:
+			for line in f:
+				yield json.loads(line)
+		finally:
+			f.close()
+
+class ContentBackend(object):
+	"""
+	A ContentBackend stores the body of each distinct page once, under the digest of its content, compressed with zlib or zstd.
+	Every url is recorded along with the digest of its page, so pages fetched from mirrors or repeated urls take no body space.
+	With zstd, a dictionary can be trained on the first trainSamples bodies and used to compress all the later ones,
+	which pays off for the many small, similar pages of a site.
+
+	The digests known to be stored are cached, so already known content is neither compressed nor written again.
+	Subclasses tell where bodies, url mappings and dictionaries go.
+
+	Data members:
+	_known: LRUCache{ digest }
+		the digests of the bodies known to be stored.
+
+	_compressor: zstandard.ZstdCompressor
+		the compressor used for zstd, built on the trained dictionary once there is one. 
+
+	_compressorName: str
+		the codec stored with each body to tell how to decompress it: "zlib", "zstd" or "zstd:<digest of the dictionary>".
+	"""
+	def __init__(self, codec = ZLIB, level = DEFAULT_COMPRESS_LEVEL, trainSamples = 0, dictSize = DEFAULT_DICT_SIZE, \
+		knownCacheSize = DEFAULT_KNOWN_CACHE_SIZE):
+		"""
+		Initialize a ContentBackend.
+		---------  Param --------
+		codec: (str)
+			ZLIB or ZSTD. ZSTD requires the zstandard module.
+		level: (int)
+			the compression level.
+		trainSamples: (int)
+			the number of bodies to train a zstd dictionary on. 0 means no dictionary.
+		dictSize: (int)
+			the size of the trained dictionary in bytes.
+		knownCacheSize: (int)
+			the number of digests remembered as stored.
+
+		---------  Return --------
+		None.
+		"""
+		if(codec == ZSTD and zstandard is None):
+			raise ValueError("the zstandard module is required to compress with zstd")
+		if(codec not in (ZLIB, ZSTD)):
+			raise ValueError("unknown codec: %s" % codec)
+		self._codec = codec
+		self._level = level
+		self._compressor = zstandard.ZstdCompressor(level = level) if codec == ZSTD else None
+		self._compressorName = codec
+		self._trainSamples = trainSamples if codec == ZSTD else 0
+		self._dictSize = dictSize
+		self._samples = []
+		self._dictionaries = {}
+		self._known = LRUCache(knownCacheSize)
+		self._lock = Lock()
+
+	def known(self, digest):
+		"""
+		Return True if a body with the given digest is known to be stored.
+		"""
+		self._lock.acquire()
+		try:
+			return digest in self._known
+		finally:
+			self._lock.release()
+
+	def insert(self, pages):
+		"""
+		Store the bodies of a batch of pages which are not stored yet, and the url to digest mapping of all of them.
+		A page may come without html if its digest is known already.
+		"""
+		bodies = {}
+		mappings = []
+		self._lock.acquire()
+		try:
+			for page in pages:
+				digest = page.get("digest") or contentDigest(page["html"])
+				mappings.append((page["url"], digest))
+				if(digest in self._known or digest in bodies or page.get("html") is None):
+					continue
+				bodies[digest] = self._compress(page["html"])
+		finally:
+			self._lock.release()
+
+		if(bodies):
+			self._putBodies(bodies)
+		self._putUrls(mappings)
+		self._lock.acquire()
+		for digest in bodies:
+			self._known.put(digest)
+		self._lock.release()
+
+	def get(self, url):
+		"""
+		Return the html of the page stored for url, or None.
+		"""
+		digest = self._getDigest(url)
+		if(digest is None):
+			return None
+		codec, data = self._getBody(digest)
+		return self._decompress(codec, data)
+
+	def _compress(self, html):
+		"""
+		Return (codec, compressed html).
+		"""
+		if(isinstance(html, unicode)):
+			html = html.encode("utf-8")
+		if(self._codec == ZLIB):
+			return ZLIB, zlib.compress(html, self._level)
+
+		if(self._trainSamples > 0):
+			self._samples.append(html)
+			if(len(self._samples) >= self._trainSamples):
+				self._train()
+		return self._compressorName, self._compressor.compress(html)
+
+	def _train(self):
+		"""
+		Train a dictionary on the sampled bodies and compress with it from now on.
+		"""
+		dictionary = zstandard.train_dictionary(self._dictSize, self._samples)
+		data = dictionary.as_bytes()
+		name = "%s:%s" % (ZSTD, hashlib.sha1(data).hexdigest())
+		self._putDictionary(name, data)
+		self._dictionaries[name] = dictionary
+		self._compressor = zstandard.ZstdCompressor(level = self._level, dict_data = dictionary)
+		self._compressorName = name
+		self._trainSamples = 0
+		self._samples = []
+
+	def _decompress(self, codec, data):
+		if(codec == ZLIB):
+			return zlib.decompress(data)
+		if(codec == ZSTD):
+			return zstandard.ZstdDecompressor().decompress(data)
+		dictionary = self._dictionaries.get(codec)
+		if(dictionary is None):
+			dictionary = zstandard.ZstdCompressionDict(self._getDictionary(codec))
+			self._dictionaries[codec] = dictionary
+		return zstandard.ZstdDecompressor(dict_data = dictionary).decompress(data)
+
+class MongoContentBackend(ContentBackend):
+	"""
+	A MongoContentBackend stores bodies in crawler.content keyed by digest, url mappings in crawler.urlmap 
+	and dictionaries in crawler.dictionary.
+	"""
+	def __init__(self, dbclient, **kwargs):
+		super(MongoContentBackend, self).__init__(**kwargs)
+		self._db = dbclient.crawler
+
+	def _putBodies(self, bodies):
+		docs = [{"_id": digest, "codec": codec, "body": Binary(data)} for digest, (codec, data) in bodies.iteritems()]
+		try:
+			self._db.content.insert(docs, continue_on_error = True)
+		except DuplicateKeyError:
+			## stored already, by another worker or a previous attempt.
+			pass
+
+	def _putUrls(self, mappings):
+		self._db.urlmap.insert([{"url": url, "digest": digest} for url, digest in mappings])
+
+	def _putDictionary(self, name, data):
+		self._db.dictionary.save({"_id": name, "data": Binary(data)})
+
+	def _getDigest(self, url):
+		doc = self._db.urlmap.find_one({"url": url})
+		return doc["digest"] if doc else None
+
+	def _getBody(self, digest):
+		doc = self._db.content.find_one({"_id": digest})
+		return doc["codec"], str(doc["body"])
+
+	def _getDictionary(self, name):
+		return str(self._db.dictionary.find_one({"_id": name})["data"])
+
+class FileContentBackend(ContentBackend):
+	"""
+	A FileContentBackend is a stand-in for the database which stores each body in its own file named by its digest, 
+	the url mappings in an append-only file, one "digest url" per line, and each dictionary in a file named by its codec.
+	"""
+	def __init__(self, directory, **kwargs):
+		super(FileContentBackend, self).__init__(**kwargs)
+		self._dir = directory
+		if(not os.path.exists(directory)):
+			os.makedirs(directory)
+
+	def _bodyPath(self, digest):
+		return os.path.join(self._dir, digest[:2], digest[2:])
+
+	def _putBodies(self, bodies):
+		for digest, (codec, data) in bodies.iteritems():
+			path = self._bodyPath(digest)
+			if(os.path.exists(path)):
+				continue
+			if(not os.path.exists(os.path.dirname(path))):
+				os.makedirs(os.path.dirname(path))
+			f = open(path + ".tmp", "wb")
+			f.write(codec + "\n" + data)
+			f.close()
+			os.rename(path + ".tmp", path)
+
+	def _putUrls(self, mappings):
+		f = open(os.path.join(self._dir, "urlmap"), "a")
+		f.write("".join("%s %s\n" % (digest, url.encode("utf-8") if isinstance(url, unicode) else url) for url, digest in mappings))
+		f.close()
+
+	def _putDictionary(self, name, data):
+		f = open(os.path.join(self._dir, name.replace(":", "-")), "wb")
+		f.write(data)
+		f.close()
+
+	def _getDigest(self, url):
+		if(isinstance(url, unicode)):
+			url = url.encode("utf-8")
+		digest = None
+		f = open(os.path.join(self._dir, "urlmap"), "r")
+		for line in f:
+			if(line.rstrip("\n").split(" ", 1)[1] == url):
+				digest = line.split(" ", 1)[0]
+		f.close()
+		return digest
+
+	def _getBody(self, digest):
+		f = open(self._bodyPath(digest), "rb")
+		codec, data = f.read().split("\n", 1)
+		f.close()
+		return codec, data
+
+	def _getDictionary(self, name):
+		f = open(os.path.join(self._dir, name.replace(":", "-")), "rb")
+		data = f.read()
+		f.close()
+		return data
+
+class PageStore(Thread):
+	"""
+	A PageStore is a thread which stores pages on behalf of the parser.
+	Pages are put into a bounded queue, so the parser is slowed down rather than pages being lost when the backend can not keep up.
+	They are written in batches of batchSize pages, or whatever has been collected within flushInterval seconds.
+	A batch which fails to be written is retried up to maxRetries times before it's dropped.
+	"""
+	def __init__(self, backend, logger = None, maxQSize = DEFAULT_QSIZE, batchSize = DEFAULT_BATCH_SIZE, \
+		flushInterval = DEFAULT_FLUSH_INTERVAL, maxRetries = DEFAULT_MAX_RETRIES):
+		"""
+		Initialize a PageStore.
+		---------  Param --------
+		backend: (MongoBackend | FileBackend)
+			where the pages are written.
+		logger: (logging.Logger)
+			A logger used to log info/warning/error about storing.
+		maxQSize: (int)
+			the number of pages which may wait to be stored before put() blocks.
+		batchSize: (int)
+			the number of pages written at once.
+		flushInterval: (float)
+			the longest time, in seconds, a page waits for its batch to be filled.
+		maxRetries: (int)
+			the number of times a failed batch is retried.
+
+		---------  Return --------
+		None.
+		"""
+		super(PageStore, self).__init__()
+		self.daemon = True
+		self._backend = backend
+		self._logger = logger
+		self._pageQ = Queue(maxQSize)
+		self._batchSize = batchSize
+		self._flushInterval = flushInterval
+		self._maxRetries = maxRetries
+		self._stopEvent = Event()
+
+	def log(self, level, msg):
+		"""
+		Log info/warning/error message in log file.
+		"""
+		if(self._logger is not None):
+			if level == logging.INFO:
+				self._logger.info("[%s] INFO: %s" % (datetime.now(), msg))
+			elif level == logging.WARNING:
+				self._logger.warn("[%s] WARNING: %s" % (datetime.now(), msg))
+			else:
+				self._logger.error("[%s] ERROR: %s" % (datetime.now(), msg))
+
+	def put(self, page):
+		"""
+		Queue a page to be stored, blocking while the queue is full.
+		With a ContentBackend, the html of a page whose content is stored already is dropped here and only its url is recorded.
+		The page is converted to utf-8 first, so its digest is that of the body stored, whatever charset it was served in.
+		"""
+		if(isinstance(self._backend, ContentBackend)):
+			page = self._prepare(page)
+			page["digest"] = contentDigest(page["html"])
+			if(self._backend.known(page["digest"])):
+				page = {"url": page["url"], "digest": page["digest"]}
+		self._pageQ.put(page)
+
+	def stop(self):
+		"""
+		Stop the thread once the queued pages are stored.
+		"""
+		self._stopEvent.set()
+		self.join()
+
+	def run(self):
+		"""
+		Keep storing the queued pages until being stopped.
+		"""
+		batch = []
+		deadline = time.time() + self._flushInterval
+		while(not self._stopEvent.isSet() or not self._pageQ.empty()):
+			try:
+				page = self._pageQ.get(timeout = max(deadline - time.time(), 0.01))
+				batch.append(self._prepare(page))
+			except Empty:
+				pass
+			if(len(batch) >= self._batchSize or (batch and time.time() >= deadline)):
+				self._write(batch)
+				batch = []
+			if(not batch):
+				deadline = time.time() + self._flushInterval
+		if(batch):
+			self._write(batch)
+
+	def _prepare(self, page):
+		"""
+		Convert the html of a page to utf-8, and drop the fields used while crawling only.
+		"""
+		charset = page.pop("charset", None)
+		page.pop("revisit", None)
+		if(page.get("html") is None):
+			return page
+		try:
+			if charset is not None and charset.lower() != "utf-8":
+				page["html"] = page["html"].decode(charset, 'ignore')
+				page["html"] = page["html"].encode("utf-8", 'ignore')
+		except:
+			self.log(logging.WARNING, "failed to convert webpage %s from %s" % (page["url"], charset))
+		return page
+
+	def _write(self, batch):
+		"""
+		Write a batch of pages, retrying with an increasing delay if it fails.
+		"""
+		for attempt in range(self._maxRetries + 1):
+			try:
+				self._backend.insert(batch)
+				self.log(logging.INFO, "stored %d webpages" % len(batch))
+				return
+			except:
+				self.log(logging.WARNING, "%s failed to store %d webpages (attempt %d)" % (sys.exc_info()[0], len(batch), attempt + 1))
+				if(attempt < self._maxRetries and not self._stopEvent.isSet()):
+					time.sleep(RETRY_DELAY * 2 ** attempt)
+		self.log(logging.ERROR, "dropped webpages %s" % [page["url"] for page in batch])
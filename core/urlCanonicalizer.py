@@ -0,0 +1,134 @@
+from urlparse import urlsplit, urlunsplit
+from threading import Lock
+import urllib
+import re
+
+from lib.lrucache import LRUCache
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+DEFAULT_CACHE_SIZE = 100000
+TRACKING_PARAMS = ["utm_*", "gclid", "dclid", "fbclid", "msclkid", "yclid", "mc_cid", "mc_eid", "_ga", "_hsenc", "_hsmi", 
+		"jsessionid", "phpsessid", "aspsessionid", "sessionid"]
+
+_ESCAPE = re.compile(r"%([0-9a-fA-F]{2})")
+_UNRESERVED = frozenset("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-._~")
+_PATH_SAFE = "/%:@!$&'()*+,;=-._~"
+_QUERY_SAFE = _PATH_SAFE + "?"
+_SESSION_PARAM = re.compile(r";(jsessionid|phpsessid|sid)=[^/?]*", re.I)
+_MISSING = object()
+
+def _normalizeEscapes(text, safe):
+	"""
+	Percent-encode the characters of text which need it, as utf-8.
+	Decode the escapes of unreserved characters and uppercase the remaining ones.
+	"""
+	if(isinstance(text, unicode)):
+		text = text.encode("utf-8")
+	text = urllib.quote(text, safe)
+	def replace(match):
+		char = chr(int(match.group(1), 16))
+		return char if char in _UNRESERVED else "%" + match.group(1).upper()
+	return _ESCAPE.sub(replace, text)
+
+def removeDotSegments(path):
+	"""
+	Resolve the "." and ".." segments of an absolute path (RFC 3986, 5.2.4).
+	"""
+	segments = []
+	parts = path.split("/")[1:]
+	for part in parts:
+		if(part == ".."):
+			if(segments):
+				segments.pop()
+		elif(part != "."):
+			segments.append(part)
+	if(parts and parts[-1] in (".", "..")):
+		segments.append("")
+	return "/" + "/".join(segments)
+
+class URLCanonicalizer(object):
+	"""
+	A URLCanonicalizer maps each url to a canonical form, so that different spellings of a url are crawled once:
+		- scheme and host are lowercased, the host is IDNA encoded and its trailing dot removed,
+		- default ports, fragments and path session ids are stripped,
+		- dot segments are resolved, the empty path becomes "/",
+		- percent-encoding is normalized,
+		- tracking query parameters are stripped and, optionally, the remaining ones sorted.
+	Urls which are not http(s) or can not be parsed are mapped to None.
+	The canonical form of the most recently seen urls is cached.
+	"""
+	def __init__(self, trackingParams = TRACKING_PARAMS, sortQuery = True, cacheSize = DEFAULT_CACHE_SIZE):
+		"""
+		Initialize a URLCanonicalizer.
+		---------  Param --------
+		trackingParams: (list[str])
+			the names of the query parameters to strip, case insensitive. Names ending with "*" match as prefixes.
+		sortQuery: (bool)
+			whether to sort the query parameters.
+		cacheSize: (int)
+			the number of urls whose canonical form is cached.
+
+		---------  Return --------
+		None.
+		"""
+		self._params = frozenset(name.lower() for name in trackingParams if not name.endswith("*"))
+		self._prefixes = tuple(name[:-1].lower() for name in trackingParams if name.endswith("*"))
+		self._sortQuery = sortQuery
+		self._cache = LRUCache(cacheSize)
+		self._lock = Lock()
+
+	def canonicalize(self, url):
+		"""
+		Return the canonical form of url, or None if it can't be crawled.
+		"""
+		self._lock.acquire()
+		try:
+			canonical = self._cache.get(url, _MISSING)
+		finally:
+			self._lock.release()
+		if(canonical is not _MISSING):
+			return canonical
+
+		try:
+			canonical = self._canonicalize(url)
+		except (ValueError, UnicodeError):
+			canonical = None
+		self._lock.acquire()
+		self._cache.put(url, canonical)
+		self._lock.release()
+		return canonical
+
+	def _canonicalize(self, url):
+		parts = urlsplit(url.strip())
+		scheme = parts.scheme.lower()
+		host = parts.hostname
+		if(scheme not in DEFAULT_PORTS or not host):
+			return None
+
+		host = host.rstrip(".")
+		if(isinstance(host, str)):
+			host = host.decode("utf-8")
+		host = host.encode("idna")
+		if(":" in host):
+			host = "[%s]" % host
+		netloc = host
+		if(parts.port is not None and parts.port != DEFAULT_PORTS[scheme]):
+			netloc = "%s:%d" % (host, parts.port)
+		if(parts.username is not None):
+			userinfo = parts.username if parts.password is None else "%s:%s" % (parts.username, parts.password)
+			netloc = "%s@%s" % (_normalizeEscapes(userinfo, ":%"), netloc)
+
+		path = removeDotSegments(_SESSION_PARAM.sub("", parts.path) or "/")
+		path = _normalizeEscapes(path, _PATH_SAFE)
+
+		params = []
+		for param in parts.query.split("&"):
+			if(not param):
+				continue
+			name = urllib.unquote(param.split("=", 1)[0]).lower()
+			if(name in self._params or (self._prefixes and name.startswith(self._prefixes))):
+				continue
+			params.append(_normalizeEscapes(param, _QUERY_SAFE))
+		if(self._sortQuery):
+			params.sort()
+		return urlunsplit((scheme, netloc, path, "&".join(params), ""))
@@ -1,36 +1,16 @@
-from robotparser import RobotFileParser
-from urlparse import urljoin
 import mimetypes
 import urllib2
 import hashlib
 from threading import Lock
 from datetime import datetime
+from lib.bloomfilter import BloomFilter, ScalableBloomFilter, DEFAULT_CAPACITY, DEFAULT_ERROR_RATE
+from lib.lrucache import LRUCache, DEFAULT_CACHE_SIZE
+
+EXACT_DEDUP = "exact"
+BLOOM_DEDUP = "bloom"
+SCALABLE_BLOOM_DEDUP = "scalable"
 
 
-class RobotFilter(object):
-	"""
-	TO BE DONE
-	"""
-	def __init__(self, userAgent):
-		self._userAgent = userAgent
-		self._dict = {}
-		
-	def disallow(self, url):
-		"""
-		TO BE DONE
-		"""
-		robotFile = urljoin(url, "/robots.txt")
-		# key = hashlib.sha1(robotFile).hexdigest()
-		if(not self._dict.has_key(key)):
-			self._dict[key] = RobotFileParser(robotFile)
-			try:
-				self._dict[key].read()
-			except :
-				self._dict[key] = None
-		result = self._dict[key] is None or not self._dict[key].can_fetch(self._userAgent, url)
-		return result
-		
-	
 class FileTypeFilter(object):
  	"""
  	TO BE DONE
@@ -53,10 +33,45 @@ class FileTypeFilter(object):
 
 class DupEliminator(object):
 	"""
-	A URLValidator is used to validate urls.
+	A DupEliminator tells whether a url has been seen before.
+
+	Data members:
+	_visited: set | BloomFilter | ScalableBloomFilter
+		the urls seen so far. The set is exact but grows with every url; the Bloom filters take a fixed (or geometrically growing) 
+		amount of memory at the price of reporting a few unseen urls as seen, with a probability bounded by errorRate.
+
+	_cache: LRUCache
+		the most recently seen urls, which are answered exactly without probing the Bloom filter. None for the exact backend.
+
+	_unsaved: list[ url ]
+		the urls seen since the last snapshot, for the exact backend. None until the first snapshot is taken.
 	"""
-	def __init__(self):
-		self._visited = set()
+	def __init__(self, backend = EXACT_DEDUP, capacity = DEFAULT_CAPACITY, errorRate = DEFAULT_ERROR_RATE, cacheSize = DEFAULT_CACHE_SIZE):
+		"""
+		Initialize a DupEliminator.
+		---------  Param --------
+		backend: (str)
+			one of EXACT_DEDUP, BLOOM_DEDUP and SCALABLE_BLOOM_DEDUP.
+		capacity: (int)
+			the number of urls the Bloom filter is sized for (the size of its first stage for the scalable one).
+		errorRate: (float)
+			the tolerated false positive rate of the Bloom filter.
+		cacheSize: (int)
+			the number of recent urls kept exactly in front of the Bloom filter.
+		"""
+		self._cache = None
+		if(backend == EXACT_DEDUP):
+			self._visited = set()
+		elif(backend == BLOOM_DEDUP):
+			self._visited = BloomFilter(capacity, errorRate)
+			self._cache = LRUCache(cacheSize)
+		elif(backend == SCALABLE_BLOOM_DEDUP):
+			self._visited = ScalableBloomFilter(capacity, errorRate)
+			self._cache = LRUCache(cacheSize)
+		else:
+			raise ValueError("unknown dedup backend: %s" % backend)
+		self.backend = backend
+		self._unsaved = None
 		self._lock = Lock()
 		
 	def seenBefore(self, url):
@@ -70,21 +85,64 @@ class DupEliminator(object):
 		"""
 		self._lock.acquire()
 		try:	
-			# url = hashlib.sha1(url).hexdigest()
-			visited = url in self._visited
-			if(not visited):
-				self._visited.add(url)
-			return visited
+			if(self._cache is None):
+				visited = url in self._visited
+				if(not visited):
+					self._visited.add(url)
+					if(self._unsaved is not None):
+						self._unsaved.append(url)
+				return visited
+
+			if(url in self._cache):
+				self._cache.put(url)
+				return True
+			self._cache.put(url)
+			return self._visited.add(url)
 		finally:
 			self._lock.release() 
 
-	def size(self):
+	def size(self, withErrorRate = False):
 		"""
-		Return the number of downloaded pages so far.
+		Return the number of distinct urls seen so far. 
+		If withErrorRate is True, return a tuple (number of urls, estimated false positive rate) instead.
 		"""
 		self._lock.acquire()
 		try:	
 			total = len(self._visited)
+			if(withErrorRate):
+				return total, (0.0 if self._cache is None else self._visited.errorRate())
 			return total
 		finally:
 			self._lock.release()
+
+	def snapshot(self):
+		"""
+		Return the state to be saved: for the exact backend, the urls seen since the last snapshot (all of them the first time),
+		to be appended to the previous ones; for the Bloom backends, the whole filter as a string.
+		"""
+		self._lock.acquire()
+		try:
+			if(self._cache is not None):
+				return self._visited.dumps()
+			urls = list(self._visited) if self._unsaved is None else self._unsaved
+			self._unsaved = []
+			return urls
+		finally:
+			self._lock.release()
+
+	def restore(self, state):
+		"""
+		Replace the urls seen so far by those of a saved state: an iterable of urls for the exact backend,
+		a buffer holding the dumped filter for the Bloom backends. Later snapshots only carry what's seen from now on.
+		"""
+		self._lock.acquire()
+		try:
+			if(self.backend == EXACT_DEDUP):
+				self._visited = set(state)
+				self._unsaved = []
+			elif(self.backend == BLOOM_DEDUP):
+				self._visited = BloomFilter.loads(state)[0]
+			else:
+				self._visited = ScalableBloomFilter.loads(state)[0]
+		finally:
+			self._lock.release()
@@ -8,14 +8,36 @@ import chardet
 import os
 import logging
 import time
+from collections import deque
+from itertools import islice
 from threading import Thread, RLock, Event
 from urlparse import urlparse
-from pymongo import MongoClient
+from lib.hashring import HashRing
+from lib import wire
+from lib.batcher import Batcher
+from lib.lrucache import LRUCache
+from lib.wal import WriteAheadLog
+from lib.seenset import SeenSet
+from lib import metrics
 
 DEFAULT_REG_PORT = 13000
 DEFAULT_DATA_PORT = 13001
-DEFAULT_DB_PORT = 27017
+DEFAULT_WAL_DIR = "wal"
+DEFAULT_METRICS_PORT = 13002
 MIN_MSG_DATA = 5
+IDLE_WAIT_TIME = 2
+INITIAL_CREDIT = 100
+HEARTBEAT_TIMEOUT = 10
+FAILURE_CHECK_INTERVAL = 2
+ROBOTS_CACHE_SIZE = 100000
+RECOVERY_BATCH_SIZE = 10000
+SEEN_DIR = "seen"
+
+RECEIVED = metrics.counter("manager_received_urls_total", "Urls received from the workers.")
+DUPLICATES = metrics.counter("manager_duplicate_urls_total", "Urls received which the cluster had seen already, and dropped.")
+DISPATCHED = metrics.counter("manager_dispatched_urls_total", "Urls sent to each worker.", ["worker"])
+BACKLOG = metrics.gauge("manager_backlog_urls", "Urls held back for each worker until it grants more credit.", ["worker"])
+FETCH_RATE = metrics.gauge("manager_worker_fetch_rate", "Pages per second each worker downloads, as last advertised.", ["worker"])
 
 class CrawlerManager(object):
 	"""
@@ -23,23 +45,73 @@ class CrawlerManager(object):
 	collect data from connected workers and dispatch jobs among them in a load-balanced way.
 
 	Data Members:
-	_workerInfo: dict{ workerID: data_port, push_socket, last_update_time, assigned_sites, url_to_crawl }
+	_workerInfo: dict{ workerID: data_port, push_socket, weight, last_update_time, assigned_sites, url_to_crawl, backlog, sent, 
+			unacked, credit, fetch_rate, frontier_size, page_queue_size }
 		workerID: str, made up of the name or ip of the worker worker and its port.
 		socket: zmq.Context.socket, a socket used to send data to worker.
-		assigned_sites: set, the jobs already done by the worker.
-		url_to_crawl: Queue, the jobs to be sent to the worker.
+		weight: float, the capacity of the worker, as given when it registered.
+		last_update_time: float, the time the last heartbeat of the worker arrived. 
+			A worker silent for HEARTBEAT_TIMEOUT seconds is considered dead and evicted.
+		assigned_sites: set, the sites the worker is responsible for.
+		url_to_crawl: Batcher, the jobs to be sent to the worker, sent in batches sized to the dispatch rate.
+		backlog: set, the jobs of the worker held back until it grants more credit.
+		sent: int, the number of urls sent to the worker so far.
+		unacked: deque[ (sent, urls) ], the batches sent to the worker it hasn't acknowledged yet, with the value of sent after each.
+			They are dispatched again if the worker dies.
+		credit: int, the number of urls the worker can take in total, as last advertised by the worker. 
+			No more than credit - sent urls are handed to url_to_crawl.
+		fetch_rate: float, the number of pages per second the worker downloads, as last advertised by the worker.
+		frontier_size, page_queue_size: int, the depths of the worker's queues, as last advertised by the worker.
+		robots_sent: set, the hosts whose robots.txt the worker has, because it fetched it or was sent it.
+
+	_evicted: dict{ workerID: weight }
+		the workers evicted for missing heartbeats, which are admitted again on their next heartbeat, e.g. after a long GC pause
+		or a network blip. A worker which unregistered is forgotten, so a heartbeat it sent before stopping can't bring it back.
+
+	_ring: HashRing
+		the registered workers, weighted by their capacity. A site belongs to the worker the ring maps it to,
+		so a worker joining or leaving only moves about 1/N of the sites.
+
+	_owners: dict{ site: workerID }
+		the worker responsible for each site seen so far, so dispatching a url takes a single lookup.
+
+	_robots: LRUCache{ host: (expiry time, body) }
+		the robots.txt the workers fetched. They are sent along with the urls of their host to the worker crawling it,
+		so a robots.txt is fetched once for the whole cluster, even when the host changes hands.
+
+	_wal: WriteAheadLog
+		the urls the manager is responsible for: each url is logged as added when it's received,
+		and as removed once the worker it was sent to acknowledged it.
+
+	_seen: SeenSet
+		the urls received so far from any worker, kept in the SEEN_DIR directory under the log's.
+		The urls a worker discovers are filtered against it as they arrive, so a url is dispatched once for the whole cluster
+		and logged once. The urls handed back by a worker stopping, or taken back from a dead one, are not filtered.
+
+	_recovered: iterator
+		the urls logged by the previous run and not dispatched yet. They are moved into the buffer RECOVERY_BATCH_SIZE
+		at a time, whenever the urls waiting to be dispatched run low, so the whole backlog is never loaded at once.
 	"""
-	def __init__(self, initialData = None, registerPort = DEFAULT_REG_PORT, urlPort = DEFAULT_DATA_PORT, dbPort = DEFAULT_DB_PORT):
+	def __init__(self, initialData = None, registerPort = DEFAULT_REG_PORT, urlPort = DEFAULT_DATA_PORT, walDir = DEFAULT_WAL_DIR, \
+		metricsPort = DEFAULT_METRICS_PORT):
 		"""
 		Initialize the manager object.
+		Its metrics are served over HTTP on metricsPort, in the Prometheus text format, unless it's None.
+		The unvisited urls are logged under walDir, and the ones left by the previous run are crawled along with initialData.
 		"""
 		self._regPort = registerPort
 		self._urlPort = urlPort
 		self._workerInfo = {}
-		self._workerIDs = []
-		self._buffer = set() if initialData is None else initialData
+		self._evicted = {}
+		self._ring = HashRing()
+		self._owners = {}
+		self._robots = LRUCache(ROBOTS_CACHE_SIZE)
+		self._seen = SeenSet(directory = os.path.join(walDir, SEEN_DIR))
+		## the seeds crawled by a previous run are not crawled again.
+		self._buffer = set() if initialData is None else set(self._seen.filterNew(initialData))
 		self._lock = RLock()
 		self._stopEvent = Event()
+		self._dataEvent = Event()
 
 		## prepare logger
 		if(not os.path.exists("log")):
@@ -48,13 +120,10 @@ class CrawlerManager(object):
 		self._logger.addHandler(logging.FileHandler(os.path.abspath("log/manager.log")))
 		self._logger.setLevel(logging.WARNING)
 
-		## load unfinished urls from database
-		self._dbconn = MongoClient()
-		unvisited = self._dbconn.crawler.unvisited.find()
-		self._log(logging.INFO, "loading %d urls from database." % unvisited.count())
-		for record in unvisited:
-			self._buffer.add(record['url'])
-		self._dbconn.crawler.unvisited.drop()
+		## the unvisited urls of the previous run are read from the log as they are dispatched.
+		self._wal = WriteAheadLog(walDir)
+		self._recovered = self._wal.recover()
+		self._wal.add(self._buffer)
 
 		## initialize sockets.
 		self._context = zmq.Context()
@@ -63,6 +132,12 @@ class CrawlerManager(object):
 		self._dataPullSocket = self._context.socket(zmq.PULL)
 		self._dataPullSocket.bind("tcp://*:%d" % self._urlPort)
 
+		## the buffer and the workers are only measured when the metrics are scraped.
+		metrics.gauge("manager_buffer_urls", "Urls waiting to be dispatched.").setFunction(lambda: len(self._buffer))
+		metrics.gauge("manager_workers", "Registered workers.").setFunction(lambda: len(self._workerInfo))
+		metrics.gauge("manager_seen_urls", "Distinct urls received from the workers.").setFunction(lambda: len(self._seen))
+		self._metricsServer = metrics.MetricsServer(metricsPort) if metricsPort is not None else None
+
 	def _log(self, level, msg):
 		"""
 		Log a message.
@@ -77,10 +152,12 @@ class CrawlerManager(object):
 
 	def start(self):
 		"""
-		Starts the three threads: 
+		Starts the four threads: 
 		- listening connection requests 
 		- receiving data and store it to the buffer.
 		- partition data and deliverying it to the responding worker.
+		- evicting the workers which stopped sending heartbeats.
+		and the metrics server, if any.
 		"""
 		connAcceptor = Thread(target = self._acceptConnections)
 		connAcceptor.daemon = True
@@ -91,94 +168,303 @@ class CrawlerManager(object):
 		self._dataDistributor = Thread(target = self._distributeData)
 		self._dataDistributor.daemon = True
 		self._dataDistributor.start()
+		self._failureDetector = Thread(target = self._detectFailures)
+		self._failureDetector.daemon = True
+		self._failureDetector.start()
+		self._wal.start()
+		if(self._metricsServer is not None):
+			self._metricsServer.start()
 
 	def stop(self):
+		"""
+		Stop the manager. The urls not acknowledged by the workers are in the log already, nothing else needs saving.
+		"""
 		self._stopEvent.set()
-		self._log(logging.INFO, "saving %d unvisited urls into database ..." % len(self._buffer))
+		self._dataEvent.set()
 		self._lock.acquire()
-		self._dbconn.crawler.unvisited.insert([{'url':url} for url in self._buffer])
-		self._lock.release()
+		try:
+			self._wal.close()
+			self._seen.close()
+		finally:
+			self._lock.release()
+		if(self._metricsServer is not None):
+			self._metricsServer.stop()
 
 	def _acceptConnections(self):
 		"""
 		Keeps listening to _regPort. 
 		On each arrival connection request, accepts and replies with the port number on which manager expects data.
+		A REG request may carry the weight of the worker after its port, 1 by default.
+		A worker registering again under the same ID, e.g. after a restart, is removed first, as if it had unregistered.
 		"""
 		while(not self._stopEvent.isSet()):
 			connectionReq = self._regSocket.recv()
-			req, host, port = connectionReq.split()
+			fields = connectionReq.split()
+			req, host, port = fields[:3]
 			self._log(logging.INFO, "Received %s request from %s which expects data on %s" % (req, host, port))
 			workerID = host + ":" + port
+			self._lock.acquire()
+			try:
+				self._evicted.pop(workerID, None)
+				if(self._workerInfo.has_key(workerID)):
+					self._removeWorker(workerID)
+				if(req.upper() == "REG"):
+					self._addWorker(workerID, host, port, float(fields[3]) if len(fields) > 3 else 1)
+			finally:
+				self._lock.release()
 			if(req.upper() == "REG"):
-				self._workerIDs.append(workerID)
-				self._workerInfo[workerID] = {}
-				dataPushSocket = self._context.socket(zmq.PUSH)
-				dataPushSocket.connect("tcp://%s:%s" % (host, port))
-				self._workerInfo[workerID]["socket"] = dataPushSocket
-				self._workerInfo[workerID]["assigned_sites"] = set()
-				self._workerInfo[workerID]["url_to_crawl"] = set()
 				self._log(logging.INFO, "sending port number [%d] to %s" % (self._urlPort, workerID))
 				self._regSocket.send("REG_RESPONSE %d" % self._urlPort)
-			else: ## UNREG
-				self._workerIDs.remove(workerID)
-				if(self._workerInfo.has_key(workerID)):
-					workerinfo = self._workerInfo.pop(workerID)
-					workerinfo["socket"].close()
+			else:
 				self._regSocket.send("UNREG_RESPONSE success")
 
+	def _addWorker(self, workerID, host, port, weight, sent = 0):
+		"""
+		Add a worker to the ring, expecting data on host:port, which has already received sent urls.
+		"""
+		self._workerInfo[workerID] = {}
+		dataPushSocket = self._context.socket(zmq.PUSH)
+		dataPushSocket.connect("tcp://%s:%s" % (host, port))
+		self._workerInfo[workerID]["socket"] = dataPushSocket
+		self._workerInfo[workerID]["weight"] = weight
+		self._workerInfo[workerID]["assigned_sites"] = set()
+		self._workerInfo[workerID]["url_to_crawl"] = Batcher(lambda urls, workerID = workerID: self._sendURLs(workerID, urls), \
+			minSize = MIN_MSG_DATA)
+		self._workerInfo[workerID]["backlog"] = set()
+		self._workerInfo[workerID]["sent"] = sent
+		self._workerInfo[workerID]["unacked"] = deque()
+		self._workerInfo[workerID]["credit"] = sent + INITIAL_CREDIT
+		self._workerInfo[workerID]["fetch_rate"] = 0.0
+		self._workerInfo[workerID]["frontier_size"] = 0
+		self._workerInfo[workerID]["page_queue_size"] = 0
+		self._workerInfo[workerID]["robots_sent"] = set()
+		BACKLOG.labels(workerID).setFunction(lambda backlog = self._workerInfo[workerID]["backlog"]: len(backlog))
+		self._workerInfo[workerID]["last_update_time"] = time.time()
+		self._ring.add(workerID, weight)
+		self._rebalance()
+
+	def _rebalance(self):
+		"""
+		Hand each site over to the worker the ring now maps it to, after a worker joined or left.
+		Only the sites on the arcs gained or lost by that worker change hands.
+		The urls held back for the workers are dispatched again, as some of their sites may have moved.
+		"""
+		for workerinfo in self._workerInfo.itervalues():
+			self._buffer.update(workerinfo["backlog"])
+			workerinfo["backlog"].clear()
+		for site, owner in self._owners.items():
+			newOwner = self._ring.get(site)
+			if(newOwner == owner):
+				continue
+			if(self._workerInfo.has_key(owner)):
+				self._workerInfo[owner]["assigned_sites"].discard(site)
+			if(newOwner is None):
+				del self._owners[site]
+			else:
+				self._owners[site] = newOwner
+				self._workerInfo[newOwner]["assigned_sites"].add(site)
+
+	def _removeWorker(self, workerID):
+		"""
+		Remove a worker which left or died: its sites are handed over to the other workers, 
+		and so are the urls it was not sent yet or did not acknowledge.
+		"""
+		self._ring.remove(workerID)
+		for metric in (DISPATCHED, BACKLOG, FETCH_RATE):
+			metric.remove(workerID)
+		if(self._workerInfo.has_key(workerID)):
+			workerinfo = self._workerInfo.pop(workerID)
+			workerinfo["socket"].close()
+			self._takeBack(workerinfo)
+		self._rebalance()
+
+	def _takeBack(self, workerinfo):
+		"""
+		Put the urls not sent yet to a worker, or not acknowledged by it, back into the buffer.
+		"""
+		self._buffer.update(workerinfo["backlog"])
+		workerinfo["backlog"].clear()
+		self._buffer.update(workerinfo["url_to_crawl"].drain())
+		for sent, urls in workerinfo["unacked"]:
+			self._buffer.update(urls)
+		workerinfo["unacked"].clear()
+
 	def _recvData(self):
 		"""
 		Keeps listening to urlPort.
 		Process each arrival data report and dispatch jobs if necessary, 
 		e.g. when getting enough data for dispatching a job to some worker.
+		Workers send the urls they discover, their heartbeats and the robots.txt they fetch on this port.
+		The urls discovered are filtered against the urls seen by the cluster a batch at a time, before the lock is taken,
+		while the urls handed back by a stopping worker are taken as they are.
 		"""
 		while(not self._stopEvent.isSet()):
-			data = self._dataPullSocket.recv_pyobj()
-			self._log(logging.INFO, "received %d urls" % len(data))			
+			try:
+				msgType, payload = wire.decode(self._dataPullSocket.recv())
+				if(msgType in (wire.URLS, wire.RETURN)):
+					data = list(wire.iterURLs(payload))
+				elif(msgType == wire.HEARTBEAT):
+					heartbeat = wire.decodeHeartbeat(payload)
+				elif(msgType == wire.ROBOTS):
+					records = wire.decodeRobots(payload)
+				else:
+					raise wire.WireError("unexpected message type %d" % msgType)
+			except wire.WireError as e:
+				self._log(logging.ERROR, "dropping an undecodable message: %s" % e)
+				continue
+			if(msgType == wire.URLS):
+				received = len(data)
+				data = self._seen.filterNew(data)
+				RECEIVED.inc(received)
+				DUPLICATES.inc(received - len(data))
+
 			self._lock.acquire()
-			self._buffer.update(data)
+			if(self._stopEvent.isSet()):
+				## the log is closed.
+				self._lock.release()
+				break
+			if(msgType in (wire.URLS, wire.RETURN)):
+				self._log(logging.INFO, "received %d new urls" % len(data))
+				self._wal.add(data)
+				self._buffer.update(data)
+			elif(msgType == wire.HEARTBEAT):
+				self._updateWorker(heartbeat)
+			else:
+				self._storeRobots(records)
 			self._lock.release()
+			self._dataEvent.set()
+
+	def _updateWorker(self, heartbeat):
+		"""
+		Record the state a worker advertised in a heartbeat, and forget the batches it acknowledged.
+		A worker evicted for missing heartbeats is admitted again, counting the urls it received before as sent.
+		"""
+		workerID = heartbeat["worker"]
+		if(self._evicted.has_key(workerID)):
+			self._log(logging.WARNING, "heartbeat from evicted worker %s, admitting it again" % workerID)
+			host, port = workerID.rsplit(":", 1)
+			self._addWorker(workerID, host, port, self._evicted.pop(workerID), heartbeat["received"])
+		if(not self._workerInfo.has_key(workerID)):
+			self._log(logging.WARNING, "heartbeat from unknown worker %s" % workerID)
+			return
+		workerinfo = self._workerInfo[workerID]
+		workerinfo["last_update_time"] = time.time()
+		workerinfo["credit"] = heartbeat["credit"]
+		workerinfo["fetch_rate"] = heartbeat["fetch_rate"]
+		FETCH_RATE.labels(workerID).set(heartbeat["fetch_rate"])
+		workerinfo["frontier_size"] = heartbeat["frontier"]
+		workerinfo["page_queue_size"] = heartbeat["pages"]
+		unacked = workerinfo["unacked"]
+		while(unacked and unacked[0][0] <= heartbeat["received"]):
+			self._wal.remove(unacked.popleft()[1])
+
+	def _storeRobots(self, records):
+		"""
+		Keep the robots.txt a worker fetched. The worker crawling the host, i.e. the one which fetched it, needn't be sent it.
+		"""
+		for host, expires, body in records:
+			self._robots.put(host, (expires, body))
+			owner = self._owners.get(urlparse("//" + host).hostname)
+			if(self._workerInfo.has_key(owner)):
+				self._workerInfo[owner]["robots_sent"].add(host)
+
+	def _detectFailures(self):
+		"""
+		Keep evicting the workers which sent no heartbeat for HEARTBEAT_TIMEOUT seconds.
+		"""
+		while(not self._stopEvent.wait(FAILURE_CHECK_INTERVAL)):
+			self._lock.acquire()
+			try:
+				now = time.time()
+				for workerID, workerinfo in self._workerInfo.items():
+					if(now - workerinfo["last_update_time"] > HEARTBEAT_TIMEOUT):
+						self._log(logging.WARNING, "no heartbeat from %s for %d seconds, evicting it" % (workerID, HEARTBEAT_TIMEOUT))
+						self._evicted[workerID] = workerinfo["weight"]
+						self._removeWorker(workerID)
+			finally:
+				self._lock.release()
+			self._dataEvent.set()
 
 	def _distributeData(self):
 		"""
 		Process data (a set of data) received from worker workers.
+		Each url is held in the backlog of the worker responsible for its site. As long as the worker has credit left,
+		urls move on to its batch, which is sent once it's full or old enough.
+		The loop waits for new urls or credits when there is nothing else to do.
 		"""
-		## TO DO: 
-		## 1. workerdataSet.put(data)
-		## 2. only if the workerdataSet is filled with enough data, send out to the responding worker worker.
 		while(not self._stopEvent.isSet()):
-			if(len(self._buffer) == 0 or len(self._workerInfo) == 0):
-				time.sleep(2)
+			if(len(self._workerInfo) == 0):
+				time.sleep(IDLE_WAIT_TIME)
 				continue
 
+			self._dataEvent.clear()
 			self._lock.acquire()
-			while(not self._stopEvent.isSet() and len(self._buffer) > 0):
-				url = self._buffer.pop()
-				site = urlparse(url).hostname
-				targetworker = self._matchWorker(site)
-				self._workerInfo[targetworker]["assigned_sites"].add(site)
-				targetSet = self._workerInfo[targetworker]["url_to_crawl"]
-				targetSet.add(url)
-				if(len(targetSet) >= MIN_MSG_DATA):
-					targetSocket = self._workerInfo[targetworker]["socket"]
-					targetSocket.send_pyobj(targetSet)
-					self._log(logging.INFO, "sending to %s: %s" % (targetworker, targetSet))
-					self._workerInfo[targetworker]["assigned_sites"].update(targetSet)
-					targetSet.clear()
-			self._lock.release()
+			try:
+				self._recover()
+				while(not self._stopEvent.isSet() and len(self._buffer) > 0 and len(self._workerInfo) > 0):
+					url = self._buffer.pop()
+					site = urlparse(url).hostname
+					targetworker = self._matchWorker(site)
+					self._workerInfo[targetworker]["backlog"].add(url)
+				timeout = IDLE_WAIT_TIME
+				for workerinfo in self._workerInfo.itervalues():
+					batch, backlog = workerinfo["url_to_crawl"], workerinfo["backlog"]
+					grant = workerinfo["credit"] - workerinfo["sent"] - len(batch)
+					while(grant > 0 and backlog):
+						batch.add(backlog.pop())
+						grant -= 1
+					batch.poll()
+					timeout = batch.pollTimeout(timeout)
+			finally:
+				self._lock.release()
+			self._dataEvent.wait(timeout)
+
+	def _recover(self):
+		"""
+		Move the next RECOVERY_BATCH_SIZE urls left by the previous run into the buffer, 
+		if fewer than that are waiting to be dispatched.
+		"""
+		if(self._recovered is None):
+			return
+		waiting = len(self._buffer) + sum(len(workerinfo["backlog"]) for workerinfo in self._workerInfo.itervalues())
+		if(waiting >= RECOVERY_BATCH_SIZE):
+			return
+		batch = list(islice(self._recovered, RECOVERY_BATCH_SIZE))
+		if(len(batch) < RECOVERY_BATCH_SIZE):
+			self._recovered = None
+		self._buffer.update(batch)
+
+	def _sendURLs(self, workerID, urls):
+		"""
+		Send a batch of urls to a worker, preceded by the robots.txt of their hosts it doesn't have yet.
+		"""
+		robotsSent, records = self._workerInfo[workerID]["robots_sent"], []
+		now = time.time()
+		for host in set(urlparse(url).netloc for url in urls):
+			entry = self._robots.get(host)
+			if(host not in robotsSent and entry is not None and entry[0] > now):
+				records.append((host, entry[0], entry[1]))
+				robotsSent.add(host)
+		if(records):
+			self._workerInfo[workerID]["socket"].send(wire.encodeRobots(records))
+		self._workerInfo[workerID]["socket"].send(wire.encodeURLs(urls))
+		self._workerInfo[workerID]["sent"] += len(urls)
+		DISPATCHED.labels(workerID).inc(len(urls))
+		self._workerInfo[workerID]["unacked"].append((self._workerInfo[workerID]["sent"], urls))
+		self._log(logging.INFO, "sending to %s: %s" % (workerID, urls))
 
 	def _matchWorker(self, site):
 		"""
-		A fake method to decide to which worker the site should go.
+		Decide to which worker the site should go.
 		"""
 		## 1. check if anyone is already responsible for this site.
-		## 2. if nobody found in step 1, match the site to a target worker by hashing.
-		for worker, workerinfo in self._workerInfo.iteritems():
-			if(site in workerinfo["assigned_sites"]):
-				return worker
-
-		workerID = hash(site) % len(self._workerIDs)
-		return self._workerIDs[workerID]
+		## 2. if nobody found in step 1, match the site to a target worker by consistent hashing.
+		workerID = self._owners.get(site)
+		if(workerID is None):
+			workerID = self._ring.get(site)
+			self._owners[site] = workerID
+			self._workerInfo[workerID]["assigned_sites"].add(site)
+		return workerID
 
 # DEFAULT_SEEDS = "conf/seeds.cfg"
 
@@ -191,6 +477,10 @@ def parseCommandLineArgs():
 	                  help="port on which connection requests are expected.")
 	parser.add_option("-d", "--urlPort", dest="urlPort", default=DEFAULT_DATA_PORT,
 	                  help="port on which urls are sent to workers.")
+	parser.add_option("-x", "--metrics", dest="metricsPort", default=DEFAULT_METRICS_PORT,
+	                  help="port on which metrics are served for Prometheus.")
+	parser.add_option("-w", "--wal", dest="walDir", default=DEFAULT_WAL_DIR,
+	                  help="the directory in which the unvisited urls are logged, ./wal by default.")
 
 	(options, args) = parser.parse_args()
 	seeds = set()
@@ -200,11 +490,11 @@ def parseCommandLineArgs():
 			seeds.add(line.strip())
 		f.close()
 
-	return seeds, int(options.regPort), int(options.urlPort)
+	return seeds, int(options.regPort), int(options.urlPort), int(options.metricsPort), options.walDir
 
 def main():
-	seeds, regPort, urlPort  = parseCommandLineArgs()
-	manager = CrawlerManager(seeds, regPort, urlPort)
+	seeds, regPort, urlPort, metricsPort, walDir = parseCommandLineArgs()
+	manager = CrawlerManager(seeds, regPort, urlPort, walDir, metricsPort = metricsPort)
 	manager.start()
 	raw_input("press any key to stop....\n")
 	manager.stop()
@@ -1,7 +1,8 @@
 #!/usr/bin/python
 import sys
 from optparse import OptionParser
-from core.engine import Engine, MAX_URL_QSIZE, DEFAULT_REG_PORT, DEFAULT_MANAGER, DEFAULT_DOWNLOADERS
+from core.engine import Engine, MAX_URL_QSIZE, DEFAULT_REG_PORT, DEFAULT_MANAGER, DEFAULT_DOWNLOADERS, DEFAULT_PARSERS, THREADED_DOWNLOAD, ASYNC_DOWNLOAD, \
+	TREE_PARSE, STREAM_PARSE
 
 def parseCommandLineArgs():
 	parser = OptionParser()
@@ -11,13 +12,36 @@ def parseCommandLineArgs():
 	                  help="port to connect manager.")
 	parser.add_option("-d", "--download", dest="downloaders", default=DEFAULT_DOWNLOADERS,
 	                  help="number of threads which download web pages. 4 by default.")
+	parser.add_option("-a", "--async", dest="async", action="store_true", default=False,
+	                  help="download web pages on a single event loop, -d is then the number of concurrent downloads.")
+	parser.add_option("-r", "--parsers", dest="parsers", default=DEFAULT_PARSERS,
+	                  help="number of processes which extract links from web pages. 0 by default, i.e. parse in the parser thread.")
+	parser.add_option("-s", "--stream", dest="stream", action="store_true", default=False,
+	                  help="extract links with a streaming tokenizer instead of building a BeautifulSoup tree.")
+	parser.add_option("-o", "--output", dest="storePath", default=None,
+	                  help="the file in which web pages are stored instead of the database on the manager host.")
+	parser.add_option("-z", "--compress", dest="pageCodec", default=None, choices=["zlib", "zstd"],
+	                  help="store each distinct page content once, compressed with zlib or zstd.")
+	parser.add_option("-x", "--metrics", dest="metricsPort", default=None,
+	                  help="port on which metrics are served for Prometheus, not served by default.")
+	parser.add_option("-c", "--checkpoint", dest="checkpointDir", default=None,
+	                  help="the directory in which the crawl state is saved periodically and resumed from on restart.")
+	parser.add_option("-R", "--revisit", dest="revisitInterval", default=None,
+	                  help="revisit the pages downloaded, first after REVISITINTERVAL seconds, then as often as they change.")
 	(options, args) = parser.parse_args()
 
-	return options.manager, int(options.regPort), int(options.downloaders)
+	downloadEngine = ASYNC_DOWNLOAD if options.async else THREADED_DOWNLOAD
+	parseMode = STREAM_PARSE if options.stream else TREE_PARSE
+	return options.manager, int(options.regPort), int(options.downloaders), downloadEngine, int(options.parsers), parseMode, \
+		options.storePath, options.pageCodec, int(options.metricsPort) if options.metricsPort is not None else None, \
+		options.checkpointDir, float(options.revisitInterval) if options.revisitInterval is not None else None
 
 def main():
-	manager, port, downloaders  = parseCommandLineArgs()
-	engine = Engine(downloaders, manager, port)
+	manager, port, downloaders, downloadEngine, parsers, parseMode, storePath, pageCodec, metricsPort, checkpointDir, \
+		revisitInterval = parseCommandLineArgs()
+	engine = Engine(downloaders, manager, port, downloadEngine = downloadEngine, nParser = parsers, parseMode = parseMode, \
+		storePath = storePath, pageCodec = pageCodec, metricsPort = metricsPort, checkpointDir = checkpointDir, \
+		revisitInterval = revisitInterval)
 	engine.start()
 	raw_input("press any key to stop....\n")
 	engine.stop()
@@ -0,0 +1,146 @@
+from threading import Lock
+from time import time
+
+DEFAULT_MIN_SIZE = 20
+DEFAULT_MAX_SIZE = 2000
+DEFAULT_MAX_BYTES = 256 * 1024
+DEFAULT_MAX_DELAY = 1.0
+DEFAULT_TARGET_DELAY = 0.2
+RATE_SMOOTHING = 0.2
+
+class Batcher(object):
+	"""
+	A Batcher collects items into a set and hands the set to sendFunc as one batch when it's big enough or old enough:
+		- it holds targetSize items, or maxBytes bytes of them,
+		- or its first item was added maxDelay seconds ago, so slow streams are not held back.
+	targetSize adapts to the throughput: it's the number of items expected to arrive within targetDelay seconds,
+	bounded by minSize and maxSize. Under load batches grow and fewer messages are sent; when the traffic is light,
+	batches stay small and go out within maxDelay.
+
+	The time limit is only checked by poll(), the owner should call it at least every pollTimeout() seconds.
+	All the methods are thread safe, sendFunc is called with the lock held so batches are sent one at a time.
+
+	Data members:
+	_items: set
+		the items of the batch being filled.
+
+	_rate: float
+		the smoothed number of items added per second, measured from batch to batch.
+	"""
+	def __init__(self, sendFunc, minSize = DEFAULT_MIN_SIZE, maxSize = DEFAULT_MAX_SIZE, maxBytes = DEFAULT_MAX_BYTES, \
+		maxDelay = DEFAULT_MAX_DELAY, targetDelay = DEFAULT_TARGET_DELAY):
+		"""
+		Initialize a Batcher.
+		---------  Param --------
+		sendFunc: func(set)
+			the function sending out a batch, given as a set of items.
+		minSize, maxSize: (int)
+			the bounds of the number of items which triggers sending.
+		maxBytes: (int)
+			the total length of the items which triggers sending.
+		maxDelay: (float)
+			the longest time, in seconds, an item waits in a batch.
+		targetDelay: (float)
+			the time, in seconds, a batch is expected to take to fill up under load.
+
+		---------  Return --------
+		None.
+		"""
+		self._sendFunc = sendFunc
+		self._minSize = max(minSize, 1)
+		self._maxSize = max(maxSize, self._minSize)
+		self._maxBytes = maxBytes
+		self._maxDelay = maxDelay
+		self._targetDelay = targetDelay
+		self._targetSize = self._minSize
+		self._rate = 0.0
+		self._items = set()
+		self._bytes = 0
+		self._firstTime = None
+		self._lastFlush = time()
+		self._lock = Lock()
+
+	def __len__(self):
+		return len(self._items)
+
+	def targetSize(self):
+		"""
+		Return the number of items which currently triggers sending.
+		"""
+		return self._targetSize
+
+	def add(self, item):
+		"""
+		Add an item to the batch, sending the batch if it's full.
+		"""
+		self._lock.acquire()
+		try:
+			if(item in self._items):
+				return
+			if(self._firstTime is None):
+				self._firstTime = time()
+			self._items.add(item)
+			self._bytes += len(item)
+			if(len(self._items) >= self._targetSize or self._bytes >= self._maxBytes):
+				self._flush()
+		finally:
+			self._lock.release()
+
+	def poll(self):
+		"""
+		Send the batch if its first item has waited maxDelay seconds.
+		"""
+		self._lock.acquire()
+		try:
+			if(self._firstTime is not None and time() - self._firstTime >= self._maxDelay):
+				self._flush()
+		finally:
+			self._lock.release()
+
+	def pollTimeout(self, longest):
+		"""
+		Return how long, at most longest seconds, the owner may wait before calling poll().
+		"""
+		if(self._firstTime is None):
+			return longest
+		return max(min(longest, self._firstTime + self._maxDelay - time()), 0)
+
+	def flush(self):
+		"""
+		Send the batch right away, whatever its size, e.g. on shutdown.
+		"""
+		self._lock.acquire()
+		try:
+			self._flush()
+		finally:
+			self._lock.release()
+
+	def drain(self):
+		"""
+		Return the items of the batch without sending them, and empty it.
+		"""
+		self._lock.acquire()
+		try:
+			items = list(self._items)
+			self._reset()
+			return items
+		finally:
+			self._lock.release()
+
+	def _flush(self):
+		if(not self._items):
+			return
+		now = time()
+		rate = len(self._items) / max(now - self._lastFlush, 1e-3)
+		self._rate = rate if self._rate == 0 else (1 - RATE_SMOOTHING) * self._rate + RATE_SMOOTHING * rate
+		self._targetSize = int(min(max(self._rate * self._targetDelay, self._minSize), self._maxSize))
+		self._lastFlush = now
+		try:
+			self._sendFunc(self._items)
+		finally:
+			self._reset()
+
+	def _reset(self):
+		self._items = set()
+		self._bytes = 0
+		self._firstTime = None
@@ -0,0 +1,202 @@
+from math import log, exp, ceil
+import hashlib
+import struct
+
+DEFAULT_CAPACITY = 1000000
+DEFAULT_ERROR_RATE = 0.001
+GROWTH_FACTOR = 2
+TIGHTENING_RATIO = 0.5
+
+## capacity, error rate, number of bits, number of hashes, count, followed by the bit array.
+_HEADER = struct.Struct(">QdQIQ")
+_STAGES = struct.Struct(">I")
+
+def _hashPair(item):
+	"""
+	Return two independent 64-bit hashes of item, from which the k probe positions are derived (Kirsch-Mitzenmacher).
+	"""
+	if(isinstance(item, unicode)):
+		item = item.encode("utf-8")
+	return struct.unpack("<QQ", hashlib.md5(item).digest())
+
+class BloomFilter(object):
+	"""
+	BloomFilter is a fixed-size probabilistic set. It never reports an added item as absent, 
+	but may report an absent item as present with a probability bounded by errorRate as long as 
+	no more than capacity items have been added.
+
+	Data members:
+	_bits: bytearray
+		the bit array, ceil(-capacity * ln(errorRate) / ln(2)^2) bits long.
+
+	_numHashes: int
+		the number of bits set for each item.
+
+	_count: int
+		the number of distinct items added so far.
+	"""
+	def __init__(self, capacity = DEFAULT_CAPACITY, errorRate = DEFAULT_ERROR_RATE):
+		"""
+		Initialize an empty filter sized for capacity items at errorRate.
+		"""
+		if(not 0 < errorRate < 1):
+			raise ValueError("errorRate must be between 0 and 1")
+		self._capacity = max(int(capacity), 1)
+		self._errorRate = errorRate
+		self._numBits = int(ceil(-self._capacity * log(errorRate) / (log(2) ** 2)))
+		self._numHashes = max(int(round(self._numBits * log(2) / self._capacity)), 1)
+		self._bits = bytearray((self._numBits + 7) // 8)
+		self._count = 0
+
+	def _positions(self, item):
+		h1, h2 = _hashPair(item)
+		m = self._numBits
+		return [(h1 + i * h2) % m for i in xrange(self._numHashes)]
+
+	def add(self, item):
+		"""
+		Add item to the filter. 
+		Return True if item was (probably) in the filter already, False otherwise.
+		"""
+		bits = self._bits
+		present = True
+		for pos in self._positions(item):
+			mask = 1 << (pos & 7)
+			if(not bits[pos >> 3] & mask):
+				present = False
+				bits[pos >> 3] |= mask
+		if(not present):
+			self._count += 1
+		return present
+
+	def __contains__(self, item):
+		bits = self._bits
+		for pos in self._positions(item):
+			if(not bits[pos >> 3] & (1 << (pos & 7))):
+				return False
+		return True
+
+	def __len__(self):
+		return self._count
+
+	def full(self):
+		"""
+		Return True if the filter holds as many items as it was sized for.
+		"""
+		return self._count >= self._capacity
+
+	def errorRate(self):
+		"""
+		Return the estimated probability that an absent item is reported as present, given the current fill.
+		"""
+		return (1 - exp(-float(self._numHashes) * self._count / self._numBits)) ** self._numHashes
+
+	def byteSize(self):
+		"""
+		Return the memory taken by the bit array in bytes.
+		"""
+		return len(self._bits)
+
+	def dumps(self):
+		"""
+		Return the filter as a string, which loads() turns back into the same filter.
+		"""
+		return _HEADER.pack(self._capacity, self._errorRate, self._numBits, self._numHashes, self._count) + str(self._bits)
+
+	@staticmethod
+	def loads(data, offset = 0):
+		"""
+		Return the filter dumped at offset in data, a string or any buffer such as an mmap, and the offset following it.
+		"""
+		try:
+			capacity, errorRate, numBits, numHashes, count = _HEADER.unpack_from(data, offset)
+		except struct.error:
+			raise ValueError("truncated Bloom filter")
+		offset += _HEADER.size
+		end = offset + (numBits + 7) // 8
+		if(end > len(data)):
+			raise ValueError("truncated Bloom filter")
+		bloom = BloomFilter.__new__(BloomFilter)
+		bloom._capacity, bloom._errorRate, bloom._numBits, bloom._numHashes, bloom._count = \
+			capacity, errorRate, numBits, numHashes, count
+		bloom._bits = bytearray(data[offset:end])
+		return bloom, end
+
+class ScalableBloomFilter(object):
+	"""
+	ScalableBloomFilter is a chain of BloomFilters which grows as items are added (Almeida et al. 2007).
+	Each time the newest filter is full, a new one GROWTH_FACTOR times as large and with an error rate 
+	TIGHTENING_RATIO times as small is appended, so the compound error rate stays below errorRate no matter how many items are added.
+	"""
+	def __init__(self, initialCapacity = DEFAULT_CAPACITY, errorRate = DEFAULT_ERROR_RATE):
+		"""
+		Initialize an empty filter whose first stage is sized for initialCapacity items.
+		"""
+		if(not 0 < errorRate < 1):
+			raise ValueError("errorRate must be between 0 and 1")
+		self._errorRate = errorRate
+		self._filters = [BloomFilter(initialCapacity, errorRate * (1 - TIGHTENING_RATIO))]
+
+	def add(self, item):
+		"""
+		Add item to the filter. 
+		Return True if item was (probably) in the filter already, False otherwise.
+		"""
+		for bloom in self._filters:
+			if(item in bloom):
+				return True
+		last = self._filters[-1]
+		if(last.full()):
+			last = BloomFilter(last._capacity * GROWTH_FACTOR, last._errorRate * TIGHTENING_RATIO)
+			self._filters.append(last)
+		return last.add(item)
+
+	def __contains__(self, item):
+		for bloom in self._filters:
+			if(item in bloom):
+				return True
+		return False
+
+	def __len__(self):
+		return sum(len(bloom) for bloom in self._filters)
+
+	def errorRate(self):
+		"""
+		Return the estimated probability that an absent item is reported as present, given the current fill.
+		"""
+		passRate = 1.0
+		for bloom in self._filters:
+			passRate *= 1 - bloom.errorRate()
+		return 1 - passRate
+
+	def byteSize(self):
+		"""
+		Return the memory taken by the bit arrays in bytes.
+		"""
+		return sum(bloom.byteSize() for bloom in self._filters)
+
+	def dumps(self):
+		"""
+		Return the filter as a string, which loads() turns back into the same filter.
+		"""
+		return _STAGES.pack(len(self._filters)) + "".join(bloom.dumps() for bloom in self._filters)
+
+	@staticmethod
+	def loads(data, offset = 0):
+		"""
+		Return the filter dumped at offset in data, a string or any buffer such as an mmap, and the offset following it.
+		"""
+		try:
+			(stages,) = _STAGES.unpack_from(data, offset)
+		except struct.error:
+			raise ValueError("truncated Bloom filter")
+		offset += _STAGES.size
+		scalable = ScalableBloomFilter.__new__(ScalableBloomFilter)
+		scalable._filters = []
+		for i in xrange(stages):
+			bloom, offset = BloomFilter.loads(data, offset)
+			scalable._filters.append(bloom)
+		if(not scalable._filters):
+			raise ValueError("Bloom filter without stages")
+		scalable._errorRate = scalable._filters[0]._errorRate / (1 - TIGHTENING_RATIO)
+		return scalable, offset
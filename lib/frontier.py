@@ -1,10 +1,20 @@
-from Queue import Queue, PriorityQueue, Empty, Full
+from Queue import Queue, Empty, Full
+from collections import deque
+from heapq import heappush, heappop, heapify
+from itertools import count
 from time import time
-from threading import Thread, RLock
+from threading import RLock, Condition
+from spillqueue import SpillQueue
+import metrics
 
 DEFAULT_Q_NUM = 10
 DEFAULT_MAX_SIZE = 1000
 DEFAULT_TIME_OUT = 2
+RERANK_INTERVAL = 1.0
+
+PUT_LATENCY = metrics.histogram("frontier_put_seconds", "Time taken to put an item into the frontier, filters included.")
+GET_LATENCY = metrics.histogram("frontier_get_seconds", "Time taken to get an item out of the frontier, waiting for it included.")
+FILTERED = metrics.counter("frontier_filtered_total", "Items put into the frontier and eliminated, by filter.", ["filter"])
 
 class Frontier(object):
 	"""
@@ -56,34 +66,72 @@ class Frontier(object):
                                     
 
 	Data members:
-	_frontQ: PeekableQ
+	_frontQ: PeekableQ | SpillQueue
 		a queue containing whatever is put in the frontier.
 
-	_backQ: list[ Queue ]
+	_backQ: list[ BackQ | SpillQueue | PriorityBackQ ]
 		a list of queues containing items to be extracted from the frontier.
+		They are PriorityBackQs, handing out the most important item first, if an item priority function is given.
+
+	_maxBackSize: int
+		the number of items the back queues may hold in total, None if they spill to disk. Items stay in the front queue,
+		which is bounded, while the back queues are full, so the frontier holds no more than twice its maxQSize items.
+
+	_freeQ: deque[ queue# ]
+		the numbers of the back queues which are currently empty, so that a new key can be given a back queue in O(1).
+
+	_normalizer: func(item)
+		a function which maps an item to its normal form before it's filtered, or to None if it should be disgarded.
+		DEFAUL: None, items are put as they are.
 
-	_filter: list[ func(item) ]
-		a list containing functions which tell whether a given item should be disgarded.
+	_filter: list[ (func(item), counter) ]
+		a list containing functions which tell whether a given item should be disgarded, 
+		each with the counter of the items it eliminated.
 		DEFAUL: empyt list. That is saying no item would be filtered, thus, this frontier is no different from Queue.PriorityQueue.
 
 	_keyFunc: func(item)
 		a function which returns a key for a given item. 
 		The key will be used by _map to locate the back queue in which to find/insert the item.
-		Also it will be used by _extractPrioritizer to determine from which back queue to extract an item.
+		Also it will be used by _backQselector to determine from which back queue to extract an item.
 		DEFAUL: item.__hash__() 		
 
 	_map: dict[ key(item) : queue# ]
 		a table mapping an item to the number of the back queue in which it's stored.
 
-	_backQselector: Queue.PriorityQueue(key(item))
-		a priority queue used to determine from which back queue an item should be extracted. For each node, i.e. key(item),
-		the key is determined by _extractPrioritizer.
+	_backQselector: list[ (readyTime, seq, key(item)) ] 
+		a binary min heap used to determine from which back queue an item should be extracted. 
+		Every key owning a non-empty back queue has exactly one entry in the heap (or in _readyQ), ordered by the earliest time 
+		the key may be served again (as returned by _priorityFunc) and then by insertion order.
 
 	_priorityFunc: func(key(item))
-		a function which returns the priority indicating how much an item should be extracted from the queue 
-		whose number is determined by key(item). The smaller returned value means the higher priority.
-		Every time get() is called on the frontier, an item is always extracted from the queue of the highest priority, 
-		i.e. _backQ[ { key(item) | Min(_priorityFunc(key(item))) } ] ???? NOT sure how to express it accurately.
+		a function which returns the earliest time an item of the given key may be extracted from the frontier.
+		The smaller returned value means the higher priority. A key is not served before its ready time has come, 
+		get() waits for it (or raises Empty if not blocking).
+
+	_itemPriorityFunc: func(item)
+		a function which returns the importance of an item, the higher the more important, or None. 
+		The importance may change while the item waits, e.g. as an url gathers cash: it's taken again for all the items 
+		of a back queue, and for all the ready keys, at most every _rerankInterval seconds.
+		DEFAUL: None, the items of a key are handed out in the order they were put.
+
+	_readyQ: list[ (-importance, readyTime, seq, key(item)) ]
+		a binary min heap of the keys whose ready time has come, moved there from the back queue selector
+		if there is an item priority function, so the ready key whose next item is the most important is served first.
+
+	_readyRanked: float
+		the last time the keys of _readyQ were ranked again by the importance of their next item.
+
+	_prefetcher: func(key(item))
+		a function called with a key when it's given a back queue, i.e. enters the back queue selector, 
+		so whatever serving the key takes can be prepared before the key reaches the root of the heap.
+		DEFAUL: None.
+
+	_busy: dict{ key(item): item }
+		the items handed out and not done yet, by key, for an exclusive frontier. Such a key keeps its back queue
+		but has no heap entry, so no other item of the key is handed out until done() is called.
+
+	_notEmpty: threading.Condition
+		the condition getters wait on until an item is put or the ready time of the heap root has come.
 	"""
 
 	def _defaultPriorityFunc(item):
@@ -92,135 +140,441 @@ class Frontier(object):
 		"""
 		return time()
 
-	def __init__(self, numOfQ =  DEFAULT_Q_NUM, maxQSize = DEFAULT_MAX_SIZE, keyFunc = hash, priorityFunc = _defaultPriorityFunc):
+	def __init__(self, numOfQ =  DEFAULT_Q_NUM, maxQSize = DEFAULT_MAX_SIZE, keyFunc = hash, priorityFunc = _defaultPriorityFunc, spillDir = None, \
+		exclusive = False, itemPriorityFunc = None, rerankInterval = RERANK_INTERVAL):
 		"""
 		Initialize the frontier.
+		The front queue holds at most maxQSize items, and so do the back queues in total.
+		If spillDir is given, the front queue and the back queues keep only their heads in memory (maxQSize items in total for 
+		the back queues, as many for the front queue) and spill the rest to segment files under spillDir, so put() never raises Full.
+		If exclusive is True, at most one item per key is out at a time: the consumer must call done(item) for each item it gets, 
+		and the key's ready time is only computed then.
+		If itemPriorityFunc is given, the items of a key are handed out the most important first, and among the keys whose 
+		ready time has come, the one whose next item is the most important is served first. Importance is taken again
+		every rerankInterval seconds.
 		"""
-		self._frontQ = PeekableQ(maxQSize)
-		self._backQ = []
 		numOfQ = numOfQ if numOfQ > 0 else DEFAULT_Q_NUM
-		for i in range(numOfQ):
-			self._backQ.append(Queue(maxQSize))
+		if(spillDir is None):
+			self._frontQ = PeekableQ(maxQSize)
+		else:
+			self._frontQ = SpillQueue(spillDir, maxQSize)
+		if(itemPriorityFunc is not None):
+			self._backQ = [PriorityBackQ(itemPriorityFunc, spillDir, max(maxQSize // numOfQ, 1), rerankInterval) \
+				for i in range(numOfQ)]
+		elif(spillDir is None):
+			self._backQ = [BackQ() for i in range(numOfQ)]
+		else:
+			self._backQ = [SpillQueue(spillDir, max(maxQSize // numOfQ, 1)) for i in range(numOfQ)]
+		self._freeQ = deque(range(numOfQ))
+		self._backSize = 0
+		self._maxBackSize = maxQSize if spillDir is None else None
 
+		self._normalizer = None
+		self._normalized = FILTERED.labels("normalizer")
 		self._filter = []
 		self._keyFunc = keyFunc
-		self._backQselector = PriorityQueue()
+		self._backQselector = []
+		self._seq = count()
 		self._priorityFunc = priorityFunc
+		self._itemPriorityFunc = itemPriorityFunc
+		self._readyQ = []
+		self._readyRanked = time()
+		self._rerankInterval = rerankInterval
 		self._map = {}
+		self._prefetcher = None
+		self._exclusive = exclusive
+		self._busy = {}
 		self._lock = RLock()
+		self._notEmpty = Condition(self._lock)
+
 
+	def setNormalizer(self, normalizeFunc):
+		"""
+		Register the function mapping every item put to its normal form, which is what gets filtered and stored.
+		A normalizer must take in an item and return its normal form, or None to indicate the item should be eliminated.
+		"""
+		self._normalizer = normalizeFunc
 
-	def addFilter(self, filterFunc):
+	def setPrefetcher(self, prefetchFunc):
+		"""
+		Register the function called with every key entering the back queue selector. 
+		It's called with the frontier locked, so it must not block, e.g. it queues the key for some background work.
+		"""
+		self._prefetcher = prefetchFunc
+
+	def addFilter(self, filterFunc, name = None):
 		"""
 		Register a filter function. 
 		A filter function must take in an item and returns a bool to indicate whether the item should be eliminated.
+		The items it eliminates are counted under name, the name of the function by default.
 		"""
-		self._filter.append(filterFunc)
+		self._filter.append((filterFunc, FILTERED.labels(name or filterFunc.__name__)))
 
 	def get(self, block=True, timeout=DEFAULT_TIME_OUT):
 		"""
 		Return an item whose key is of the highest priority.
+		If block is True, wait until such an item is ready or timeout seconds passed (forever if timeout is None). 
+		Raise Empty if no item is ready.
 		"""
 		# How fetcher interacts with back queue:
-		# Repeat: 
 		# 	(i) extract current root q of the heap (q is a back queue)
 		# 	(ii) fetch URL u at head of q ...
-		# until we empty the q we get. (i.e.: u was the last URL in q)
+		# 	(iii) if q is not empty yet, push it back into the heap with its next ready time.
 		
 		# When we have emptied a back queue q, Repeat:
 		# 	(i) pull URLs u from front queues and 
 		# 	(ii) add u to its corresponding back queue ...
 		# until we get a u whose host does not have a back queue.
 		# Then put u in q and create heap entry for it.
-		self._lock.acquire()
-		if(len(self._map) == 0):
-			self._transfer()
-
-		if(self._backQselector.empty()):
-			for(p, k) in self._map.iteritems():
-				self._backQselector.put(HeapNode(self._priorityFunc(p), p))
+		start = time()
+		deadline = None if timeout is None else start + timeout
+		self._notEmpty.acquire()
+		try:
+			while(True):
+				self._transfer()
+				key = self._nextKey()
+				if(key is not None):
+					item = self._extract(key)
+					GET_LATENCY.observe(time() - start)
+					return item
+				wait = self._backQselector[0][0] - time() if self._backQselector else None
+
+				if(not block):
+					raise Empty()
+				if(deadline is not None):
+					remaining = deadline - time()
+					if(remaining <= 0):
+						raise Empty()
+					wait = remaining if wait is None else min(wait, remaining)
+				self._notEmpty.wait(wait)
+		finally:
+			self._notEmpty.release()
+
+	def _nextKey(self):
+		"""
+		Pop and return the key to be served next, or None if no key is ready.
+		"""
+		now = time()
+		if(self._itemPriorityFunc is None):
+			if(self._backQselector and self._backQselector[0][0] <= now):
+				return heappop(self._backQselector)[2]
+			return None
+		if(self._readyQ and now >= self._readyRanked + self._rerankInterval):
+			self._readyQ = [(-self._backQ[self._map[key]].headPriority(), readyTime, seq, key) \
+				for importance, readyTime, seq, key in self._readyQ]
+			heapify(self._readyQ)
+			self._readyRanked = now
+		while(self._backQselector and self._backQselector[0][0] <= now):
+			readyTime, seq, key = heappop(self._backQselector)
+			heappush(self._readyQ, (-self._backQ[self._map[key]].headPriority(), readyTime, seq, key))
+		if(self._readyQ):
+			return heappop(self._readyQ)[3]
+		return None
 
-		if(self._backQselector.empty()):
-			self._lock.release()
-			raise Empty()
-		key = self._backQselector.get(block, timeout).getValue() ## may raise Empty 
-		que = self._backQ[self._map[key]]  
-		item = que.get(block, timeout)
-		if(que.empty()):
-			self._map.pop(self._keyFunc(item))
+	def put(self, item, block=True, timeout=0):
+		"""
+		Put an item, in its normal form, into the front Q iff the item is not eliminated by any of the registered functions.
+		"""
+		start = time()
+		try:
+			if(self._normalizer is not None):
+				item = self._normalizer(item)
+				if(item is None):
+					self._normalized.inc()
+					return
+			for filterFunc, filtered in self._filter:
+				if(filterFunc(item)):
+					filtered.inc()
+					return
+			self._frontQ.put(item, block, timeout)
+			self._notEmpty.acquire()
+			self._notEmpty.notify()
+			self._notEmpty.release()
+		finally:
+			PUT_LATENCY.observe(time() - start)
+
+	def _extract(self, key):
+		"""
+		Pop the head item of the back queue assigned to key, whose heap entry has just been removed.
+		"""
+		qID = self._map[key]
+		que = self._backQ[qID]
+		item = que.get()
+		self._backSize -= 1
+		if(self._exclusive):
+			self._busy[key] = item
+		elif(que.empty()):
+			self._map.pop(key)
+			self._freeQ.append(qID)
 			self._transfer()
-		self._lock.release()
+		else:
+			self._schedule(key)
 		return item
 
-	def put(self, item, block=True, timeout=0):
+	def done(self, item):
 		"""
-		Put an item into the front Q iff the item is not eliminated by any of the registered functions.
+		Tell an exclusive frontier that the consumer is done with an item it got, 
+		so the next item of the same key can be scheduled at the key's new ready time.
 		"""
-		for filterFunc in self._filter:
-			if(filterFunc(item)):
+		key = self._keyFunc(item)
+		self._notEmpty.acquire()
+		try:
+			if(key not in self._busy):
 				return
-		self._frontQ.put(item, block, timeout)
-
-	def _firstEmptyBackQ(self):
-		self._lock.acquire()
-		for i in range(len(self._backQ)):
-			if(self._backQ[i].empty()):
-				self._lock.release()
-				return i
-		self._lock.release()
-		return len(self._backQ)
+			del self._busy[key]
+			qID = self._map[key]
+			if(self._backQ[qID].empty()):
+				self._map.pop(key)
+				self._freeQ.append(qID)
+				self._transfer()
+			else:
+				self._schedule(key)
+			self._notEmpty.notify()
+		finally:
+			self._notEmpty.release()
+
+	def drain(self):
+		"""
+		Remove and return all the items of the frontier, regardless of their ready time.
+		"""
+		self._notEmpty.acquire()
+		try:
+			items = []
+			while(not self._frontQ.empty()):
+				items.append(self._frontQ.get())
+			for que in self._backQ:
+				while(not que.empty()):
+					items.append(que.get())
+			self._freeQ = deque(range(len(self._backQ)))
+			self._backSize = 0
+			self._backQselector = []
+			self._readyQ = []
+			self._map = {}
+			self._busy = {}
+			return items
+		finally:
+			self._notEmpty.release()
+
+	def items(self):
+		"""
+		Return all the items of the frontier, regardless of their ready time, without removing them, 
+		followed by the items of an exclusive frontier which are handed out and not done yet.
+		"""
+		self._notEmpty.acquire()
+		try:
+			items = self._frontQ.items()
+			for que in self._backQ:
+				items.extend(que.items())
+			items.extend(self._busy.itervalues())
+			return items
+		finally:
+			self._notEmpty.release()
+
+	def restore(self, items):
+		"""
+		Put items saved by items() back into the frontier as they are, i.e. neither normalized nor filtered again.
+		Return the number of items put, which falls short of len(items) if the frontier is bounded and gets full.
+		"""
+		restored = 0
+		for item in items:
+			try:
+				self._frontQ.put(item, False)
+			except Full:
+				break
+			restored += 1
+		self._notEmpty.acquire()
+		self._notEmpty.notifyAll()
+		self._notEmpty.release()
+		return restored
+
+	def _schedule(self, key):
+		"""
+		Create the heap entry for key.
+		"""
+		heappush(self._backQselector, (self._priorityFunc(key), next(self._seq), key))
 
 	def _transfer(self):
 		"""
-		Transfer items from front Q to back Q until the next item can not fit any back q or front Q is empty.
+		Transfer items from front Q to back Q until the next item can not fit any back q, the back queues are full 
+		or front Q is empty.
 		"""
 		self._lock.acquire()
-		while(not self._frontQ.empty()):
-			item = self._frontQ.peek()
-			key = self._keyFunc(item)
-			if(not self._map.has_key(key)):
-				qID = self._firstEmptyBackQ()	
-				if(qID == len(self._backQ)):
-					self._lock.release()
+		try:
+			while(not self._frontQ.empty()):
+				if(self._maxBackSize is not None and self._backSize >= self._maxBackSize):
 					return
-				self._map[key] = qID
-				self._backQselector.put(HeapNode(self._priorityFunc(key), key))
+				item = self._frontQ.peek()
+				key = self._keyFunc(item)
+				qID = self._map.get(key)
+				if(qID is None):
+					if(not self._freeQ):
+						return
+					qID = self._freeQ.popleft()
+					self._map[key] = qID
+					self._schedule(key)
+					if(self._prefetcher is not None):
+						self._prefetcher(key)
+
+				item = self._frontQ.get()
+				self._backSize += 1
+				self._backQ[qID].put(item)
+		finally:
+			self._lock.release()
 
-			que = self._backQ[self._map[key]]
-			que.put(self._frontQ.get())
-		self._lock.release()
+	def backQueues(self):
+		"""
+		Return the number of back queues in use, i.e. the number of keys in the back queue selector or busy.
+		"""
+		return len(self._map)
 
 	def size(self):
 		"""
 		Return the number of items in the Frontier.
 		"""
 		self._lock.acquire()
-		sz = self._frontQ.qsize()
-		for q in self._backQ:
-			sz += q.qsize()
+		sz = self._frontQ.qsize() + self._backSize
 		self._lock.release()
 		return sz
 
-class HeapNode(object):
+	def close(self):
+		"""
+		Release the spill files of the frontier, if any. The items left in the frontier are dropped.
+		"""
+		self._lock.acquire()
+		for que in [self._frontQ] + self._backQ:
+			if(isinstance(que, (SpillQueue, PriorityBackQ))):
+				que.close()
+		self._lock.release()
+
+class BackQ(object):
+	"""
+	BackQ is a FIFO queue holding the items of a single key. 
+	It does no locking on its own since all the back queues are only accessed under the lock of their frontier.
+	"""
+	def __init__(self):
+		self._Q = deque()
+
+	def get(self, block = False, timeout = DEFAULT_TIME_OUT):
+		"""
+		Pop and return the item at the front of the queue.
+		"""
+		try:
+			return self._Q.popleft()
+		except IndexError:
+			raise Empty()
+
+	def put(self, item, block = False, timeout = DEFAULT_TIME_OUT):
+		"""
+		Push an item into the queue from the back.
+		"""
+		self._Q.append(item)
+
+	def empty(self):
+		"""
+		Return True if the queue is empty, False otherwise.
+		"""
+		return not self._Q
+
+	def items(self):
+		"""
+		Return the items in the queue, the front one first, without popping them.
+		"""
+		return list(self._Q)
+
+	def qsize(self):
+		"""
+		Return the number of items in the queue.
+		"""
+		return len(self._Q)
+
+class PriorityBackQ(object):
 	"""
-	HeapNode is a simple data structure which can be used in a priority queue. 
-	It has a priorty and an associated value. The priority is the key which will be used for sorting.
+	PriorityBackQ holds the items of a single key, the most important first, as told by priorityFunc(item) 
+	when the item is put. Items of the same importance are handed out in the order they were put.
+	As the importance of an item may grow while it waits, all the items ranked are ranked again by their current importance
+	when they were last ranked more than rerankInterval seconds ago.
+	If spillDir is given, only memSize items are ranked in memory, the others wait in a SpillQueue in the order they 
+	were put, and are ranked as room is made for them.
+	Like BackQ, it does no locking on its own.
 	"""
-	def __init__(self, priority, value):
-		self._priority = priority
-		self._value = value
+	def __init__(self, priorityFunc, spillDir = None, memSize = DEFAULT_MAX_SIZE, rerankInterval = RERANK_INTERVAL):
+		self._heap = []
+		self._seq = count()
+		self._priorityFunc = priorityFunc
+		self._rerankInterval = rerankInterval
+		self._ranked = time()
+		self._memSize = max(memSize, 1)
+		self._overflow = SpillQueue(spillDir, self._memSize) if spillDir is not None else None
+
+	def _push(self, item):
+		heappush(self._heap, (-self._priorityFunc(item), next(self._seq), item))
+
+	def _rerank(self):
+		"""
+		Rank the items again by their current importance if they were last ranked more than rerankInterval seconds ago.
+		"""
+		now = time()
+		if(now < self._ranked + self._rerankInterval):
+			return
+		self._heap = [(-self._priorityFunc(item), seq, item) for importance, seq, item in self._heap]
+		heapify(self._heap)
+		self._ranked = now
+
+	def get(self, block = False, timeout = DEFAULT_TIME_OUT):
+		"""
+		Pop and return the most important item of the queue.
+		"""
+		if(not self._heap):
+			raise Empty()
+		self._rerank()
+		item = heappop(self._heap)[2]
+		while(self._overflow is not None and len(self._heap) < self._memSize and not self._overflow.empty()):
+			self._push(self._overflow.get())
+		return item
+
+	def put(self, item, block = False, timeout = DEFAULT_TIME_OUT):
+		"""
+		Push an item into the queue.
+		"""
+		if(self._overflow is not None and (len(self._heap) >= self._memSize or not self._overflow.empty())):
+			self._overflow.put(item)
+		else:
+			self._push(item)
+
+	def headPriority(self):
+		"""
+		Return the importance of the item get() would return, 0 if the queue is empty.
+		"""
+		self._rerank()
+		return -self._heap[0][0] if self._heap else 0
 
-	def getValue(self):
-		return self._value
+	def empty(self):
+		"""
+		Return True if the queue is empty, False otherwise.
+		"""
+		return not self._heap
 
-	def __lt__(self, other):
-		return self._priority < other._priority
+	def items(self):
+		"""
+		Return the items in the queue, the most important first, without popping them.
+		"""
+		items = [entry[2] for entry in sorted(self._heap)]
+		if(self._overflow is not None):
+			items.extend(self._overflow.items())
+		return items
 
-	def __eq__(selt, other):
-		return self._priority == other._priority 
+	def qsize(self):
+		"""
+		Return the number of items in the queue.
+		"""
+		return len(self._heap) + (self._overflow.qsize() if self._overflow is not None else 0)
 
-	def __str__(self):
-		return "Priority = %d, %s" % (self._priority, self._value)
+	def close(self):
+		"""
+		Release the spill files of the queue, if any.
+		"""
+		if(self._overflow is not None):
+			self._overflow.close()
 
 class PeekableQ(object):
 	"""
@@ -278,6 +632,19 @@ class PeekableQ(object):
 		Return True if the queue is full, False otherwise.
 		"""
 		return self.qsize() >= self._capacity
+
+	def items(self):
+		"""
+		Return the items in the queue, the front one first, without popping them.
+		"""
+		self._lock.acquire()
+		try:
+			self._Q.mutex.acquire()
+			items = list(self._Q.queue)
+			self._Q.mutex.release()
+			return items if self._front is None else [self._front] + items
+		finally:
+			self._lock.release()
 		
 	def qsize(self):
 		"""
@@ -0,0 +1,90 @@
+from bisect import bisect_left, insort
+from hashlib import md5
+import struct
+
+DEFAULT_VNODES = 160
+
+def _hash(key):
+	"""
+	Return a 64-bit hash of key, stable across processes and runs (unlike hash()).
+	"""
+	if(isinstance(key, unicode)):
+		key = key.encode("utf-8")
+	elif(not isinstance(key, str)):
+		key = str(key)
+	return struct.unpack(">Q", md5(key).digest()[:8])[0]
+
+class HashRing(object):
+	"""
+	A HashRing maps keys to nodes by consistent hashing: every node owns a number of points (virtual nodes) on a ring of
+	64-bit hashes, and a key belongs to the node owning the first point at or after the hash of the key.
+	Adding or removing a node only moves the keys of the arcs it gains or loses, i.e. about 1/N of them,
+	and the virtual nodes spread those keys evenly over the other nodes.
+
+	Data members:
+	_points: list[ (hash, node) ]
+		the points of all the nodes, sorted by hash.
+
+	_hashes: list[ hash ]
+		the hashes of _points, kept apart so a lookup is a single bisect.
+
+	_weights: dict{ node: weight }
+		the nodes on the ring. A node owns about vnodes * weight points.
+	"""
+	def __init__(self, vnodes = DEFAULT_VNODES):
+		"""
+		Initialize an empty ring.
+		---------  Param --------
+		vnodes: (int)
+			the number of points of a node of weight 1.
+
+		---------  Return --------
+		None.
+		"""
+		self._vnodes = max(vnodes, 1)
+		self._points = []
+		self._hashes = []
+		self._weights = {}
+
+	def __len__(self):
+		return len(self._weights)
+
+	def __contains__(self, node):
+		return node in self._weights
+
+	def nodes(self):
+		"""
+		Return the nodes on the ring.
+		"""
+		return self._weights.keys()
+
+	def add(self, node, weight = 1):
+		"""
+		Add a node to the ring, or change its weight if it's already there.
+		"""
+		if(node in self._weights):
+			self.remove(node)
+		self._weights[node] = weight
+		for i in xrange(max(int(round(self._vnodes * weight)), 1)):
+			insort(self._points, (_hash("%s#%d" % (node, i)), node))
+		self._hashes = [point[0] for point in self._points]
+
+	def remove(self, node):
+		"""
+		Remove a node from the ring. Removing a node which is not there does nothing.
+		"""
+		if(self._weights.pop(node, None) is None):
+			return
+		self._points = [point for point in self._points if point[1] != node]
+		self._hashes = [point[0] for point in self._points]
+
+	def get(self, key):
+		"""
+		Return the node key belongs to, or None if the ring is empty.
+		"""
+		if(not self._points):
+			return None
+		i = bisect_left(self._hashes, _hash(key))
+		if(i == len(self._points)):
+			i = 0
+		return self._points[i][1]
@@ -0,0 +1,55 @@
+from collections import OrderedDict
+
+DEFAULT_CACHE_SIZE = 10000
+
+class LRUCache(object):
+	"""
+	LRUCache is a dict-like container holding at most maxSize items. 
+	When it's full, inserting a new key evicts the least recently used one.
+	It does no locking on its own, callers sharing it among threads are expected to serialize the access.
+	"""
+	def __init__(self, maxSize = DEFAULT_CACHE_SIZE):
+		self._dict = OrderedDict()
+		self._capacity = maxSize if maxSize > 0 else DEFAULT_CACHE_SIZE
+
+	def get(self, key, default = None):
+		"""
+		Return the value of key and mark it as the most recently used, or default if key is not cached.
+		"""
+		try:
+			value = self._dict.pop(key)
+		except KeyError:
+			return default
+		self._dict[key] = value
+		return value
+
+	def put(self, key, value = None):
+		"""
+		Insert or refresh key, evicting the least recently used item if the cache is full.
+		Return the evicted (key, value) pair, or None.
+		"""
+		evicted = None
+		if(key in self._dict):
+			self._dict.pop(key)
+		elif(len(self._dict) >= self._capacity):
+			evicted = self._dict.popitem(last = False)
+		self._dict[key] = value
+		return evicted
+
+	def pop(self, key, default = None):
+		"""
+		Remove key from the cache and return its value, or default if key is not cached.
+		"""
+		return self._dict.pop(key, default)
+
+	def items(self):
+		"""
+		Return the (key, value) pairs, the least recently used first, without marking any of them as used.
+		"""
+		return self._dict.items()
+
+	def __contains__(self, key):
+		return key in self._dict
+
+	def __len__(self):
+		return len(self._dict)
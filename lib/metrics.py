@@ -0,0 +1,366 @@
+"""
+Counters, gauges and histograms describing a running manager or worker, served in the Prometheus text format.
+
+Metrics are registered once, by name, usually at module level, and updated on the hot paths: an update is a lock and an
+addition, and nothing else is done until the metrics are scraped. Gauges which can be read off the crawler's own
+structures are given a function instead, which is only called when scraped.
+
+A metric may have labels, in which case it's updated through the child returned by labels(*values):
+
+	FETCHES = metrics.counter("fetches_total", "Downloads finished.", ["status"])
+	FETCHES.labels(200).inc()
+"""
+
+from threading import Thread, Lock
+from bisect import bisect_left
+import BaseHTTPServer
+import SocketServer
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+METRICS_PATH = "/metrics"
+
+def _escape(value):
+	return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def _format(value):
+	if(isinstance(value, (int, long))):
+		return str(value)
+	if(value == float("inf")):
+		return "+Inf"
+	if(value != value):
+		return "NaN"
+	if(isinstance(value, float) and value.is_integer()):
+		return "%d" % value
+	return repr(value)
+
+def quantile(q, cumulative):
+	"""
+	Estimate the q-quantile of the observations of a histogram from the cumulative counts of its buckets, 
+	a list of (upper bound, count) ending with +Inf, by interpolating within the bucket it falls in, as Prometheus does.
+	Return None if there is no observation.
+	"""
+	total = cumulative[-1][1]
+	if(total == 0):
+		return None
+	rank = q * total
+	lower, below = 0.0, 0
+	for bound, count in cumulative:
+		if(count >= rank):
+			if(bound == float("inf")):
+				return lower
+			return lower + (bound - lower) * (rank - below) / max(count - below, 1)
+		lower, below = bound, count
+
+class _CounterChild(object):
+	def __init__(self):
+		self._value = 0
+		self._lock = Lock()
+
+	def inc(self, amount = 1):
+		self._lock.acquire()
+		self._value += amount
+		self._lock.release()
+
+	def get(self):
+		return self._value
+
+	def samples(self):
+		yield "", (), self._value
+
+class _GaugeChild(_CounterChild):
+	def __init__(self):
+		super(_GaugeChild, self).__init__()
+		self._func = None
+
+	def dec(self, amount = 1):
+		self.inc(-amount)
+
+	def set(self, value):
+		self._value = value
+
+	def setFunction(self, func):
+		self._func = func
+
+	def get(self):
+		return self._value if self._func is None else self._func()
+
+	def samples(self):
+		try:
+			value = self.get()
+		except Exception:
+			## a scrape must not fail because of what a gauge function runs into.
+			value = float("nan")
+		yield "", (), value
+
+class _HistogramChild(object):
+	def __init__(self, buckets):
+		self._buckets = buckets
+		self._counts = [0] * (len(buckets) + 1)
+		self._sum = 0
+		self._lock = Lock()
+
+	def observe(self, value):
+		i = bisect_left(self._buckets, value)
+		self._lock.acquire()
+		self._counts[i] += 1
+		self._sum += value
+		self._lock.release()
+
+	def count(self):
+		return sum(self._counts)
+
+	def cumulative(self):
+		self._lock.acquire()
+		counts = list(self._counts)
+		self._lock.release()
+		result, total = [], 0
+		for bound, count in zip(self._buckets + (float("inf"),), counts):
+			total += count
+			result.append((bound, total))
+		return result
+
+	def quantile(self, q):
+		return quantile(q, self.cumulative())
+
+	def samples(self):
+		total = self._sum
+		for bound, count in self.cumulative():
+			yield "_bucket", (("le", _format(float(bound))),), count
+		yield "_sum", (), total
+		yield "_count", (), count
+
+class Metric(object):
+	"""
+	A named metric, made of one child per combination of label values.
+	The methods of the child without labels are available on the metric itself.
+
+	Data members:
+	_children: dict{ tuple(label values): child }
+		the children updated so far.
+	"""
+	kind = None
+
+	def __init__(self, name, documentation, labelNames = ()):
+		self.name = name
+		self.documentation = documentation
+		self.labelNames = tuple(labelNames)
+		self._children = {}
+		self._lock = Lock()
+
+	def labels(self, *values):
+		"""
+		Return the child of the given label values, creating it the first time.
+		"""
+		if(len(values) != len(self.labelNames)):
+			raise ValueError("%s expects %d label values, got %d" % (self.name, len(self.labelNames), len(values)))
+		values = tuple(str(value) for value in values)
+		child = self._children.get(values)
+		if(child is None):
+			self._lock.acquire()
+			child = self._children.setdefault(values, self._newChild())
+			self._lock.release()
+		return child
+
+	def children(self):
+		"""
+		Return the (label values, child) pairs of the metric.
+		"""
+		return self._children.items()
+
+	def remove(self, *values):
+		"""
+		Drop the child of the given label values, e.g. when what it describes is gone.
+		"""
+		self._lock.acquire()
+		self._children.pop(tuple(str(value) for value in values), None)
+		self._lock.release()
+
+	def _newChild(self):
+		raise NotImplementedError()
+
+	def render(self):
+		"""
+		Return the metric in the Prometheus text format.
+		"""
+		lines = ["# HELP %s %s" % (self.name, self.documentation.replace("\\", "\\\\").replace("\n", "\\n")), \
+			"# TYPE %s %s" % (self.name, self.kind)]
+		for values, child in sorted(self._children.items()):
+			for suffix, extra, value in child.samples():
+				labels = zip(self.labelNames, values) + list(extra)
+				labelText = "{%s}" % ",".join('%s="%s"' % (k, _escape(v)) for k, v in labels) if labels else ""
+				lines.append("%s%s%s %s" % (self.name, suffix, labelText, _format(value)))
+		return "\n".join(lines)
+
+class Counter(Metric):
+	"""
+	A Counter is a number which only goes up, e.g. the number of pages downloaded.
+	"""
+	kind = "counter"
+
+	def _newChild(self):
+		return _CounterChild()
+
+	def inc(self, amount = 1):
+		self.labels().inc(amount)
+
+	def get(self):
+		return self.labels().get()
+
+class Gauge(Metric):
+	"""
+	A Gauge is a number which goes up and down, e.g. the size of a queue.
+	"""
+	kind = "gauge"
+
+	def _newChild(self):
+		return _GaugeChild()
+
+	def inc(self, amount = 1):
+		self.labels().inc(amount)
+
+	def dec(self, amount = 1):
+		self.labels().dec(amount)
+
+	def set(self, value):
+		self.labels().set(value)
+
+	def setFunction(self, func):
+		"""
+		Have the gauge read by calling func when it's scraped, rather than set.
+		"""
+		self.labels().setFunction(func)
+
+	def get(self):
+		return self.labels().get()
+
+class Histogram(Metric):
+	"""
+	A Histogram counts observations, e.g. latencies, in buckets of the given upper bounds.
+	"""
+	kind = "histogram"
+
+	def __init__(self, name, documentation, labelNames = (), buckets = LATENCY_BUCKETS):
+		super(Histogram, self).__init__(name, documentation, labelNames)
+		self.buckets = tuple(sorted(buckets))
+
+	def _newChild(self):
+		return _HistogramChild(self.buckets)
+
+	def observe(self, value):
+		self.labels().observe(value)
+
+	def count(self):
+		return self.labels().count()
+
+	def cumulative(self):
+		"""
+		Return the cumulative counts of the buckets, a list of (upper bound, count) ending with +Inf.
+		"""
+		return self.labels().cumulative()
+
+	def quantile(self, q):
+		"""
+		Return an estimate of the q-quantile of the observations, None if there is none.
+		"""
+		return self.labels().quantile(q)
+
+class Registry(object):
+	"""
+	A Registry holds metrics by name. Registering a name again returns the metric registered first,
+	so a metric may be declared wherever it's used.
+	"""
+	def __init__(self):
+		self._metrics = {}
+		self._lock = Lock()
+
+	def _register(self, cls, name, *args, **kwargs):
+		self._lock.acquire()
+		try:
+			metric = self._metrics.get(name)
+			if(metric is None):
+				metric = self._metrics[name] = cls(name, *args, **kwargs)
+			elif(not isinstance(metric, cls)):
+				raise ValueError("%s is registered as a %s already" % (name, metric.kind))
+			return metric
+		finally:
+			self._lock.release()
+
+	def counter(self, name, documentation, labelNames = ()):
+		return self._register(Counter, name, documentation, labelNames)
+
+	def gauge(self, name, documentation, labelNames = ()):
+		return self._register(Gauge, name, documentation, labelNames)
+
+	def histogram(self, name, documentation, labelNames = (), buckets = LATENCY_BUCKETS):
+		return self._register(Histogram, name, documentation, labelNames, buckets)
+
+	def get(self, name):
+		"""
+		Return the metric registered as name, or None.
+		"""
+		return self._metrics.get(name)
+
+	def render(self):
+		"""
+		Return all the metrics in the Prometheus text format.
+		"""
+		self._lock.acquire()
+		metrics = sorted(self._metrics.items())
+		self._lock.release()
+		return "".join(metric.render() + "\n" for name, metric in metrics)
+
+## the registry of the process.
+REGISTRY = Registry()
+
+def counter(name, documentation, labelNames = ()):
+	return REGISTRY.counter(name, documentation, labelNames)
+
+def gauge(name, documentation, labelNames = ()):
+	return REGISTRY.gauge(name, documentation, labelNames)
+
+def histogram(name, documentation, labelNames = (), buckets = LATENCY_BUCKETS):
+	return REGISTRY.histogram(name, documentation, labelNames, buckets)
+
+class _MetricsHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+	def do_GET(self):
+		if(self.path.split("?")[0] != METRICS_PATH):
+			self.send_error(404)
+			return
+		body = self.server.registry.render()
+		self.send_response(200)
+		self.send_header("Content-Type", CONTENT_TYPE)
+		self.send_header("Content-Length", str(len(body)))
+		self.end_headers()
+		self.wfile.write(body)
+
+	def log_message(self, format, *args):
+		pass
+
+class _MetricsHTTPServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+	daemon_threads = True
+	allow_reuse_address = True
+
+class MetricsServer(Thread):
+	"""
+	A MetricsServer is a thread serving the metrics of a registry over HTTP, at METRICS_PATH, for Prometheus to scrape.
+	"""
+	def __init__(self, port, registry = REGISTRY, host = ""):
+		"""
+		Initialize a MetricsServer listening on port, 0 for a free port, which is then told by port().
+		"""
+		super(MetricsServer, self).__init__()
+		self.daemon = True
+		self._server = _MetricsHTTPServer((host, port), _MetricsHandler)
+		self._server.registry = registry
+
+	def port(self):
+		return self._server.server_address[1]
+
+	def run(self):
+		self._server.serve_forever()
+
+	def stop(self):
+		self._server.shutdown()
+		self._server.server_close()
@@ -0,0 +1,83 @@
+"""
+Online Page Importance Computation (OPIC, Abiteboul et al., 2003): the importance of pages estimated as they are crawled,
+from the links found on them, without keeping the link graph.
+"""
+
+from array import array
+from threading import Lock
+
+DEFAULT_SLOTS = 1 << 20
+VIRTUAL_CASH = 1.0
+
+class OPIC(object):
+	"""
+	An OPIC keeps some cash for every url. Crawling a page hands its cash out evenly to the urls it links to,
+	so the urls linked to by many pages, and by pages which were linked to themselves, gather the most cash.
+	Crawling the urls holding the most cash first is the greedy policy of OPIC, which converges to crawling the pages
+	of highest PageRank first.
+
+	Every crawled page is also given VIRTUAL_CASH before handing its cash out, as if linked to by a virtual page linking
+	to every page, so the cash keeps flowing from pages nobody links to, e.g. the seeds, and pages with no links
+	give their cash back to the virtual page.
+
+	Data members:
+	_cash: array('d')
+		the cash of the urls, in a fixed number of slots indexed by the hash of the url, so the memory taken doesn't grow
+		with the number of urls. Urls sharing a slot share their cash, which only blurs their importance a little.
+
+	_distributed: float
+		the total cash handed out so far.
+
+	_normalizer: func(url)
+		a function mapping a link to the form the urls are ranked under, e.g. the canonical one, or to None to skip it.
+		DEFAUL: None, links are taken as they are.
+	"""
+	def __init__(self, slots = DEFAULT_SLOTS, normalizer = None):
+		"""
+		Initialize an OPIC of at least the given number of slots, rounded up to a power of 2.
+		"""
+		size = 1
+		while(size < slots):
+			size <<= 1
+		self._cash = array("d", [0.0]) * size
+		self._mask = size - 1
+		self._distributed = 0.0
+		self._normalizer = normalizer
+		self._lock = Lock()
+
+	def _slot(self, url):
+		return hash(url) & self._mask
+
+	def cash(self, url):
+		"""
+		Return the cash of url, the higher the more important.
+		"""
+		return self._cash[self._slot(url)]
+
+	def visit(self, url, links):
+		"""
+		Hand the cash of url, which has just been crawled, out to the links found on its page.
+		"""
+		if(self._normalizer is not None):
+			## the page is ranked under the same form as its links, whatever form the downloader fetched it under.
+			url = self._normalizer(url) or url
+			links = [self._normalizer(link) for link in links]
+		targets = set(self._slot(link) for link in links if link is not None)
+		slot = self._slot(url)
+		self._lock.acquire()
+		try:
+			cash = self._cash[slot] + VIRTUAL_CASH
+			self._cash[slot] = 0.0
+			self._distributed += cash
+			if(targets):
+				share = cash / len(targets)
+				for target in targets:
+					self._cash[target] += share
+		finally:
+			self._lock.release()
+
+	def distributed(self):
+		"""
+		Return the total cash handed out so far. The cash of a url divided by it is the share of the importance the url holds.
+		"""
+		return self._distributed
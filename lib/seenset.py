@@ -0,0 +1,165 @@
+"""
+The urls seen by the whole cluster, kept by the manager as 64-bit fingerprints in shards owned by the hosts of the urls.
+"""
+
+from array import array
+from bisect import bisect_left
+from heapq import merge
+from hashlib import md5
+from threading import Lock
+from urlparse import urlsplit
+import struct
+import zlib
+import os
+
+DEFAULT_SHARDS = 16
+MIN_MERGE_SIZE = 1024
+MERGE_RATIO = 8
+SHARD_SUFFIX = ".seen"
+
+## fingerprints are stored as unsigned longs, 64 bits on the platforms the crawler runs on.
+_TYPECODE = "L"
+_BITS = 8 * array(_TYPECODE).itemsize
+
+def fingerprint(url):
+	"""
+	Return the fingerprint of url, the first _BITS bits of its md5 hash.
+	"""
+	if(isinstance(url, unicode)):
+		url = url.encode("utf-8")
+	return struct.unpack(">Q", md5(url).digest()[:8])[0] >> (64 - _BITS)
+
+class _Shard(object):
+	"""
+	A _Shard holds the fingerprints of the urls of some hosts: a sorted array of the older ones, searched by bisection,
+	and a set of the recent ones, merged into the array once they outnumber an eighth of it.
+	A fingerprint thus takes 8 bytes, besides the few held in the set, and each is copied a bounded number of times on average.
+	If a path is given, the new fingerprints are appended to the file there, and the ones already in it are loaded.
+	"""
+	def __init__(self, path = None):
+		self._sorted = array(_TYPECODE)
+		self._recent = set()
+		self._lock = Lock()
+		self._file = None
+		if(path is None):
+			return
+		if(os.path.exists(path)):
+			loaded = array(_TYPECODE)
+			count = os.path.getsize(path) // loaded.itemsize
+			f = open(path, "r+b")
+			try:
+				loaded.fromfile(f, count)
+				## a fingerprint cut short by a crash.
+				f.truncate(count * loaded.itemsize)
+			finally:
+				f.close()
+			self._sorted = array(_TYPECODE, sorted(loaded))
+		self._file = open(path, "ab")
+
+	def __len__(self):
+		return len(self._sorted) + len(self._recent)
+
+	def _contains(self, fp):
+		if(fp in self._recent):
+			return True
+		i = bisect_left(self._sorted, fp)
+		return i < len(self._sorted) and self._sorted[i] == fp
+
+	def add(self, fingerprints):
+		"""
+		Add fingerprints to the shard. Return the set of those which were not in it.
+		"""
+		self._lock.acquire()
+		try:
+			new = set()
+			for fp in fingerprints:
+				if(not self._contains(fp)):
+					self._recent.add(fp)
+					new.add(fp)
+			if(new and self._file is not None):
+				array(_TYPECODE, new).tofile(self._file)
+				self._file.flush()
+			if(len(self._recent) >= max(MIN_MERGE_SIZE, len(self._sorted) // MERGE_RATIO)):
+				self._sorted = array(_TYPECODE, merge(self._sorted, sorted(self._recent)))
+				self._recent = set()
+			return new
+		finally:
+			self._lock.release()
+
+	def close(self):
+		self._lock.acquire()
+		try:
+			if(self._file is not None):
+				self._file.flush()
+				os.fsync(self._file.fileno())
+				self._file.close()
+				self._file = None
+		finally:
+			self._lock.release()
+
+class SeenSet(object):
+	"""
+	A SeenSet tells which urls of a batch were never seen before, across all the workers of the cluster,
+	so the manager forwards a url to the worker crawling its host only once.
+
+	The urls are split over a number of shards by host, each shard having a lock of its own, and a batch is filtered
+	a shard at a time, so each lock is taken once per batch. A url is wrongly taken as seen with a probability of
+	about n / 2^64 once n urls are seen.
+
+	If a directory is given, the fingerprints of each shard are appended to a file there, "%04d.seen",
+	and loaded when the set is opened again, with the same number of shards. The files are flushed as fingerprints
+	are added, and synced when the set is closed. The fingerprints lost to a crash only let a few urls through again,
+	which the dup eliminator of the worker crawling them still drops.
+
+	Data members:
+	_shards: list[ _Shard ]
+		the shards, the one of a url being told by the crc32 of its host.
+	"""
+	def __init__(self, shards = DEFAULT_SHARDS, directory = None):
+		"""
+		Initialize a SeenSet of the given number of shards, kept in directory if it's not None.
+		"""
+		if(directory is not None and not os.path.exists(directory)):
+			os.makedirs(directory)
+		self._shards = [_Shard(os.path.join(directory, "%04d%s" % (i, SHARD_SUFFIX)) if directory is not None else None) \
+			for i in range(max(shards, 1))]
+
+	def __len__(self):
+		return sum(len(shard) for shard in self._shards)
+
+	def _shardOf(self, url):
+		host = urlsplit(url).hostname or ""
+		if(isinstance(host, unicode)):
+			host = host.encode("utf-8")
+		return (zlib.crc32(host) & 0xffffffff) % len(self._shards)
+
+	def filterNew(self, urls):
+		"""
+		Add urls to the set.
+		---------  Param --------
+		urls: iterable[ url ]
+			a batch of urls.
+
+		---------  Return --------
+		list[ url ]: the urls of the batch which were not seen before, each once, in the order they came in.
+		"""
+		batch = [(url, fingerprint(url), self._shardOf(url)) for url in urls]
+		byShard = {}
+		for url, fp, shard in batch:
+			byShard.setdefault(shard, []).append(fp)
+		new = set()
+		for shard, fingerprints in byShard.iteritems():
+			new.update(self._shards[shard].add(fingerprints))
+		fresh = []
+		for url, fp, shard in batch:
+			if(fp in new):
+				new.discard(fp)
+				fresh.append(url)
+		return fresh
+
+	def close(self):
+		"""
+		Sync the files of the shards to disk and close them. Urls added from now on are not saved.
+		"""
+		for shard in self._shards:
+			shard.close()
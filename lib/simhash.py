@@ -0,0 +1,94 @@
+from collections import deque
+import hashlib
+import struct
+
+FINGERPRINT_BITS = 64
+DEFAULT_MAX_DISTANCE = 3
+DEFAULT_CAPACITY = 1000000
+
+def simhash(features):
+	"""
+	Return the 64-bit SimHash fingerprint (Charikar 2002) of a collection of string features.
+	Similar collections get fingerprints differing in a few bits only.
+	"""
+	digests = set()
+	for feature in features:
+		if(isinstance(feature, unicode)):
+			feature = feature.encode("utf-8")
+		digests.add(struct.unpack("<Q", hashlib.md5(feature).digest()[:8])[0])
+	if(not digests):
+		return 0
+	## bit i of the fingerprint is set iff bit i is set in the majority of the feature hashes.
+	## the bits are counted column by column over the binary strings of the hashes, which runs at C speed.
+	columns = "".join(format(digest, "064b") for digest in digests)
+	half = len(digests) / 2.0
+	fingerprint = 0
+	for i in xrange(FINGERPRINT_BITS):
+		if(columns[i::FINGERPRINT_BITS].count("1") > half):
+			fingerprint |= 1 << (FINGERPRINT_BITS - 1 - i)
+	return fingerprint
+
+def distance(a, b):
+	"""
+	Return the Hamming distance between two fingerprints.
+	"""
+	return bin(a ^ b).count("1")
+
+class SimHashIndex(object):
+	"""
+	SimHashIndex holds fingerprints and finds one within maxDistance bits of a given fingerprint in sub-linear time.
+
+	The fingerprint is cut into maxDistance+1 bands. Two fingerprints differing in at most maxDistance bits agree on at least 
+	one band, so only the fingerprints sharing a band with the query are compared (Manku et al. 2007).
+	When capacity fingerprints are held, the oldest one is dropped for each new one.
+
+	Data members:
+	_tables: list[ dict{ band value: list[ fingerprint ] } ]
+		one table per band.
+
+	_order: deque[ fingerprint ]
+		the fingerprints in insertion order.
+	"""
+	def __init__(self, maxDistance = DEFAULT_MAX_DISTANCE, capacity = DEFAULT_CAPACITY):
+		self._maxDistance = maxDistance
+		self._capacity = capacity
+		numBands = maxDistance + 1
+		width = FINGERPRINT_BITS // numBands
+		self._bands = []
+		for i in range(numBands):
+			shift = i * width
+			bits = width if i < numBands - 1 else FINGERPRINT_BITS - shift
+			self._bands.append((shift, (1 << bits) - 1))
+		self._tables = [{} for band in self._bands]
+		self._order = deque()
+
+	def find(self, fingerprint):
+		"""
+		Return a fingerprint of the index within maxDistance bits of the given one, or None.
+		"""
+		for (shift, mask), table in zip(self._bands, self._tables):
+			for candidate in table.get((fingerprint >> shift) & mask, ()):
+				if(distance(candidate, fingerprint) <= self._maxDistance):
+					return candidate
+		return None
+
+	def add(self, fingerprint):
+		"""
+		Add a fingerprint to the index.
+		"""
+		if(len(self._order) >= self._capacity):
+			self._remove(self._order.popleft())
+		self._order.append(fingerprint)
+		for (shift, mask), table in zip(self._bands, self._tables):
+			table.setdefault((fingerprint >> shift) & mask, []).append(fingerprint)
+
+	def _remove(self, fingerprint):
+		for (shift, mask), table in zip(self._bands, self._tables):
+			key = (fingerprint >> shift) & mask
+			bucket = table[key]
+			bucket.remove(fingerprint)
+			if(not bucket):
+				del table[key]
+
+	def __len__(self):
+		return len(self._order)
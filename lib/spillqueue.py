@@ -0,0 +1,215 @@
+from Queue import Empty
+from collections import deque
+from threading import Lock
+import cPickle
+import tempfile
+import shutil
+import os
+
+DEFAULT_MEM_SIZE = 1000
+DEFAULT_SEGMENT_SIZE = 100000
+
+class SpillQueue(object):
+	"""
+	SpillQueue is an unbounded FIFO queue which keeps at most memSize items at its head in memory and spills the overflow 
+	to append-only segment files on local disk. It offers the same methods as PeekableQ, except that put() never blocks nor raises Full.
+
+	Infrastructure:
+		get() <-- [ head ] <-- [ segment 0 ][ segment 1 ] ... [ segment n ] <-- [ tail ] <-- put()
+		           memory                       disk                             memory
+
+	Data members:
+	_head: deque
+		the oldest items of the queue, refilled from disk one batch at a time.
+
+	_tail: list
+		the newest items of the queue, written to the last segment as a single batch once batchSize of them are collected.
+
+	_segments: deque[ str ]
+		the paths of the segment files, the oldest first. Each segment holds up to segmentSize items as a sequence of pickled batches.
+		Segments are read sequentially and removed as soon as they are consumed.
+		A segment file is only open while a batch is written to it or read from it, so a frontier with thousands of
+		spilling queues doesn't hold thousands of file descriptors.
+
+	_readPos: int
+		the offset in the first segment of the next batch to read.
+
+	_spilled: int
+		the number of items on disk.
+	"""
+	def __init__(self, spillDir, memSize = DEFAULT_MEM_SIZE, batchSize = None, segmentSize = DEFAULT_SEGMENT_SIZE):
+		"""
+		Initialize an empty queue. Segment files are created in a private subdirectory of spillDir, 
+		which only exists while some items are spilled.
+		"""
+		self._spillDir = spillDir
+		self._dir = None
+		self._memSize = max(memSize, 1)
+		self._batchSize = max(batchSize or memSize, 1)
+		self._segmentSize = max(segmentSize, self._batchSize)
+		self._head = deque()
+		self._tail = []
+		self._segments = deque()
+		self._nextSegment = 0
+		self._written = 0
+		self._readPos = 0
+		self._spilled = 0
+		self._size = 0
+		self._lock = Lock()
+
+	def put(self, item, block = False, timeout = None):
+		"""
+		Push an item into the queue from the back.
+		"""
+		self._lock.acquire()
+		try:
+			if(self._spilled == 0 and not self._tail and len(self._head) < self._memSize):
+				self._head.append(item)
+				self._size += 1
+			else:
+				self._tail.append(item)
+				self._size += 1
+				if(len(self._tail) >= self._batchSize):
+					self._spill()
+		finally:
+			self._lock.release()
+
+	def get(self, block = False, timeout = None):
+		"""
+		Pop and return the item at the front of the queue. Raise Empty if the queue is empty.
+		"""
+		self._lock.acquire()
+		try:
+			if(not self._head):
+				self._refill()
+				if(not self._head):
+					raise Empty()
+			self._size -= 1
+			return self._head.popleft()
+		finally:
+			self._lock.release()
+
+	def peek(self):
+		"""
+		Return the item at the front of the queue, or None if the queue is empty.
+		"""
+		self._lock.acquire()
+		try:
+			if(not self._head):
+				self._refill()
+			return self._head[0] if self._head else None
+		finally:
+			self._lock.release()
+
+	def empty(self):
+		"""
+		Return True if the queue is empty, False otherwise.
+		"""
+		return self._size == 0
+
+	def full(self):
+		"""
+		Return False, the queue is never full.
+		"""
+		return False
+
+	def qsize(self):
+		"""
+		Return the number of items in the queue.
+		"""
+		return self._size
+
+	def items(self):
+		"""
+		Return the items in the queue, the front one first, without popping them. The spilled ones are read from disk.
+		"""
+		self._lock.acquire()
+		try:
+			items = list(self._head)
+			for i, path in enumerate(self._segments):
+				f = open(path, "rb")
+				try:
+					if(i == 0):
+						## the batches of the first segment before the read position are consumed already.
+						f.seek(self._readPos)
+					while(True):
+						try:
+							items.extend(cPickle.load(f))
+						except EOFError:
+							break
+				finally:
+					f.close()
+			items.extend(self._tail)
+			return items
+		finally:
+			self._lock.release()
+
+	def close(self):
+		"""
+		Drop the items in the queue and remove its segment files.
+		"""
+		self._lock.acquire()
+		try:
+			self._removeDir()
+			self._head.clear()
+			self._tail = []
+			self._segments.clear()
+			self._spilled = self._size = 0
+		finally:
+			self._lock.release()
+
+	def _spill(self):
+		"""
+		Append the tail to the last segment as one batch, starting a new segment if the last one is full.
+		"""
+		if(self._dir is None):
+			if(not os.path.exists(self._spillDir)):
+				os.makedirs(self._spillDir)
+			self._dir = tempfile.mkdtemp(prefix = "spill", dir = self._spillDir)
+		if(not self._segments or self._written >= self._segmentSize):
+			self._segments.append(os.path.join(self._dir, "%08d.seg" % self._nextSegment))
+			self._nextSegment += 1
+			self._written = 0
+		f = open(self._segments[-1], "ab")
+		try:
+			cPickle.dump(self._tail, f, cPickle.HIGHEST_PROTOCOL)
+		finally:
+			f.close()
+		self._written += len(self._tail)
+		self._spilled += len(self._tail)
+		self._tail = []
+
+	def _refill(self):
+		"""
+		Move the next batch into the empty head, from disk if anything is spilled, from the tail otherwise.
+		"""
+		if(self._spilled == 0):
+			self._head.extend(self._tail)
+			self._tail = []
+			return
+
+		while(True):
+			f = open(self._segments[0], "rb")
+			try:
+				f.seek(self._readPos)
+				batch = cPickle.load(f)
+				self._readPos = f.tell()
+				break
+			except EOFError:
+				os.remove(self._segments.popleft())
+				self._readPos = 0
+			finally:
+				f.close()
+
+		self._head.extend(batch)
+		self._spilled -= len(batch)
+		if(self._spilled == 0):
+			## everything on disk is consumed, start over with fresh segments.
+			self._removeDir()
+
+	def _removeDir(self):
+		if(self._dir is not None):
+			shutil.rmtree(self._dir, True)
+			self._dir = None
+		self._segments.clear()
+		self._readPos = 0
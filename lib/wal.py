@@ -0,0 +1,258 @@
+from threading import Thread, Lock, Event
+import os
+
+DEFAULT_SEGMENT_SIZE = 100000
+DEFAULT_COMPACT_SEGMENTS = 8
+DEFAULT_SYNC_INTERVAL = 1
+
+ADD = "+"
+REMOVE = "-"
+SEGMENT_SUFFIX = ".wal"
+BASE_SUFFIX = ".base"
+
+class WriteAheadLog(object):
+	"""
+	WriteAheadLog keeps a set of items on local disk as an append-only log of the items added to and removed from it,
+	so the set survives a crash and needn't be saved as a whole.
+
+	Infrastructure:
+		[ base ] [ segment n+1 ] [ segment n+2 ] ... [ active segment ] <-- add() / remove()
+		 added       added and removed items, one per line: "+item" or "-item"
+
+	The log is split into segments of segmentSize records. Once compactSegments segments are sealed, a background thread
+	merges them into the base, which holds the items of the set as of the last sealed segment, one per line.
+	Merging takes memory in proportion to the sealed segments only: the base is streamed through,
+	minus the items removed by the segments, and followed by the items the segments added.
+	recover() does the same merge with all the segments, lazily, so a large set is read back as it's consumed.
+
+	Items are strings without newlines. Records are flushed to the file system as they are appended,
+	and synced to disk every syncInterval seconds by the background thread.
+
+	Data members:
+	_dir: str
+		the directory of the base and segment files, named after the number of the last segment they cover:
+		"%08d.base" and "%08d.wal".
+
+	_active: file
+		the segment being appended to, holding _records records.
+
+	_opened: int
+		the number of the first segment appended to since the log was opened. The ones before are what recover() reads.
+	"""
+	def __init__(self, directory, segmentSize = DEFAULT_SEGMENT_SIZE, compactSegments = DEFAULT_COMPACT_SEGMENTS, \
+		syncInterval = DEFAULT_SYNC_INTERVAL):
+		"""
+		Open the log kept in directory, which is created if needed.
+		The base and segments left by an interrupted merge are cleaned up, and appending goes on in a new segment.
+		"""
+		if(not os.path.exists(directory)):
+			os.makedirs(directory)
+		self._dir = directory
+		self._segmentSize = max(segmentSize, 1)
+		self._compactSegments = max(compactSegments, 1)
+		self._syncInterval = syncInterval
+		self._lock = Lock()
+		self._compactLock = Lock()
+		self._stopEvent = Event()
+		self._thread = None
+
+		base, segments = self._files()
+		if(base is not None):
+			## the segments covered by the base were not removed yet when the last merge was interrupted.
+			for number in [number for number in segments if number <= base]:
+				os.remove(self._segmentPath(number))
+				segments.remove(number)
+		self._next = max([base or 0] + segments) + 1
+		self._opened = self._next
+		self._active = None
+		self._records = 0
+		self._roll()
+
+	def _segmentPath(self, number):
+		return os.path.join(self._dir, "%08d%s" % (number, SEGMENT_SUFFIX))
+
+	def _basePath(self, number):
+		return os.path.join(self._dir, "%08d%s" % (number, BASE_SUFFIX))
+
+	def _files(self):
+		"""
+		Return the number of the latest base, or None, and the sorted numbers of the segments. Older bases are removed.
+		"""
+		bases, segments = [], []
+		for name in os.listdir(self._dir):
+			number, suffix = os.path.splitext(name)
+			if(not number.isdigit()):
+				continue
+			if(suffix == BASE_SUFFIX):
+				bases.append(int(number))
+			elif(suffix == SEGMENT_SUFFIX):
+				segments.append(int(number))
+		bases.sort()
+		for number in bases[:-1]:
+			os.remove(self._basePath(number))
+		return (bases[-1] if bases else None), sorted(segments)
+
+	def _roll(self):
+		"""
+		Seal the active segment, if any, and start a new one. Called with the lock held.
+		"""
+		if(self._active is not None):
+			self._active.flush()
+			os.fsync(self._active.fileno())
+			self._active.close()
+		self._active = open(self._segmentPath(self._next), "ab")
+		self._next += 1
+		self._records = 0
+
+	def _append(self, mark, items):
+		self._lock.acquire()
+		try:
+			lines = []
+			for item in items:
+				lines.append(mark + (item.encode("utf-8") if isinstance(item, unicode) else item) + "\n")
+				if(self._records + len(lines) >= self._segmentSize):
+					self._active.write("".join(lines))
+					lines = []
+					self._roll()
+			self._records += len(lines)
+			self._active.write("".join(lines))
+			self._active.flush()
+		finally:
+			self._lock.release()
+
+	def add(self, items):
+		"""
+		Log the addition of items to the set.
+		"""
+		self._append(ADD, items)
+
+	def remove(self, items):
+		"""
+		Log the removal of items from the set.
+		"""
+		self._append(REMOVE, items)
+
+	def _replay(self, numbers):
+		"""
+		Replay the given segments in order. Return the items they leave added and those they leave removed, as two sets.
+		"""
+		added, removed = set(), set()
+		for number in numbers:
+			f = open(self._segmentPath(number), "rb")
+			try:
+				for line in f:
+					if(not line.endswith("\n")):
+						## a record cut short by a crash.
+						break
+					item = line[1:-1]
+					if(line[0] == ADD):
+						added.add(item)
+						removed.discard(item)
+					else:
+						added.discard(item)
+						removed.add(item)
+			finally:
+				f.close()
+		return added, removed
+
+	def _merge(self, baseFile, added, removed):
+		"""
+		Yield the items of the set made of the base open as baseFile, if any, and segments replayed into added and removed: 
+		those of the base which the segments neither removed nor added again, then those the segments added.
+		"""
+		if(baseFile is not None):
+			try:
+				for line in baseFile:
+					item = line[:-1]
+					if(line.endswith("\n") and item not in removed and item not in added):
+						yield item
+			finally:
+				baseFile.close()
+		for item in added:
+			yield item
+
+	def recover(self):
+		"""
+		Return an iterator over the items of the set as logged before this log was opened.
+		The segments are replayed right away and the items they leave are held in memory,
+		while the items of the base are read as they are consumed.
+		"""
+		self._compactLock.acquire()
+		try:
+			base, segments = self._files()
+			added, removed = self._replay([number for number in segments if number < self._opened])
+			## the base is opened now, so it can still be read once a merge replaces it.
+			baseFile = open(self._basePath(base), "rb") if base is not None else None
+		finally:
+			self._compactLock.release()
+		return self._merge(baseFile, added, removed)
+
+	def compact(self, force = False):
+		"""
+		Merge the sealed segments into the base, if there are compactSegments of them, or any if force is True.
+		"""
+		self._compactLock.acquire()
+		try:
+			base, segments = self._files()
+			self._lock.acquire()
+			active = self._next - 1
+			self._lock.release()
+			sealed = [number for number in segments if number < active]
+			if(not sealed or (len(sealed) < self._compactSegments and not force)):
+				return
+			added, removed = self._replay(sealed)
+			baseFile = open(self._basePath(base), "rb") if base is not None else None
+			path = self._basePath(sealed[-1])
+			f = open(path + ".tmp", "wb")
+			try:
+				for item in self._merge(baseFile, added, removed):
+					f.write(item + "\n")
+				f.flush()
+				os.fsync(f.fileno())
+			finally:
+				f.close()
+			os.rename(path + ".tmp", path)
+			if(base is not None):
+				os.remove(self._basePath(base))
+			for number in sealed:
+				os.remove(self._segmentPath(number))
+		finally:
+			self._compactLock.release()
+
+	def sync(self):
+		"""
+		Sync the active segment to disk.
+		"""
+		self._lock.acquire()
+		try:
+			os.fsync(self._active.fileno())
+		finally:
+			self._lock.release()
+
+	def _run(self):
+		while(not self._stopEvent.wait(self._syncInterval)):
+			self.sync()
+			self.compact()
+
+	def start(self):
+		"""
+		Start the background thread syncing the log and compacting it.
+		"""
+		self._thread = Thread(target = self._run)
+		self._thread.daemon = True
+		self._thread.start()
+
+	def close(self):
+		"""
+		Stop the background thread, if any, and close the log, synced to disk.
+		"""
+		self._stopEvent.set()
+		if(self._thread is not None):
+			self._thread.join()
+		self._lock.acquire()
+		try:
+			self._active.flush()
+			os.fsync(self._active.fileno())
+			self._active.close()
+		finally:
+			self._lock.release()
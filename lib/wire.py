@@ -0,0 +1,253 @@
+"""
+The binary framing of the messages exchanged by the manager and the workers.
+
+A frame is a fixed header followed by a payload:
+
+	magic "CW" | version: uint8 | type: uint8 | codec: uint8 | payload length: uint32 | payload
+
+all integers big endian. The payload is compressed as told by codec (NONE, ZLIB or ZSTD).
+
+A URLS payload carries a batch of urls grouped by origin ("scheme://host:port"), each group front-coded:
+
+	groups: uint32 | { origin length: uint16 | origin | urls: uint32 | { shared: uint8 | suffix length: uint16 | suffix } }
+
+where shared is the number of leading bytes the rest of the url (after its origin) has in common with the previous one
+in the group, the rests being sorted so neighbours share as much as possible.
+
+A RETURN payload is a URLS payload carrying urls handed back by a worker, e.g. the frontier of a worker stopping.
+The manager has seen them already, so they are dispatched again without being filtered.
+
+A HEARTBEAT payload is sent periodically by each worker, to tell the manager it's alive and how many urls it may be sent:
+
+	credit: uint64 | received: uint64 | frontier size: uint32 | page queue size: uint32 | fetch rate: float64 |
+	worker id length: uint16 | worker id
+
+where credit is the total number of urls the worker can take since it registered (the urls received so far plus
+the free room of its frontier), received the total number of urls it received, which acknowledges the batches sent
+to it, and fetch rate the number of pages it downloaded per second lately.
+
+A ROBOTS payload carries robots.txt bodies, from the worker which fetched them to the manager and from the manager to the
+workers crawling their hosts:
+
+	records: uint32 | { host length: uint16 | host | expiry time: float64 | body length: uint32 | body }
+"""
+
+from itertools import groupby
+import struct
+import zlib
+
+try:
+	import zstandard
+except ImportError:
+	zstandard = None
+
+MAGIC = "CW"
+VERSION = 1
+
+## message types
+URLS = 1
+HEARTBEAT = 2
+ROBOTS = 3
+RETURN = 4
+
+## payload codecs
+NONE = 0
+ZLIB = 1
+ZSTD = 2
+DEFAULT_CODEC = ZLIB
+COMPRESS_MIN_SIZE = 256
+ZLIB_LEVEL = 1
+ZSTD_LEVEL = 3
+
+MAX_SHARED = 0xFF
+MAX_LENGTH = 0xFFFF
+
+_HEADER = struct.Struct(">2sBBBI")
+_COUNT = struct.Struct(">I")
+_LENGTH = struct.Struct(">H")
+_ENTRY = struct.Struct(">BH")
+_HEARTBEAT = struct.Struct(">QQIIdH")
+_ROBOTS = struct.Struct(">dI")
+
+class WireError(ValueError):
+	"""
+	Raised when a frame can't be decoded.
+	"""
+	pass
+
+def _compress(payload, codec):
+	if(codec == ZLIB):
+		return zlib.compress(payload, ZLIB_LEVEL)
+	if(codec == ZSTD):
+		if(zstandard is None):
+			raise ValueError("the zstandard module is required to compress with zstd")
+		return zstandard.ZstdCompressor(level = ZSTD_LEVEL).compress(payload)
+	return payload
+
+def _decompress(payload, codec):
+	try:
+		if(codec == ZLIB):
+			return zlib.decompress(payload)
+		if(codec == ZSTD):
+			if(zstandard is None):
+				raise WireError("the zstandard module is required to decompress zstd frames")
+			return zstandard.ZstdDecompressor().decompress(payload)
+	except (zlib.error, ValueError) as e:
+		raise WireError("corrupted payload: %s" % e)
+	if(codec != NONE):
+		raise WireError("unknown codec %d" % codec)
+	return payload
+
+def encode(msgType, payload, codec = DEFAULT_CODEC):
+	"""
+	Return the frame carrying payload as a message of type msgType.
+	Payloads shorter than COMPRESS_MIN_SIZE bytes are not worth compressing and are sent as they are.
+	"""
+	if(len(payload) < COMPRESS_MIN_SIZE):
+		codec = NONE
+	payload = _compress(payload, codec)
+	return _HEADER.pack(MAGIC, VERSION, msgType, codec, len(payload)) + payload
+
+def decode(frame):
+	"""
+	Return the (type, payload) of a frame. Raise WireError if the frame is not one this version can read.
+	"""
+	if(len(frame) < _HEADER.size):
+		raise WireError("truncated header")
+	magic, version, msgType, codec, length = _HEADER.unpack_from(frame)
+	if(magic != MAGIC):
+		raise WireError("not a frame")
+	if(version != VERSION):
+		raise WireError("unsupported version %d" % version)
+	if(len(frame) - _HEADER.size != length):
+		raise WireError("payload of %d bytes, %d expected" % (len(frame) - _HEADER.size, length))
+	return msgType, _decompress(buffer(frame, _HEADER.size) if codec == NONE else frame[_HEADER.size:], codec)
+
+def _origin(url):
+	"""
+	Return the length of the "scheme://netloc" part of url.
+	"""
+	end = url.find("/", url.find("//") + 2)
+	return len(url) if end < 0 else end
+
+def encodeURLs(urls, codec = DEFAULT_CODEC, msgType = URLS):
+	"""
+	Return a URLS frame, or a RETURN frame, carrying urls. Urls longer than MAX_LENGTH bytes are left out.
+	"""
+	split = []
+	for url in urls:
+		if(isinstance(url, unicode)):
+			url = url.encode("utf-8")
+		i = _origin(url)
+		if(len(url) - i <= MAX_LENGTH and i <= MAX_LENGTH):
+			split.append((url[:i], url[i:]))
+	split.sort()
+
+	parts = []
+	groups = 0
+	for origin, group in groupby(split, lambda pair: pair[0]):
+		rests = [rest for o, rest in group]
+		groups += 1
+		parts.append(_LENGTH.pack(len(origin)))
+		parts.append(origin)
+		parts.append(_COUNT.pack(len(rests)))
+		previous = ""
+		for rest in rests:
+			shared = 0
+			limit = min(len(previous), len(rest), MAX_SHARED)
+			while(shared < limit and previous[shared] == rest[shared]):
+				shared += 1
+			parts.append(_ENTRY.pack(shared, len(rest) - shared))
+			parts.append(rest[shared:])
+			previous = rest
+	return encode(msgType, _COUNT.pack(groups) + "".join(parts), codec)
+
+def iterURLs(payload):
+	"""
+	Yield the urls of a URLS or RETURN payload, one at a time, reading them straight from the payload.
+	"""
+	try:
+		offset = 0
+		(groups,) = _COUNT.unpack_from(payload, offset)
+		offset += _COUNT.size
+		for g in xrange(groups):
+			(length,) = _LENGTH.unpack_from(payload, offset)
+			offset += _LENGTH.size
+			origin = payload[offset:offset + length]
+			offset += length
+			(count,) = _COUNT.unpack_from(payload, offset)
+			offset += _COUNT.size
+			previous = ""
+			for i in xrange(count):
+				shared, length = _ENTRY.unpack_from(payload, offset)
+				offset += _ENTRY.size
+				previous = previous[:shared] + payload[offset:offset + length]
+				offset += length
+				yield origin + previous
+	except struct.error:
+		raise WireError("truncated payload")
+	if(offset != len(payload)):
+		raise WireError("%d trailing bytes" % (len(payload) - offset))
+
+def decodeURLs(frame):
+	"""
+	Return the urls carried by a URLS or RETURN frame as a list.
+	"""
+	msgType, payload = decode(frame)
+	if(msgType not in (URLS, RETURN)):
+		raise WireError("expecting a URLS frame, got type %d" % msgType)
+	return list(iterURLs(payload))
+
+def encodeHeartbeat(workerID, credit, received, frontierSize, pageQSize, fetchRate):
+	"""
+	Return a HEARTBEAT frame of workerID, see the module documentation for the fields.
+	"""
+	return encode(HEARTBEAT, _HEARTBEAT.pack(credit, received, frontierSize, pageQSize, fetchRate, len(workerID)) + workerID, NONE)
+
+def decodeHeartbeat(payload):
+	"""
+	Return the fields of a HEARTBEAT payload as a dict{ worker, credit, received, frontier, pages, fetch_rate }.
+	"""
+	try:
+		credit, received, frontierSize, pageQSize, fetchRate, length = _HEARTBEAT.unpack_from(payload)
+	except struct.error:
+		raise WireError("truncated payload")
+	if(len(payload) != _HEARTBEAT.size + length):
+		raise WireError("worker id of %d bytes, %d expected" % (len(payload) - _HEARTBEAT.size, length))
+	return {"worker": payload[_HEARTBEAT.size:], "credit": credit, "received": received, "frontier": frontierSize, \
+		"pages": pageQSize, "fetch_rate": fetchRate}
+
+def encodeRobots(records, codec = DEFAULT_CODEC):
+	"""
+	Return a ROBOTS frame carrying a list of (host, expiry time, body).
+	"""
+	parts = [_COUNT.pack(len(records))]
+	for host, expires, body in records:
+		parts.append(_LENGTH.pack(len(host)))
+		parts.append(host)
+		parts.append(_ROBOTS.pack(expires, len(body)))
+		parts.append(body)
+	return encode(ROBOTS, "".join(parts), codec)
+
+def decodeRobots(payload):
+	"""
+	Return the list of (host, expiry time, body) of a ROBOTS payload.
+	"""
+	records = []
+	try:
+		(count,) = _COUNT.unpack_from(payload)
+		offset = _COUNT.size
+		for i in xrange(count):
+			(length,) = _LENGTH.unpack_from(payload, offset)
+			offset += _LENGTH.size
+			host = payload[offset:offset + length]
+			offset += length
+			expires, length = _ROBOTS.unpack_from(payload, offset)
+			offset += _ROBOTS.size
+			records.append((host, expires, payload[offset:offset + length]))
+			offset += length
+	except struct.error:
+		raise WireError("truncated payload")
+	if(offset != len(payload)):
+		raise WireError("%d trailing bytes" % (len(payload) - offset))
+	return records
@@ -1,12 +1,38 @@
 #!/usr/bin/python
 """
-Run all the tests. (currently there is only one test on the library frontier.)
+Run all the tests.
 """
 
 import unittest
 from test.TestFrontier import FrontierTests
+from test.TestBloomFilter import BloomFilterTests, DupEliminatorTests
+from test.TestSpillQueue import SpillQueueTests
+from test.TestLinkExtractor import LinkExtractorTests
+from test.TestStorage import PageStoreTests, ContentBackendTests
+from test.TestSimHash import SimHashTests, NearDupDetectorTests
+from test.TestCanonicalizer import CanonicalizerTests
+from test.TestHashRing import HashRingTests
+from test.TestWire import WireTests
+from test.TestBatcher import BatcherTests
+from test.TestPoliteness import PolitenessTests
+from test.TestRobots import RobotsTests
+from test.TestDNSCache import DNSCacheTests
+from test.TestMetrics import MetricsTests
+from test.TestCheckpoint import CheckpointTests
+from test.TestWAL import WALTests
+from test.TestSeenSet import SeenSetTests
+from test.TestOPIC import OPICTests
+from test.TestRevisit import RevisitTests
+from test.TestParser import ParserTests
+from test.TestParserPool import ParserPoolTests
 
 
 if __name__ == '__main__':
-	suite = unittest.TestLoader().loadTestsFromTestCase(FrontierTests)
-	unittest.TextTestRunner().run(suite)
\ No newline at end of file
+	suite = unittest.TestSuite()
+	for testCase in [FrontierTests, BloomFilterTests, DupEliminatorTests, SpillQueueTests, LinkExtractorTests, PageStoreTests, ContentBackendTests, \
+		SimHashTests, NearDupDetectorTests, CanonicalizerTests, HashRingTests, WireTests, \
+		BatcherTests, PolitenessTests, RobotsTests, \
+		DNSCacheTests, MetricsTests, CheckpointTests, WALTests, SeenSetTests, OPICTests, RevisitTests, \
+		ParserTests, ParserPoolTests]:
+		suite.addTests(unittest.TestLoader().loadTestsFromTestCase(testCase))
+	unittest.TextTestRunner().run(suite)
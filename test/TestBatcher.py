@@ -0,0 +1,53 @@
+#!/usr/bin/python
+"""Tests for the adaptive batcher of url messages."""
+
+import unittest
+import time
+from lib.batcher import Batcher
+
+class BatcherTests(unittest.TestCase):
+
+    def setUp(self):
+        self.sent = []
+
+    def send(self, batch):
+        self.sent.append(set(batch))
+
+    def test_size_and_bytes_thresholds(self):
+        batcher = Batcher(self.send, minSize = 3, maxSize = 3, maxBytes = 10)
+        for item in ["a", "b", "a", "c", "d"]:
+            batcher.add(item)
+        self.assertEqual(self.sent, [set(["a", "b", "c"])])
+        batcher.add("x" * 10)
+        self.assertEqual(self.sent[-1], set(["d", "x" * 10]))
+        self.assertEqual(len(batcher), 0)
+
+    def test_latency_threshold(self):
+        batcher = Batcher(self.send, minSize = 100, maxDelay = 0.05)
+        self.assertEqual(batcher.pollTimeout(5), 5)
+        batcher.add("a")
+        batcher.poll()
+        self.assertEqual(self.sent, [])
+        self.assertTrue(batcher.pollTimeout(5) <= 0.05)
+        time.sleep(0.06)
+        self.assertEqual(batcher.pollTimeout(5), 0)
+        batcher.poll()
+        self.assertEqual(self.sent, [set(["a"])])
+
+    def test_adapts_to_throughput(self):
+        batcher = Batcher(self.send, minSize = 10, maxSize = 500, targetDelay = 0.5)
+        for i in range(5000):
+            batcher.add("http://example.com/%d" % i)
+        self.assertEqual(batcher.targetSize(), 500)
+        self.assertTrue(len(self.sent) < 5000 / 10)
+
+    def test_flush_and_drain(self):
+        batcher = Batcher(self.send, minSize = 10)
+        batcher.flush()
+        self.assertEqual(self.sent, [])
+        batcher.add("a")
+        batcher.flush()
+        batcher.add("b")
+        self.assertEqual(batcher.drain(), ["b"])
+        batcher.flush()
+        self.assertEqual(self.sent, [set(["a"])])
@@ -0,0 +1,79 @@
+#!/usr/bin/python
+"""Tests for the Bloom filters and the DupEliminator backends built on them."""
+
+import unittest
+from lib.bloomfilter import BloomFilter, ScalableBloomFilter
+from core.urlFilter import DupEliminator, EXACT_DEDUP, BLOOM_DEDUP, SCALABLE_BLOOM_DEDUP
+
+class BloomFilterTests(unittest.TestCase):
+
+    def test_no_false_negatives(self):
+        bloom = BloomFilter(1000, 0.01)
+        for i in range(1000):
+            self.assertFalse(bloom.add('http://host%d.com/' % i))
+        for i in range(1000):
+            self.assertTrue('http://host%d.com/' % i in bloom)
+            self.assertTrue(bloom.add('http://host%d.com/' % i))
+        self.assertEqual(len(bloom), 1000)
+
+    def test_false_positive_rate_is_bounded(self):
+        bloom = BloomFilter(5000, 0.01)
+        for i in range(5000):
+            bloom.add('http://seen.com/%d' % i)
+        fp = sum(1 for i in range(5000) if ('http://unseen.com/%d' % i) in bloom)
+        self.assertTrue(fp < 5000 * 0.03)
+        self.assertTrue(0.002 < bloom.errorRate() < 0.03)
+
+    def test_scalable_filter_grows(self):
+        bloom = ScalableBloomFilter(100, 0.01)
+        for i in range(1000):
+            bloom.add(u'http://host.com/%d' % i)
+        self.assertTrue(len(bloom._filters) > 1)
+        for i in range(1000):
+            self.assertTrue(u'http://host.com/%d' % i in bloom)
+        self.assertTrue(bloom.errorRate() < 0.01)
+
+    def test_dumps_and_loads(self):
+        bloom = ScalableBloomFilter(100, 0.01)
+        for i in range(500):
+            bloom.add('http://host.com/%d' % i)
+        data = "junk" + bloom.dumps()
+        copy, end = ScalableBloomFilter.loads(data, 4)
+        self.assertEqual(end, len(data))
+        self.assertEqual(len(copy), len(bloom))
+        self.assertEqual(len(copy._filters), len(bloom._filters))
+        for i in range(500):
+            self.assertTrue('http://host.com/%d' % i in copy)
+        self.assertEqual(copy.errorRate(), bloom.errorRate())
+        self.assertFalse(copy.add('http://host.com/new'))
+        self.assertRaises(ValueError, BloomFilter.loads, data[:100], 4)
+
+class DupEliminatorTests(unittest.TestCase):
+
+    def check_backend(self, backend):
+        dup = DupEliminator(backend, 1000, 0.001, 10)
+        self.assertFalse(dup.seenBefore('http://google.com/'))
+        self.assertTrue(dup.seenBefore('http://google.com/'))
+        for i in range(100):
+            dup.seenBefore('http://python.org/%d' % i)
+        self.assertTrue(dup.seenBefore('http://google.com/'))
+        total, errorRate = dup.size(True)
+        self.assertEqual(total, 101)
+        self.assertEqual(dup.size(), 101)
+        self.assertTrue(errorRate < 0.001)
+
+    def test_exact_backend(self):
+        self.check_backend(EXACT_DEDUP)
+
+    def test_bloom_backend(self):
+        self.check_backend(BLOOM_DEDUP)
+
+    def test_scalable_bloom_backend(self):
+        self.check_backend(SCALABLE_BLOOM_DEDUP)
+
+    def test_unknown_backend(self):
+        self.assertRaises(ValueError, DupEliminator, 'cuckoo')
+
+
+if __name__ == '__main__':
+    unittest.main()
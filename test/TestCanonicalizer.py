@@ -0,0 +1,53 @@
+#!/usr/bin/python
+"""Tests for the url canonicalizer and the frontier normalizer hook."""
+
+import unittest
+from core.urlCanonicalizer import URLCanonicalizer, removeDotSegments
+from lib.frontier import Frontier
+
+class CanonicalizerTests(unittest.TestCase):
+
+    def setUp(self):
+        self.canonicalizer = URLCanonicalizer()
+
+    def test_scheme_host_port_and_fragment(self):
+        self.assertEqual(self.canonicalizer.canonicalize("HTTP://Example.COM.:80/a/../b#frag"), "http://example.com/b")
+        self.assertEqual(self.canonicalizer.canonicalize("https://example.com:443"), "https://example.com/")
+        self.assertEqual(self.canonicalizer.canonicalize("http://example.com:8080/"), "http://example.com:8080/")
+
+    def test_dot_segments(self):
+        self.assertEqual(removeDotSegments("/a/b/c/./../../g"), "/a/g")
+        self.assertEqual(removeDotSegments("/../a/."), "/a/")
+        self.assertEqual(removeDotSegments("/"), "/")
+
+    def test_escapes(self):
+        self.assertEqual(self.canonicalizer.canonicalize("http://example.com/%7euser/a%2fb%c3%a9"), "http://example.com/~user/a%2Fb%C3%A9")
+        self.assertEqual(self.canonicalizer.canonicalize(u"http://example.com/caf\xe9 x"), "http://example.com/caf%C3%A9%20x")
+
+    def test_idna_host(self):
+        self.assertEqual(self.canonicalizer.canonicalize(u"http://B\xfccher.example/"), "http://xn--bcher-kva.example/")
+
+    def test_query(self):
+        self.assertEqual(self.canonicalizer.canonicalize("http://example.com/?b=2&utm_source=x&a=1&GCLID=y&"), "http://example.com/?a=1&b=2")
+        self.assertEqual(self.canonicalizer.canonicalize("http://example.com/p;jsessionid=ABC?jsessionid=ABC"), "http://example.com/p")
+        unsorted = URLCanonicalizer(sortQuery = False)
+        self.assertEqual(unsorted.canonicalize("http://example.com/?b=2&a=1"), "http://example.com/?b=2&a=1")
+
+    def test_uncrawlable(self):
+        for url in ["mailto:someone@example.com", "javascript:void(0)", "ftp://example.com/", "http:///path", "http://[::1/"]:
+            self.assertEqual(self.canonicalizer.canonicalize(url), None)
+
+    def test_frontier_normalizer(self):
+        frontier = Frontier(1, 10, lambda url: "host")
+        frontier.setNormalizer(self.canonicalizer.canonicalize)
+        seen = set()
+        def dup(url):
+            if(url in seen):
+                return True
+            seen.add(url)
+            return False
+        frontier.addFilter(dup)
+        for url in ["http://Example.com/a?utm_medium=mail", "http://example.com:80/./a#top", "mailto:x@example.com"]:
+            frontier.put(url)
+        self.assertEqual(frontier.size(), 1)
+        self.assertEqual(frontier.get(), "http://example.com/a")
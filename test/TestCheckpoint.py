@@ -0,0 +1,88 @@
+#!/usr/bin/python
+"""Tests for saving and resuming the crawl state of a worker."""
+
+import unittest
+import tempfile
+import shutil
+import os
+from core.checkpoint import Checkpoint, FRONTIER, SEEN
+from core.urlFilter import DupEliminator, EXACT_DEDUP, BLOOM_DEDUP
+from core.politeness import PolitenessPolicy
+from core.revisit import RevisitPolicy
+
+class CheckpointTests(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.checkpoint = Checkpoint(os.path.join(self.dir, "state"))
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, True)
+
+    def test_nothing_saved(self):
+        self.assertFalse(self.checkpoint.exists())
+        self.assertEqual(self.checkpoint.loadURLs(), [])
+        self.assertEqual(self.checkpoint.loadHosts(), [])
+
+    def test_round_trip(self):
+        policy = PolitenessPolicy()
+        policy.record("a.com", 200, 0.5)
+        policy.setCrawlDelay("b.com:8080", 10)
+        dup = DupEliminator(BLOOM_DEDUP, 1000, 0.001, 10)
+        for url in ["http://a.com/1", "http://a.com/2"]:
+            dup.seenBefore(url)
+        self.checkpoint.save(dup.snapshot(), ["http://a.com/2", u"http://b.com:8080/\xe9"], policy.snapshot(), dup.backend)
+        self.assertTrue(self.checkpoint.exists())
+
+        self.assertEqual(self.checkpoint.loadURLs(), ["http://a.com/2", "http://b.com:8080/\xc3\xa9"])
+        restored = PolitenessPolicy()
+        restored.restore(self.checkpoint.loadHosts())
+        self.assertEqual(restored.readyTime("a.com"), policy.readyTime("a.com"))
+        self.assertEqual(restored.delay("b.com:8080"), 10)
+        seen = DupEliminator(BLOOM_DEDUP, 1000, 0.001, 10)
+        self.checkpoint.loadSeen(seen)
+        self.assertTrue(seen.seenBefore("http://a.com/1"))
+        self.assertFalse(seen.seenBefore("http://a.com/3"))
+        self.assertEqual(seen.size(), 3)
+
+    def test_revisits_round_trip(self):
+        policy = RevisitPolicy(60)
+        policy.record("http://a.com/", 200, {"etag": '"v1"', "last-modified": "Mon, 01 Jan 2024 00:00:00 GMT"}, "a")
+        policy.record("http://b.com/", 200, None, "b")
+        policy.record("http://b.com/", 200, None, "b2")
+        self.checkpoint.save([], [], [], EXACT_DEDUP, policy.snapshot())
+        restored = RevisitPolicy(60)
+        restored.restore(self.checkpoint.loadRevisits())
+        self.assertEqual(restored.snapshot(), policy.snapshot())
+        self.assertEqual(restored.conditionalHeaders("http://a.com/"), policy.conditionalHeaders("http://a.com/"))
+
+    def test_exact_backend_appends_what_is_new(self):
+        dup = DupEliminator(EXACT_DEDUP)
+        dup.seenBefore("http://a.com/1")
+        self.checkpoint.save(dup.snapshot(), [], [], dup.backend)
+        dup.seenBefore("http://a.com/2")
+        dup.seenBefore("http://a.com/1")
+        self.checkpoint.save(dup.snapshot(), [], [], dup.backend)
+        path = os.path.join(self.dir, "state", SEEN + EXACT_DEDUP)
+        self.assertEqual(open(path).read(), "http://a.com/1\nhttp://a.com/2\n")
+
+        ## a line cut short by a crash is left out.
+        f = open(path, "a")
+        f.write("http://a.com/3")
+        f.close()
+        seen = DupEliminator(EXACT_DEDUP)
+        self.checkpoint.loadSeen(seen)
+        self.assertEqual(seen.size(), 2)
+        self.assertEqual(seen.snapshot(), [])
+        seen.seenBefore("http://a.com/3")
+        self.assertEqual(seen.snapshot(), ["http://a.com/3"])
+
+    def test_files_are_replaced_whole(self):
+        self.checkpoint.save([], ["http://a.com/1"], [], EXACT_DEDUP)
+        self.checkpoint.save([], ["http://a.com/2"], [], EXACT_DEDUP)
+        self.assertEqual(self.checkpoint.loadURLs(), ["http://a.com/2"])
+        self.assertEqual(sorted(os.listdir(os.path.join(self.dir, "state"))), ["MANIFEST", FRONTIER, "hosts", SEEN + EXACT_DEDUP])
+
+
+if __name__ == '__main__':
+    unittest.main()
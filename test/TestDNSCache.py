@@ -0,0 +1,51 @@
+#!/usr/bin/python
+"""Tests for the DNS cache."""
+
+import unittest
+import socket
+import time
+from core.dnsCache import DNSCache
+
+class DNSCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = DNSCache(ttl = 60, negativeTTL = 60, nResolvers = 2)
+        self.resolved = []
+        resolve = self.cache._resolve
+        self.cache._resolve = lambda host: (self.resolved.append(host), resolve(host))[1]
+
+    def tearDown(self):
+        if(self.cache._running):
+            self.cache.stop()
+
+    def test_addresses_are_cached(self):
+        addresses = self.cache.getaddrinfo("localhost", 8080, socket.AF_INET)
+        self.assertTrue(addresses)
+        self.assertEqual(addresses[0][4][1], 8080)
+        self.assertEqual(self.cache.getaddrinfo("localhost", 80, socket.AF_INET)[0][4][1], 80)
+        self.assertEqual(self.resolved, ["localhost"])
+
+    def test_failures_are_cached(self):
+        self.assertRaises(socket.gaierror, self.cache.getaddrinfo, "nohost.invalid", 80)
+        self.assertRaises(socket.gaierror, self.cache.lookup, "nohost.invalid")
+        self.assertEqual(self.resolved, ["nohost.invalid"])
+
+    def test_expired_addresses_are_resolved_again(self):
+        cache = DNSCache(ttl = 0)
+        cache.lookup("localhost")
+        time.sleep(0.01)
+        self.assertEqual(cache._fresh("localhost"), None)
+        self.assertTrue(cache.lookup("localhost"))
+
+    def test_prefetch(self):
+        self.cache.start()
+        self.assertEqual(self.cache.lookup("localhost"), None)
+        self.cache.prefetch("localhost")
+        deadline = time.time() + 5
+        while(self.cache.lookup("localhost") is None and time.time() < deadline):
+            time.sleep(0.01)
+        self.assertTrue(self.cache.lookup("localhost"))
+        self.assertEqual(self.resolved, ["localhost"])
+
+if __name__ == '__main__':
+    unittest.main()
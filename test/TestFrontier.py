@@ -7,6 +7,8 @@ from Queue import Empty
 import urllib2 
 from threading import Thread
 import time
+import tempfile
+import shutil
 
 class FrontierTests(unittest.TestCase):
 
@@ -79,6 +81,20 @@ class FrontierTests(unittest.TestCase):
         self.assertEqual(list_queue(f._backQ[1]), ['http://dropbox.com/'])
         self.assertEqual(list_queue(f._frontQ), ['http://python.org/'])
 
+    def test_transfer_with_full_backQs(self):
+        f = Frontier(2, 3, keyFunc = hostname)
+        for i in range(3):
+            f.put('http://google.com/%d' % i)
+        f._transfer()
+        for i in range(3, 6):
+            f.put('http://google.com/%d' % i)
+        f._transfer()
+        ## the back queues hold maxQSize items in total, the others wait in the front queue.
+        self.assertEqual(f._backQ[0].qsize(), 3)
+        self.assertEqual(f._frontQ.qsize(), 3)
+        self.assertEqual(f.size(), 6)
+        self.assertEqual([f.get(block=False) for i in range(6)], ['http://google.com/%d' % i for i in range(6)])
+
     def test_get_with_no_filter(self):
         f = Frontier(2, keyFunc = hostname)
         f.put('http://dropbox.com/')
@@ -116,6 +132,99 @@ class FrontierTests(unittest.TestCase):
                     self.assertEqual(f.get(), i)
         self.assertEqual(list_queue(f._frontQ), [])
 
+    def test_get_waits_for_ready_time(self):
+        ready = {'a': time.time() + 0.3, 'b': 0}
+        f = Frontier(2, keyFunc = lambda x : x[0], priorityFunc = lambda k : ready[k])
+        f.put('a1')
+        f.put('b1')
+
+        self.assertEqual(f.get(block=False), 'b1')
+        self.assertRaises(Empty, f.get, False)
+        self.assertRaises(Empty, f.get, True, 0.05)
+        self.assertEqual(f.get(timeout=1), 'a1')
+        self.assertTrue(time.time() >= ready['a'])
+
+    def test_blocking_get_wakes_up_on_put(self):
+        f = Frontier(2)
+        Thread(target=lambda : (time.sleep(0.1), f.put(7))).start()
+        self.assertEqual(f.get(timeout=2), 7)
+        self.assertEqual(f.size(), 0)
+
+    def test_exclusive_frontier_waits_for_done(self):
+        f = Frontier(2, keyFunc = lambda x : x[0], exclusive = True)
+        for item in ['a1', 'a2', 'b1']:
+            f.put(item)
+
+        self.assertEqual(f.get(block=False), 'a1')
+        self.assertEqual(f.get(block=False), 'b1')
+        self.assertRaises(Empty, f.get, False)
+        f.done('b1')
+        self.assertRaises(Empty, f.get, False)
+        f.done('a1')
+        self.assertEqual(f.get(block=False), 'a2')
+        f.put('a3')
+        self.assertEqual(sorted(f.drain()), ['a3'])
+        self.assertEqual(f.size(), 0)
+        f.done('a2')
+        self.assertRaises(Empty, f.get, False)
+
+    def test_items_ordered_by_importance(self):
+        importance = {'a1': 1, 'a2': 5, 'a3': 3, 'b1': 4, 'c1': 9}
+        ready = {'a': 0, 'b': 0, 'c': time.time() + 60}
+        f = Frontier(3, keyFunc = lambda x : x[0], priorityFunc = lambda k : ready[k], itemPriorityFunc = importance.get)
+        for item in ['a1', 'a2', 'a3', 'b1', 'c1']:
+            f.put(item)
+
+        ## c1 is the most important but its site is not ready.
+        self.assertEqual([f.get(block=False) for i in range(4)], ['a2', 'b1', 'a3', 'a1'])
+        self.assertRaises(Empty, f.get, False)
+        self.assertEqual(f.items(), ['c1'])
+
+    def test_items_ranked_again_as_importance_grows(self):
+        importance = {'ax': 0.5, 'ay': 0.5, 'b1': 1, 'b2': 2}
+        f = Frontier(2, keyFunc = lambda x : x[0], priorityFunc = lambda k : 0, itemPriorityFunc = importance.get, \
+            rerankInterval = 0)
+        for item in ['ax', 'ay', 'b1', 'b2']:
+            f.put(item)
+        self.assertEqual(f.get(block=False), 'b2')
+        ## ay is linked to by ten more pages once it's queued.
+        importance['ay'] += 10
+        self.assertEqual([f.get(block=False) for i in range(3)], ['ay', 'b1', 'ax'])
+
+        ## by default, the importance taken when the items were queued holds for a while.
+        importance = {'ax': 0.5, 'ay': 0.5, 'b1': 1, 'b2': 2}
+        f = Frontier(2, keyFunc = lambda x : x[0], priorityFunc = lambda k : 0, itemPriorityFunc = importance.get)
+        for item in ['ax', 'ay', 'b1', 'b2']:
+            f.put(item)
+        self.assertEqual(f.get(block=False), 'b2')
+        importance['ay'] += 10
+        self.assertEqual([f.get(block=False) for i in range(3)], ['b1', 'ax', 'ay'])
+
+    def test_importance_with_spilling(self):
+        spillDir = tempfile.mkdtemp()
+        try:
+            f = Frontier(1, 4, keyFunc = lambda x : 'k', priorityFunc = lambda k : 0, spillDir = spillDir, itemPriorityFunc = lambda x : x)
+            for item in [3, 1, 4, 1, 5, 9, 2, 6, 5, 3]:
+                f.put(item)
+            self.assertEqual(f.size(), 10)
+            ## four items are ranked at a time, the others wait their turn in the order they came in.
+            self.assertEqual([f.get(block=False) for i in range(10)], [4, 5, 9, 3, 6, 5, 3, 2, 1, 1])
+            f.close()
+        finally:
+            shutil.rmtree(spillDir, True)
+
+    def test_prefetcher_sees_keys_entering_selector(self):
+        keys = []
+        f = Frontier(2, keyFunc = lambda x : x[0], priorityFunc = lambda k : 0)
+        f.setPrefetcher(keys.append)
+        for item in ['a1', 'a2', 'b1', 'c1']:
+            f.put(item)
+
+        self.assertEqual(f.get(block=False), 'a1')
+        self.assertEqual(keys, ['a', 'b'])
+        self.assertEqual(f.get(block=False), 'b1')
+        self.assertEqual(keys, ['a', 'b', 'c'])
+
     def test_frontier_with_multi_thread(self):
         keyFunc = lambda x : x/10
         filterFunc = lambda x : x%10 > 3
@@ -148,7 +257,6 @@ class FrontierTests(unittest.TestCase):
         f = Frontier(12, keyFunc= hostname)
         import os
         seeds = open(os.path.realpath("test/sample_input"), 'r')
-        urls = []
         for line in seeds.readlines():
             f.put(line.strip())
         seeds.close()
@@ -0,0 +1,55 @@
+#!/usr/bin/python
+"""Tests for the consistent hash ring used to route sites to workers."""
+
+import unittest
+from lib.hashring import HashRing
+
+SITES = ["site%d.com" % i for i in range(5000)]
+
+class HashRingTests(unittest.TestCase):
+
+    def owners(self, ring):
+        return dict((site, ring.get(site)) for site in SITES)
+
+    def test_empty_ring(self):
+        ring = HashRing()
+        self.assertEqual(ring.get("site.com"), None)
+        ring.add("a")
+        ring.remove("a")
+        ring.remove("b")
+        self.assertEqual(len(ring), 0)
+        self.assertEqual(ring.get("site.com"), None)
+
+    def test_balanced(self):
+        ring = HashRing()
+        for worker in ["a", "b", "c", "d"]:
+            ring.add(worker)
+        counts = {}
+        for owner in self.owners(ring).values():
+            counts[owner] = counts.get(owner, 0) + 1
+        for worker in ["a", "b", "c", "d"]:
+            self.assertTrue(abs(counts[worker] - len(SITES) / 4) < len(SITES) / 10)
+
+    def test_join_and_leave_move_few_sites(self):
+        ring = HashRing()
+        for worker in ["a", "b", "c", "d"]:
+            ring.add(worker)
+        before = self.owners(ring)
+        ring.add("e")
+        after = self.owners(ring)
+        moved = [site for site in SITES if before[site] != after[site]]
+        self.assertTrue(len(moved) < len(SITES) * 0.3)
+        self.assertTrue(all(after[site] == "e" for site in moved))
+
+        ring.remove("e")
+        self.assertEqual(self.owners(ring), before)
+        ring.remove("a")
+        after = self.owners(ring)
+        self.assertTrue(all(after[site] == before[site] for site in SITES if before[site] != "a"))
+
+    def test_weights(self):
+        ring = HashRing()
+        ring.add("small", 1)
+        ring.add("big", 3)
+        owners = self.owners(ring).values()
+        self.assertTrue(owners.count("big") > 2 * owners.count("small"))
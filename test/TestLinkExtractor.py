@@ -0,0 +1,38 @@
+#!/usr/bin/python
+"""Tests for the streaming link extractor."""
+
+import unittest
+from core.linkExtractor import streamLinks
+
+class LinkExtractorTests(unittest.TestCase):
+
+    def test_relative_and_absolute_links(self):
+        html = '<a href="/a">a</a> <A HREF = \'b.html\'>b</A> <a href=c?x=1&amp;y=2>c</a> <area href="http://other.com/">'
+        self.assertEqual(streamLinks(html, 'http://host.com/dir/page.html'), [
+            'http://host.com/a',
+            'http://host.com/dir/b.html',
+            'http://host.com/dir/c?x=1&y=2',
+            'http://other.com/',
+            ])
+
+    def test_skips_comments_scripts_and_non_http_links(self):
+        html = '<!-- <a href="/old">old</a> --><script>var s = "<a href=\'/js\'>";</script>' \
+            '<a href="mailto:me@host.com">mail</a><a name="anchor">x</a><a title="a>b" href="/ok">ok</a>'
+        self.assertEqual(streamLinks(html, 'http://host.com/'), ['http://host.com/ok'])
+
+    def test_base_href_applies_to_all_links(self):
+        html = '<a href="before">x</a><base href="/sub/"><a href="after">y</a>'
+        self.assertEqual(streamLinks(html, 'http://host.com/dir/'), [
+            'http://host.com/sub/before',
+            'http://host.com/sub/after',
+            ])
+
+    def test_nofollow(self):
+        html = '<a rel="nofollow" href="/no">no</a><a rel="external" href="/yes">yes</a>'
+        self.assertEqual(streamLinks(html, 'http://host.com/'), ['http://host.com/yes'])
+        html = '<meta name="robots" content="noindex,nofollow">' + html
+        self.assertEqual(streamLinks(html, 'http://host.com/'), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+#!/usr/bin/python
+"""Tests for the metrics registry and its Prometheus text format."""
+
+import unittest
+import urllib2
+from lib.metrics import Registry, MetricsServer
+
+class MetricsTests(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = Registry()
+
+    def test_counter_and_labels(self):
+        fetches = self.registry.counter("fetches_total", "Downloads.", ["status"])
+        fetches.labels(200).inc()
+        fetches.labels(200).inc(2)
+        fetches.labels(404).inc()
+        self.assertEqual(fetches.labels(200).get(), 3)
+        self.assertTrue(self.registry.counter("fetches_total", "Downloads.", ["status"]) is fetches)
+        self.assertRaises(ValueError, self.registry.gauge, "fetches_total", "Downloads.")
+        self.assertRaises(ValueError, fetches.labels)
+        text = self.registry.render()
+        self.assertTrue("# TYPE fetches_total counter\n" in text)
+        self.assertTrue('fetches_total{status="200"} 3\n' in text)
+        self.assertTrue('fetches_total{status="404"} 1\n' in text)
+
+    def test_gauge_function(self):
+        queue = [1, 2, 3]
+        size = self.registry.gauge("queue_size", "Queue size.")
+        size.setFunction(lambda: len(queue))
+        queue.append(4)
+        self.assertTrue("queue_size 4\n" in self.registry.render())
+        size.setFunction(lambda: 1 / 0)
+        self.assertTrue("queue_size NaN\n" in self.registry.render())
+
+    def test_histogram(self):
+        latency = self.registry.histogram("latency_seconds", "Latency.", buckets = [0.1, 1])
+        for value in [0.05, 0.1, 0.5, 3]:
+            latency.observe(value)
+        text = self.registry.render()
+        self.assertEqual(latency.count(), 4)
+        self.assertTrue('latency_seconds_bucket{le="0.1"} 2\n' in text)
+        self.assertTrue('latency_seconds_bucket{le="1"} 3\n' in text)
+        self.assertTrue('latency_seconds_bucket{le="+Inf"} 4\n' in text)
+        self.assertTrue('latency_seconds_count 4\n' in text)
+        self.assertTrue('latency_seconds_sum 3.65\n' in text)
+        self.assertAlmostEqual(latency.quantile(0.5), 0.1)
+        self.assertAlmostEqual(latency.quantile(0.6), 0.1 + 0.9 * 0.4)
+        self.assertEqual(latency.quantile(0.99), 1)
+        self.assertEqual(self.registry.histogram("empty_seconds", "Nothing.").quantile(0.5), None)
+
+    def test_server(self):
+        self.registry.counter("pages_total", "Pages.").inc(5)
+        server = MetricsServer(0, self.registry, "127.0.0.1")
+        server.start()
+        try:
+            response = urllib2.urlopen("http://127.0.0.1:%d/metrics" % server.port())
+            self.assertTrue("pages_total 5\n" in response.read())
+            self.assertRaises(urllib2.HTTPError, urllib2.urlopen, "http://127.0.0.1:%d/other" % server.port())
+        finally:
+            server.stop()
+
+if __name__ == '__main__':
+    unittest.main()
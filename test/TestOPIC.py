@@ -0,0 +1,39 @@
+#!/usr/bin/python
+"""Tests for the online page importance estimator."""
+
+import unittest
+from lib.opic import OPIC, VIRTUAL_CASH
+
+class OPICTests(unittest.TestCase):
+
+    def test_cash_flows_along_links(self):
+        opic = OPIC(1024)
+        opic.visit("http://a.com/", ["http://a.com/x", "http://a.com/y", "http://a.com/x"])
+        self.assertEqual(opic.cash("http://a.com/"), 0)
+        self.assertEqual(opic.cash("http://a.com/x"), VIRTUAL_CASH / 2)
+        opic.visit("http://b.com/", ["http://a.com/x"])
+        opic.visit("http://a.com/y", ["http://a.com/z", "http://a.com/v"])
+        self.assertTrue(opic.cash("http://a.com/x") > opic.cash("http://a.com/z") > opic.cash("http://a.com/w"))
+        ## visiting a page hands out its cash, whether it has links or not.
+        opic.visit("http://a.com/x", [])
+        self.assertEqual(opic.cash("http://a.com/x"), 0)
+        self.assertEqual(opic.distributed(), 6 * VIRTUAL_CASH)
+
+    def test_links_are_normalized(self):
+        opic = OPIC(1000, normalizer = lambda url : None if url.startswith("mailto:") else url.split("#")[0])
+        self.assertEqual(len(opic._cash), 1024)
+        opic.visit("http://a.com/", ["http://a.com/x#top", "http://a.com/x", "mailto:me@a.com"])
+        self.assertEqual(opic.cash("http://a.com/x"), VIRTUAL_CASH)
+
+    def test_page_url_is_normalized(self):
+        opic = OPIC(1024, normalizer = lambda url : url.split("#")[0].lower())
+        opic.visit("http://a.com/", ["http://A.com/X#top"])
+        self.assertEqual(opic.cash("http://a.com/x"), VIRTUAL_CASH)
+        ## the cash the page was handed under its canonical form is what it hands out.
+        opic.visit("http://A.com/X", ["http://a.com/y"])
+        self.assertEqual(opic.cash("http://a.com/x"), 0)
+        self.assertEqual(opic.cash("http://a.com/y"), 2 * VIRTUAL_CASH)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+#!/usr/bin/python
+"""Tests for the Parser class."""
+
+import unittest
+import random
+import time
+from Queue import Queue
+from core.parser import Parser
+from core.linkExtractor import streamLinks
+from core.nearDup import NearDupDetector
+from core.revisit import RevisitPolicy
+
+WORDS = ["crawler", "frontier", "python", "queue", "manager", "worker", "page", "link", "host", "heap",
+    "bloom", "filter", "socket", "thread", "parser", "store", "batch", "index", "shard", "cluster"]
+
+def text(seed, length = 300):
+    rand = random.Random(seed)
+    return " ".join(rand.choice(WORDS) for i in range(length))
+
+class ListStore(object):
+
+    def __init__(self):
+        self.pages = []
+
+    def put(self, page):
+        self.pages.append(page)
+
+class NullSocket(object):
+
+    def send(self, data):
+        pass
+
+class ParserTests(unittest.TestCase):
+
+    def test_changed_revisit_is_stored(self):
+        pageQ = Queue()
+        store = ListStore()
+        policy = RevisitPolicy(60)
+        parser = Parser(pageQ, NullSocket(), store, extractFunc = streamLinks, nearDup = NearDupDetector(3), revisit = policy)
+        body = "<html><body>" + text(1) + "</body></html>"
+        for url in ["http://a.com/", "http://mirror.com/"]:
+            policy.record(url, 200, None, body)
+        pageQ.put({"url": "http://a.com/", "html": body, "charset": "utf-8", "revisit": False})
+        pageQ.put({"url": "http://mirror.com/", "html": body, "charset": "utf-8", "revisit": False})
+        ## a one-word edit is within the near duplicate distance of the earlier version.
+        pageQ.put({"url": "http://a.com/", "html": body.replace("crawler", "spider", 1), "charset": "utf-8", "revisit": True})
+        parser.start()
+        while(not pageQ.empty() or len(store.pages) < 2):
+            time.sleep(0.01)
+        parser.stop()
+        parser.join()
+
+        self.assertEqual([page["url"] for page in store.pages], ["http://a.com/", "http://a.com/"])
+        self.assertTrue("spider" in store.pages[1]["html"])
+        ## the mirror is not revisited anymore.
+        self.assertFalse("http://mirror.com/" in policy)
+        self.assertTrue("http://a.com/" in policy)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+#!/usr/bin/python
+"""Tests for the ParserPool class."""
+
+import unittest
+import time
+from core.parserPool import ParserPool
+from core.linkExtractor import streamLinks
+
+def slowLinks(html, url):
+    if("slow" in url):
+        time.sleep(60)
+    return streamLinks(html, url)
+
+class ParserPoolTests(unittest.TestCase):
+
+    def collect(self, pool, tickets):
+        results = {}
+        deadline = time.time() + 10
+        while(len(results) < len(tickets) and time.time() < deadline):
+            results.update(pool.results(0.1))
+        return results
+
+    def test_pages_of_a_dead_process_are_failed(self):
+        pool = ParserPool(2, slotsPerProcess = 2, extractFunc = slowLinks)
+        pool.start()
+        try:
+            stuck = pool.submit("<a href='/x'>x</a>", "http://slow.com/")
+            pool._processes[pool._owners[stuck]].terminate()
+            self.assertEqual(self.collect(pool, [stuck]), {stuck: None})
+
+            ## the process is started again, and every slot is free for new pages.
+            tickets = [pool.submit("<a href='/%d'>%d</a>" % (i, i), "http://a.com/") for i in range(4)]
+            self.assertTrue(pool.full())
+            results = self.collect(pool, tickets)
+            self.assertEqual(sorted(results), tickets)
+            self.assertEqual(results[tickets[0]], ["http://a.com/0"])
+            self.assertFalse(pool.full())
+        finally:
+            pool.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+#!/usr/bin/python
+"""Tests for the per-host politeness policy."""
+
+import unittest
+import time
+from core.politeness import PolitenessPolicy, retryAfter, RESPONSE_TIME_FACTOR, MAX_BACKOFF
+
+class PolitenessTests(unittest.TestCase):
+
+    def setUp(self):
+        self.policy = PolitenessPolicy(minDelay = 1, maxDelay = 100)
+
+    def test_unknown_host_is_ready(self):
+        self.assertEqual(self.policy.readyTime("example.com"), 0)
+
+    def test_min_delay_and_crawl_delay(self):
+        self.policy.record("fast.com", 200, 0.01)
+        self.assertEqual(self.policy.delay("fast.com"), 1)
+        self.assertTrue(time.time() < self.policy.readyTime("fast.com") <= time.time() + 1)
+        self.policy.setCrawlDelay("fast.com", 7)
+        self.assertEqual(self.policy.delay("fast.com"), 7)
+
+    def test_slow_hosts_are_spared(self):
+        self.policy.record("slow.com", 200, 2)
+        self.assertEqual(self.policy.delay("slow.com"), 2 * RESPONSE_TIME_FACTOR)
+
+    def test_backoff(self):
+        self.policy.record("busy.com", 503, 0.01)
+        self.assertEqual(self.policy.delay("busy.com"), 2)
+        self.policy.record("busy.com", 429, 0.01)
+        self.policy.record("busy.com", None, 0.01)
+        self.assertEqual(self.policy.delay("busy.com"), 8)
+        for i in range(10):
+            self.policy.record("busy.com", 429, 0.01)
+        self.assertEqual(self.policy.delay("busy.com"), MAX_BACKOFF)
+        self.policy.record("busy.com", 200, 0.01, {"retry-after": "50"})
+        self.assertTrue(self.policy.readyTime("busy.com") >= time.time() + 49)
+        for i in range(10):
+            self.policy.record("busy.com", 200, 0.01)
+        self.assertEqual(self.policy.delay("busy.com"), 1)
+
+    def test_retry_after(self):
+        self.assertEqual(retryAfter({"retry-after": " 120 "}), 120)
+        self.assertEqual(retryAfter({"retry-after": "Wed, 21 Oct 2015 07:28:00 GMT"}), 0)
+        self.assertEqual(retryAfter({"retry-after": "soon"}), None)
+        self.assertEqual(retryAfter({}), None)
+        self.assertEqual(retryAfter(None), None)
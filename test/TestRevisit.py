@@ -0,0 +1,78 @@
+#!/usr/bin/python
+"""Tests for the scheduling of revisits with conditional requests."""
+
+import unittest
+import time
+from core.revisit import RevisitPolicy, changeRate, NOT_MODIFIED
+
+class RevisitTests(unittest.TestCase):
+
+    def test_change_rate(self):
+        self.assertEqual(changeRate(0, 0, 100), 0)
+        self.assertEqual(changeRate(10, 0, 100), 0)
+        ## half the visits finding a change means more than one change per interval on average.
+        self.assertTrue(changeRate(10, 5, 100) > 0.05)
+        self.assertTrue(changeRate(10, 10, 100) > changeRate(10, 5, 100) > changeRate(10, 1, 100) > 0)
+
+    def test_validators(self):
+        policy = RevisitPolicy(60)
+        self.assertEqual(policy.conditionalHeaders("http://a.com/"), [])
+        self.assertTrue(policy.record("http://a.com/", 200, {"etag": '"v1"', "last-modified": "Mon, 01 Jan 2024 00:00:00 GMT"}, "a"))
+        self.assertEqual(policy.conditionalHeaders("http://a.com/"), 
+            [("If-None-Match", '"v1"'), ("If-Modified-Since", "Mon, 01 Jan 2024 00:00:00 GMT")])
+        self.assertFalse(policy.record("http://a.com/", NOT_MODIFIED, {"etag": '"v2"'}))
+        self.assertEqual(policy.conditionalHeaders("http://a.com/")[0], ("If-None-Match", '"v2"'))
+        ## a server without validators: the content hash tells.
+        self.assertTrue(policy.record("http://b.com/", 200, {}, "b"))
+        self.assertFalse(policy.record("http://b.com/", 200, {}, "b"))
+        self.assertTrue(policy.record("http://b.com/", 200, {}, "b2"))
+        self.assertEqual(len(policy), 2)
+
+    def test_revisits_follow_change_rate(self):
+        policy = RevisitPolicy(0.05, 0.01, 0.4)
+        policy.record("http://a.com/static", 200, None, "s")
+        policy.record("http://a.com/news", 200, None, "n")
+        self.assertEqual(policy.due(), [])
+        time.sleep(0.06)
+        self.assertEqual(sorted(policy.due()), ["http://a.com/news", "http://a.com/static"])
+        self.assertEqual(policy.due(), [])
+        policy.record("http://a.com/static", 200, None, "s")
+        policy.record("http://a.com/news", 200, None, "n2")
+        static, news = policy._pages.get("http://a.com/static")[7], policy._pages.get("http://a.com/news")[7]
+        self.assertEqual(static, 0.1)
+        self.assertTrue(0.01 <= news < static)
+        time.sleep(news + 0.01)
+        self.assertEqual(policy.due(), ["http://a.com/news"])
+        ## a revisit whose fetch fails is handed out again after its interval.
+        time.sleep(news + 0.01)
+        self.assertTrue("http://a.com/news" in policy.due())
+
+    def test_capacity(self):
+        policy = RevisitPolicy(0.01, capacity = 2)
+        for i in range(3):
+            policy.record("http://a.com/%d" % i, 200, None, "a")
+        self.assertEqual(len(policy), 2)
+        self.assertFalse("http://a.com/0" in policy)
+        ## the heap is rebuilt from the pages kept when it holds too many stale entries.
+        for i in range(10):
+            policy.record("http://a.com/2", 200, None, "a")
+        self.assertTrue(len(policy._due) <= 2 * len(policy) + 1)
+        time.sleep(0.02)
+        ## a.com/2 never changed, its interval has grown far beyond.
+        self.assertEqual(policy.due(), ["http://a.com/1"])
+        policy.forget("http://a.com/1")
+        self.assertEqual(len(policy), 1)
+
+    def test_snapshot_and_restore(self):
+        policy = RevisitPolicy(60)
+        policy.record("http://a.com/", 200, {"etag": '"v1"'}, "a")
+        policy.record("http://a.com/", 200, {}, "a2")
+        restored = RevisitPolicy(60)
+        restored.restore(policy.snapshot())
+        self.assertEqual(restored.snapshot(), policy.snapshot())
+        self.assertEqual(restored.conditionalHeaders("http://a.com/"), [("If-None-Match", '"v1"')])
+        self.assertFalse(restored.record("http://a.com/", 200, {}, "a2"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+#!/usr/bin/python
+"""Tests for the robots.txt cache."""
+
+import unittest
+import tempfile
+import shutil
+import time
+import os
+from core import robots
+from core.robots import RobotsCache, crawlDelay
+from lib import wire
+
+ROBOTS = """User-agent: *
+Disallow: /private/
+Crawl-delay: 2
+
+User-agent: webcrawler
+Disallow: /private/
+Crawl-delay: 5
+"""
+
+class RobotsTests(unittest.TestCase):
+
+    def setUp(self):
+        self.released = []
+        self.delays = {}
+        self.robots = RobotsCache("webcrawler/1.0", releaseFunc = self.released.extend, \
+            crawlDelayFunc = self.delays.__setitem__)
+
+    def test_crawl_delay(self):
+        self.assertEqual(crawlDelay(ROBOTS, "webcrawler/1.0"), 5)
+        self.assertEqual(crawlDelay(ROBOTS, "otherbot"), 2)
+        self.assertEqual(crawlDelay("User-agent: *\nDisallow:\n", "webcrawler"), None)
+
+    def test_urls_are_parked_until_rules_arrive(self):
+        self.assertTrue(self.robots.disallow("http://a.com/index.html"))
+        self.assertTrue(self.robots.disallow("http://a.com/private/x.html"))
+        self.robots.load("a.com", time.time() + 60, ROBOTS)
+        self.assertEqual(self.released, ["http://a.com/index.html"])
+        self.assertEqual(self.delays, {"a.com": 5})
+        self.assertFalse(self.robots.disallow("http://a.com/other.html"))
+        self.assertTrue(self.robots.disallow("http://a.com/private/y.html"))
+
+    def test_stale_rules_are_used_while_refetching(self):
+        self.robots.load("a.com", time.time() - 1, ROBOTS)
+        self.assertFalse(self.robots.disallow("http://a.com/index.html"))
+        self.assertTrue(self.robots.disallow("http://a.com/private/x.html"))
+        self.robots.load("a.com", time.time() + 60, "")
+        self.assertEqual(self.released, [])
+        self.assertFalse(self.robots.disallow("http://a.com/private/x.html"))
+
+    def test_failed_fetch_is_retried(self):
+        answers = [(None, 0.1), (ROBOTS, 60)]
+        self.robots = RobotsCache("webcrawler/1.0", releaseFunc = self.released.extend, nFetchers = 1)
+        self.robots._download = lambda robotsUrl: answers.pop(0)
+        self.robots.start()
+        try:
+            self.assertTrue(self.robots.disallow("http://a.com/index.html"))
+            deadline = time.time() + 5
+            while(not self.released and time.time() < deadline):
+                time.sleep(0.05)
+        finally:
+            self.robots.stop()
+        ## the url stays parked through the failure, which is not shared with the cluster.
+        self.assertEqual(self.released, ["http://a.com/index.html"])
+        self.assertEqual(answers, [])
+        self.assertEqual([host for host, expires, body in self.robots.takeFetched()], ["a.com"])
+
+    def test_overflow_is_released(self):
+        spillDir = tempfile.mkdtemp()
+        try:
+            self.robots = RobotsCache("webcrawler/1.0", releaseFunc = self.released.extend, spillDir = spillDir)
+            urls = ["http://a.com/%d.html" % i for i in range(robots.MAX_PARKED + 500)] + ["http://a.com/private/x.html"]
+            for url in urls:
+                self.assertTrue(self.robots.disallow(url))
+            self.assertEqual(len(self.robots._pending["a.com"]), robots.MAX_PARKED)
+            self.robots.load("a.com", time.time() + 60, ROBOTS)
+            self.assertEqual(sorted(self.released), sorted(urls[:-1]))
+            self.assertEqual(os.listdir(spillDir), [])
+        finally:
+            shutil.rmtree(spillDir, True)
+
+    def test_wire_round_trip(self):
+        records = [("a.com", 1234.5, ROBOTS), ("b.com:8080", 0.0, "")]
+        msgType, payload = wire.decode(wire.encodeRobots(records))
+        self.assertEqual(msgType, wire.ROBOTS)
+        self.assertEqual(wire.decodeRobots(payload), records)
+        self.assertRaises(wire.WireError, wire.decodeRobots, payload[:-3])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+#!/usr/bin/python
+"""Tests for the cluster-wide set of seen urls kept by the manager."""
+
+import unittest
+import tempfile
+import shutil
+import os
+from lib import seenset
+from lib.seenset import SeenSet
+
+class SeenSetTests(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, True)
+
+    def test_filter_new(self):
+        seen = SeenSet(4)
+        batch = ["http://a.com/1", "http://b.com/1", "http://a.com/1", u"http://c.com/caf\xe9", "http://a.com/2"]
+        self.assertEqual(seen.filterNew(batch), ["http://a.com/1", "http://b.com/1", u"http://c.com/caf\xe9", "http://a.com/2"])
+        self.assertEqual(seen.filterNew(batch + ["http://b.com/2"]), ["http://b.com/2"])
+        self.assertEqual(seen.filterNew([]), [])
+        self.assertEqual(len(seen), 5)
+
+    def test_merged_shards(self):
+        seen = SeenSet(2)
+        urls = ["http://site%d.com/page%d" % (i % 50, i) for i in range(5 * seenset.MIN_MERGE_SIZE)]
+        for i in range(0, len(urls), 100):
+            self.assertEqual(seen.filterNew(urls[i:i + 100]), urls[i:i + 100])
+        self.assertTrue(all(len(shard._sorted) > 0 for shard in seen._shards))
+        self.assertEqual(seen.filterNew(urls[::3]), [])
+        self.assertEqual(seen.filterNew(urls[:10] + ["http://site0.com/new"]), ["http://site0.com/new"])
+        self.assertEqual(len(seen), len(urls) + 1)
+
+    def test_reopen(self):
+        seen = SeenSet(3, self.dir)
+        urls = ["http://site%d.com/page%d" % (i % 5, i) for i in range(3000)]
+        seen.filterNew(urls)
+        seen.close()
+        ## a fingerprint cut short by a crash.
+        f = open(os.path.join(self.dir, "0000.seen"), "ab")
+        f.write("\x01\x02\x03")
+        f.close()
+        seen = SeenSet(3, self.dir)
+        self.assertEqual(len(seen), len(urls))
+        self.assertEqual(seen.filterNew(urls[:100] + ["http://site1.com/new"]), ["http://site1.com/new"])
+        seen.close()
+        self.assertEqual(len(SeenSet(3, self.dir)), len(urls) + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
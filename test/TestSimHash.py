@@ -0,0 +1,62 @@
+#!/usr/bin/python
+"""Tests for the SimHash index and the near duplicate detector."""
+
+import unittest
+import random
+from lib.simhash import simhash, distance, SimHashIndex
+from core.nearDup import NearDupDetector, shingles, MIN_HOST_PAGES
+
+WORDS = ["crawler", "frontier", "python", "queue", "manager", "worker", "page", "link", "host", "heap",
+    "bloom", "filter", "socket", "thread", "parser", "store", "batch", "index", "shard", "cluster"]
+
+def text(seed, length = 300):
+    rand = random.Random(seed)
+    return " ".join(rand.choice(WORDS) for i in range(length))
+
+class SimHashTests(unittest.TestCase):
+
+    def test_similar_texts_have_close_fingerprints(self):
+        base = text(1)
+        edited = base.replace("crawler", "spider", 1)
+        self.assertTrue(distance(simhash(shingles(base)), simhash(shingles(edited))) <= 3)
+        self.assertTrue(distance(simhash(shingles(base)), simhash(shingles(text(2)))) > 10)
+
+    def test_index_finds_near_fingerprints(self):
+        index = SimHashIndex(3)
+        index.add(0xFFFF0000FFFF0000)
+        self.assertEqual(index.find(0xFFFF0000FFFF0007), 0xFFFF0000FFFF0000)
+        self.assertEqual(index.find(0xFFFF0000FFFF000F), None)
+        self.assertEqual(index.find(0x0000FFFF0000FFFF), None)
+
+    def test_index_capacity(self):
+        index = SimHashIndex(3, capacity = 2)
+        for fingerprint in [0x0F0F0F0F0F0F0F0F, 0xF0F0F0F0F0F0F0F0, 0xFFFFFFFF00000000]:
+            index.add(fingerprint)
+        self.assertEqual(len(index), 2)
+        self.assertEqual(index.find(0x0F0F0F0F0F0F0F0F), None)
+        self.assertEqual(index.find(0xFFFFFFFF00000001), 0xFFFFFFFF00000000)
+
+class NearDupDetectorTests(unittest.TestCase):
+
+    def test_detects_mirrors_and_penalizes_host(self):
+        detector = NearDupDetector()
+        page = "<html><script>var x = %d;</script><body>" + text(3) + "</body></html>"
+        self.assertFalse(detector.isNearDup({"url": "http://trap.com/?sid=0", "html": page % 0}))
+        for i in range(1, MIN_HOST_PAGES):
+            self.assertTrue(detector.isNearDup({"url": "http://trap.com/?sid=%d" % i, "html": page % i}))
+        self.assertFalse(detector.isNearDup({"url": "http://other.com/", "html": text(4)}))
+
+        self.assertTrue(detector.hostPenalty("trap.com") > 0)
+        self.assertEqual(detector.hostPenalty("other.com"), 0)
+
+    def test_pages_without_text_are_not_duplicates(self):
+        detector = NearDupDetector()
+        self.assertFalse(detector.isNearDup({"url": "http://a.com/", "html": "<html><frameset><frame src='x'></frameset></html>"}))
+        self.assertFalse(detector.isNearDup({"url": "http://b.com/", "html": "<html><script>render();</script><img src='y'></html>"}))
+        self.assertFalse(detector.isNearDup({"url": "http://c.com/", "html": "<html><body>moved here</body></html>"}))
+        self.assertFalse(detector.isNearDup({"url": "http://d.com/", "html": "<html><body>moved here</body></html>"}))
+        self.assertEqual(detector.hostPenalty("b.com"), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
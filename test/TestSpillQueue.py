@@ -0,0 +1,103 @@
+#!/usr/bin/python
+"""Tests for the SpillQueue class and the disk-spilling Frontier."""
+
+import unittest
+import tempfile
+import shutil
+import os
+from Queue import Empty
+from lib.spillqueue import SpillQueue
+from lib.frontier import Frontier
+
+class SpillQueueTests(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, True)
+
+    def test_fifo_order_across_memory_and_disk(self):
+        q = SpillQueue(self.dir, memSize = 10, batchSize = 7, segmentSize = 20)
+        for i in range(100):
+            q.put(i)
+        self.assertEqual(q.qsize(), 100)
+        self.assertTrue(q._spilled > 0)
+        self.assertTrue(len(q._head) + len(q._tail) <= 10 + 7)
+
+        out = [q.get() for i in range(50)]
+        for i in range(100, 130):
+            q.put(i)
+        self.assertEqual(q.peek(), 50)
+        while(not q.empty()):
+            out.append(q.get())
+        self.assertEqual(out, range(130))
+        self.assertRaises(Empty, q.get)
+        self.assertEqual(q.peek(), None)
+
+    def test_consumed_segments_are_removed(self):
+        q = SpillQueue(self.dir, memSize = 5, segmentSize = 5)
+        for i in range(50):
+            q.put('http://host.com/%d' % i)
+        spilled = q._dir
+        self.assertTrue(len(os.listdir(spilled)) > 1)
+        while(not q.empty()):
+            q.get()
+        ## the private directory goes once everything spilled is read back.
+        self.assertFalse(os.path.exists(spilled))
+        self.assertEqual(os.listdir(self.dir), [])
+        q.close()
+
+    @unittest.skipIf(not os.path.isdir("/proc/self/fd"), "open files can not be counted")
+    def test_no_file_left_open(self):
+        opened = len(os.listdir("/proc/self/fd"))
+        queues = [SpillQueue(self.dir, memSize = 2, batchSize = 2) for i in range(200)]
+        for q in queues:
+            for i in range(20):
+                q.put(i)
+            q.get()
+        self.assertEqual(len(os.listdir("/proc/self/fd")), opened)
+        self.assertEqual(len(os.listdir(self.dir)), 200)
+        for q in queues:
+            self.assertEqual([q.get() for i in range(19)], range(1, 20))
+        self.assertEqual(os.listdir(self.dir), [])
+
+    def test_frontier_never_full(self):
+        f = Frontier(2, maxQSize = 10, keyFunc = lambda x : x % 3, spillDir = self.dir)
+        for i in range(300):
+            f.put(i)
+        self.assertEqual(f.size(), 300)
+        out = []
+        while(f.size() > 0):
+            out.append(f.get(block = False))
+        self.assertEqual(sorted(out), range(300))
+        for key in range(3):
+            group = [i for i in out if i % 3 == key]
+            self.assertEqual(group, sorted(group))
+        f.close()
+        self.assertEqual(os.listdir(self.dir), [])
+
+    def test_frontier_items_and_restore(self):
+        f = Frontier(2, maxQSize = 10, keyFunc = lambda x : x % 3, spillDir = self.dir, exclusive = True)
+        for i in range(100):
+            f.put(i)
+        for i in range(12):
+            busy = f.get(block = False)
+            if(i < 11):
+                f.done(busy)
+        items = f.items()
+        self.assertEqual(f.size(), 100 - 12)
+        self.assertEqual(len(items), f.size() + 1)
+        self.assertEqual(items[-1], busy)
+        self.assertEqual(len(set(items)), len(items))
+
+        restored = Frontier(2, maxQSize = 10, keyFunc = lambda x : x % 3, spillDir = self.dir)
+        restored.addFilter(lambda x : True)
+        self.assertEqual(restored.restore(items), len(items))
+        self.assertEqual(sorted(restored.drain()), sorted(items))
+        f.close()
+        restored.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
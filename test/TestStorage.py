@@ -0,0 +1,117 @@
+#!/usr/bin/python
+"""Tests for the PageStore class."""
+
+import unittest
+import tempfile
+import shutil
+import os
+import time
+from core import storage
+from core.storage import PageStore, FileBackend, FileContentBackend, ZLIB, ZSTD
+
+class FlakyBackend(object):
+
+    def __init__(self, failures):
+        self.failures = failures
+        self.batches = []
+
+    def insert(self, pages):
+        if(self.failures > 0):
+            self.failures -= 1
+            raise IOError()
+        self.batches.append(list(pages))
+
+class PageStoreTests(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, True)
+
+    def test_batches_by_count(self):
+        backend = FlakyBackend(0)
+        store = PageStore(backend, batchSize = 5, flushInterval = 60)
+        store.start()
+        for i in range(12):
+            store.put({"url": "http://host.com/%d" % i, "html": "<html/>", "charset": "utf-8"})
+        store.stop()
+        self.assertEqual([len(batch) for batch in backend.batches], [5, 5, 2])
+        self.assertFalse("charset" in backend.batches[0][0])
+
+    def test_batches_by_time(self):
+        backend = FlakyBackend(0)
+        store = PageStore(backend, batchSize = 100, flushInterval = 0.1)
+        store.start()
+        store.put({"url": "http://host.com/", "html": "<html/>", "charset": None})
+        time.sleep(0.5)
+        self.assertEqual(len(backend.batches), 1)
+        store.stop()
+
+    def test_failed_batches_are_retried(self):
+        backend = FlakyBackend(2)
+        store = PageStore(backend, batchSize = 2, maxRetries = 2)
+        store._write([{"url": "a"}, {"url": "b"}])
+        self.assertEqual(backend.batches, [[{"url": "a"}, {"url": "b"}]])
+
+    def test_file_backend_converts_charset(self):
+        path = os.path.join(self.dir, "pages")
+        store = PageStore(FileBackend(path))
+        store.start()
+        store.put({"url": "http://host.com/", "html": "caf\xe9", "charset": "latin-1"})
+        store.stop()
+        pages = list(FileBackend(path).find())
+        self.assertEqual(pages, [{"url": "http://host.com/", "html": u"caf\xe9"}])
+
+class ContentBackendTests(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, True)
+
+    def check_codec(self, codec, trainSamples = 0):
+        backend = FileContentBackend(self.dir, codec = codec, trainSamples = trainSamples, dictSize = 2048)
+        pages = [{"url": "http://host%d.com/" % (i % 20), "html": "<html><p>page %d</p>%s</html>" % (i % 20, "boilerplate " * 50)}
+            for i in range(40)]
+        store = PageStore(backend, batchSize = 8)
+        store.start()
+        for page in pages:
+            store.put(dict(page))
+        store.stop()
+
+        bodies = [name for sub in os.listdir(self.dir) if len(sub) == 2 for name in os.listdir(os.path.join(self.dir, sub))]
+        self.assertEqual(len(bodies), 20)
+        for page in pages[:20]:
+            self.assertEqual(backend.get(page["url"]), page["html"])
+        self.assertEqual(backend.get("http://unknown.com/"), None)
+
+    def test_zlib(self):
+        self.check_codec(ZLIB)
+
+    @unittest.skipIf(storage.zstandard is None, "zstandard is not installed")
+    def test_zstd_with_dictionary(self):
+        self.check_codec(ZSTD, trainSamples = 10)
+
+    def test_known_content_is_not_queued(self):
+        backend = FileContentBackend(self.dir)
+        store = PageStore(backend)
+        store._write([{"url": "http://a.com/", "html": "same"}])
+        store.put({"url": "http://b.com/", "html": "same", "charset": "utf-8"})
+        self.assertEqual(store._pageQ.get_nowait(), {"url": "http://b.com/", "digest": backend._getDigest("http://a.com/")})
+
+    def test_digest_of_the_body_stored(self):
+        backend = FileContentBackend(self.dir)
+        store = PageStore(backend)
+        store.start()
+        store.put({"url": "http://a.com/", "html": "caf\xe9", "charset": "latin-1"})
+        store.put({"url": "http://b.com/", "html": "caf\xc3\xa9", "charset": "utf-8"})
+        store.stop()
+        self.assertEqual(backend._getDigest("http://a.com/"), backend._getDigest("http://b.com/"))
+        self.assertEqual(backend._getDigest("http://a.com/"), storage.contentDigest("caf\xc3\xa9"))
+        self.assertEqual(backend.get("http://a.com/"), "caf\xc3\xa9")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+#!/usr/bin/python
+"""Tests for the binary framing of the messages between the manager and the workers."""
+
+import unittest
+import os
+from lib import wire
+
+URLS = ["http://example.com/", "http://example.com/a/b?x=1", "http://example.com/a/c", "https://example.com:8443/a", 
+    "http://other.org", "http://other.org/" + "p" * 300, u"http://example.com/caf\xe9"]
+
+class WireTests(unittest.TestCase):
+
+    def test_round_trip(self):
+        codecs = [wire.NONE, wire.ZLIB] + ([wire.ZSTD] if wire.zstandard is not None else [])
+        expected = set(url.encode("utf-8") for url in URLS)
+        for codec in codecs:
+            self.assertEqual(set(wire.decodeURLs(wire.encodeURLs(URLS, codec))), expected)
+            self.assertEqual(wire.decodeURLs(wire.encodeURLs([], codec)), [])
+        frame = wire.encodeURLs(URLS, msgType = wire.RETURN)
+        self.assertEqual(wire.decode(frame)[0], wire.RETURN)
+        self.assertEqual(set(wire.decodeURLs(frame)), expected)
+
+    def test_sample_input(self):
+        f = open(os.path.realpath("test/sample_input"), "r")
+        urls = set(line.strip() for line in f.readlines() if line.strip())
+        f.close()
+        frame = wire.encodeURLs(urls)
+        self.assertEqual(set(wire.decodeURLs(frame)), urls)
+        self.assertTrue(len(frame) < sum(len(url) for url in urls) / 2)
+
+    def test_long_urls_are_left_out(self):
+        tooLong = "http://example.com/" + "x" * (wire.MAX_LENGTH + 1)
+        self.assertEqual(wire.decodeURLs(wire.encodeURLs([tooLong, "http://example.com/"])), ["http://example.com/"])
+
+    def test_bad_frames(self):
+        frame = wire.encodeURLs(URLS, wire.NONE)
+        for bad in ["", "XX" + frame[2:], frame[:2] + chr(wire.VERSION + 1) + frame[3:], frame[:-1], frame + "x"]:
+            self.assertRaises(wire.WireError, wire.decodeURLs, bad)
+        self.assertRaises(wire.WireError, wire.decodeURLs, wire.encode(wire.URLS, "\x00\x00\x00\x01"))
+        self.assertRaises(wire.WireError, wire.decodeURLs, wire.encode(wire.URLS + 100, "\x00\x00\x00\x00"))
+
+    def test_heartbeat(self):
+        msgType, payload = wire.decode(wire.encodeHeartbeat("10.0.0.1:4242", 1500, 1200, 300, 7, 12.5))
+        self.assertEqual(msgType, wire.HEARTBEAT)
+        self.assertEqual(wire.decodeHeartbeat(payload), {"worker": "10.0.0.1:4242", "credit": 1500, "received": 1200, \
+            "frontier": 300, "pages": 7, "fetch_rate": 12.5})
+        self.assertRaises(wire.WireError, wire.decodeHeartbeat, payload[:-1])
+        self.assertRaises(wire.WireError, wire.decodeURLs, wire.encodeHeartbeat("w", 1, 0, 0, 0, 0))